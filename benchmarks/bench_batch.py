@@ -0,0 +1,35 @@
+"""
+Validates 10k flat records with a loop of validate() calls, a compiled validator and validate_batch().
+
+    python benchmarks/bench_batch.py
+"""
+from common import bench
+
+import okschema
+from okschema import validate, validate_batch, fmt_uuid
+
+
+schema = {
+    'my_password':  {'@t': 'string', '@lteq': 100},
+    'user_id':      {'@t': 'string', '@regexp': fmt_uuid},
+    'new_email':    {'@t': 'string', '@lteq': 200},
+    'new_password': {'@t': 'string', '@lteq': 100},
+    'age':          {'@t': 'int', '@gteq': 0, '@lt': 150},
+    'lang':         {'@t': 'str', '@in': ['en', 'pl', 'de']},
+}
+records = [{
+    'my_password': 'abc',
+    'user_id': 'dbc8911c-92e8-4cdb-85b8-47a7a6a82db1',
+    'new_email': 'abc%d@example.com' % i,
+    'new_password': 'abc',
+    'age': i % 100,
+    'lang': 'pl',
+} for i in range(10000)]
+
+
+if __name__ == '__main__':
+    validator = okschema.compile(schema)
+    loop = bench('loop of validate()', lambda: [validate(schema, record) for record in records], 1)
+    compiled = bench('loop of compiled validate()', lambda: [validator.validate(record) for record in records], 1)
+    batch = bench('validate_batch()', lambda: validate_batch(schema, records), 1)
+    print('speedup: %.2fx over validate(), %.2fx over compiled' % (loop / batch, compiled / batch))
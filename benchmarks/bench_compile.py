@@ -0,0 +1,59 @@
+"""
+Compares okschema.validate with compiled validators on a nested schema.
+
+    python benchmarks/bench_compile.py
+"""
+from common import bench
+
+import okschema
+from okschema import validate, fmt_uuid
+
+
+address = {
+    'street': {'@t': 'str', '@lteq': 100},
+    'city': {'@t': 'str', '@lteq': 50},
+    'zip': {'@t': 'str', '@regexp': '[0-9]{2}-[0-9]{3}'},
+    'country': {'@t': 'str', '@in': ['PL', 'DE', 'FR']},
+}
+schema = {
+    'id': {'@t': 'str', '@regexp': fmt_uuid},
+    'name': {'@t': 'str', '@lteq': 100},
+    'age': {'@t': 'int', '@gteq': 0, '@lt': 150},
+    'score': 'decimal',
+    'active': 'bool',
+    'address': address,
+    'orders': [{
+        'sku': {'@t': 'str', '@lteq': 20},
+        'qty': {'@t': 'int', '@gt': 0},
+        'price': {'@t': 'decimal', '@gteq': 0},
+        'note': {'@t': 'str', '@optional': True, '@null': True, '@blank': True},
+        'ship_to': address,
+    }],
+}
+data = {
+    'id': 'dbc8911c-92e8-4cdb-85b8-47a7a6a82db1',
+    'name': 'John',
+    'age': 42,
+    'score': '12.5',
+    'active': True,
+    'address': {'street': 'Main 1', 'city': 'Warsaw', 'zip': '00-001', 'country': 'PL'},
+    'orders': [
+        {'sku': 'A-%d' % i, 'qty': i + 1, 'price': '9.99', 'note': None,
+         'ship_to': {'street': 'Main 1', 'city': 'Warsaw', 'zip': '00-001', 'country': 'PL'}}
+        for i in range(20)
+    ],
+}
+
+
+if __name__ == '__main__':
+    validator = okschema.compile(schema)
+    assert validator.validate(data) == validate(schema, data)
+    number = 500
+    interpreted = bench('validate()', lambda: validate(schema, data), number)
+    compiled = bench('compile(schema).validate()', lambda: validator.validate(data), number)
+    generated = okschema.compile(schema, backend='codegen')
+    assert generated.validate(data) == validate(schema, data)
+    codegen = bench("backend='codegen'", lambda: generated.validate(data), number)
+    assert validator.is_valid(data)
+    bench('compile(schema).is_valid()', lambda: validator.is_valid(data), number)
+    print('speedup: tree %.2fx, codegen %.2fx' % (interpreted / compiled, interpreted / codegen))
@@ -0,0 +1,34 @@
+"""
+Parses ISO dates and datetimes with pendulum.from_format, as val_date and val_datetime did before,
+with the 'date' and 'datetime' types, and with the same types converted to pendulum values.
+Also times importing okschema, which no longer imports pendulum.
+
+    python benchmarks/bench_dates.py
+"""
+import subprocess, sys
+
+from common import bench
+
+import pendulum
+
+import okschema
+
+
+if __name__ == '__main__':
+    number = 100000
+    for ftype, value, fmt in [('date', '2024-02-29', 'YYYY-MM-DD'),
+                              ('datetime', '2024-02-29T12:30:59.123456', 'YYYY-MM-DDTHH:mm:ss.SSSSSS')]:
+        stdlib = okschema.compile({'a': ftype})
+        with_pendulum = okschema.compile({'a': {'@t': ftype, '@pendulum': True}})
+        data = {'a': value}
+        print('%s:' % ftype)
+        old = bench('  pendulum.from_format', lambda: pendulum.from_format(value, fmt), number)
+        new = bench('  %r type' % ftype, lambda: stdlib.validate(data), number)
+        bench('  %r type, @pendulum' % ftype, lambda: with_pendulum.validate(data), number)
+        print('  speedup: %.1fx' % (old / new))
+
+    for modules in ['okschema', 'okschema, pendulum']:
+        seconds = min(float(subprocess.check_output([
+            sys.executable, '-c', 'import time; t = time.perf_counter(); import %s; print(time.perf_counter() - t)' % modules
+        ], cwd=sys.path[0])) for i in range(5))
+        print('%-40s %10.1f ms' % ('import ' + modules, seconds * 1e3))
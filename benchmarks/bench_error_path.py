@@ -0,0 +1,42 @@
+"""
+Measures the error path on 5 and 10 level nested schemas, where every level used to catch
+and re-raise the error of the level below.
+
+    python benchmarks/bench_error_path.py
+"""
+from common import bench
+
+import okschema
+from okschema import validate, ValidationError
+
+
+def nested(depth):
+    """Returns (schema, bad data) nested `depth` levels deep, with errors in every leaf list."""
+    schema = {'values': [{'@t': 'int', '@gteq': 0}], 'name': 'str'}
+    data = {'values': [1, -1, 2, 'x'], 'name': 'leaf'}
+    for level in range(depth - 1):
+        schema = {'children': [schema], 'id': 'int'}
+        data = {'children': [data, data], 'id': level}
+    return schema, data
+
+
+def rejecting(validate_fun, data):
+    def run():
+        try:
+            validate_fun(data)
+        except ValidationError:
+            pass
+        else:
+            raise AssertionError('should raise')
+    return run
+
+
+if __name__ == '__main__':
+    for depth in [5, 10]:
+        schema, data = nested(depth)
+        validator = okschema.compile(schema)
+        number = 20 if depth == 5 else 1
+        print('depth %d, %d leaves:' % (depth, 2 ** (depth - 1)))
+        interpreted = bench('  validate()', rejecting(lambda d: validate(schema, d), data), number)
+        compiled = bench('  compiled validate()', rejecting(validator.validate, data), number)
+        print('  speedup: %.2fx' % (interpreted / compiled))
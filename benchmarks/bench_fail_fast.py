@@ -0,0 +1,42 @@
+"""
+Compares collecting all errors with fail_fast=True on error-heavy payloads.
+
+    python benchmarks/bench_fail_fast.py
+"""
+from common import bench
+
+import okschema
+from okschema import validate, ValidationError
+
+
+schema = {
+    'items': [{
+        'id': {'@t': 'int', '@gteq': 0},
+        'name': {'@t': 'str', '@lteq': 20},
+        'price': {'@t': 'decimal', '@gt': 0},
+    }],
+}
+# Every item is bad, as in an abusive request.
+data = {'items': [{'id': -1, 'name': 'x' * 30, 'price': 'abc'} for i in range(50000)]}
+
+
+def rejecting(validate_fun):
+    def run():
+        try:
+            validate_fun(data)
+        except ValidationError:
+            pass
+        else:
+            raise AssertionError('should raise')
+    return run
+
+
+if __name__ == '__main__':
+    validator = okschema.compile(schema)
+    number = 3
+    all_errors = bench('validate()', rejecting(lambda d: validate(schema, d)), number)
+    first_error = bench('validate(fail_fast=True)', rejecting(lambda d: validate(schema, d, fail_fast=True)), number)
+    compiled_all = bench('compiled validate()', rejecting(validator.validate), number)
+    compiled_first = bench('compiled validate(fail_fast=True)',
+                           rejecting(lambda d: validator.validate(d, fail_fast=True)), number)
+    print('speedup: validate() %.0fx, compiled %.0fx' % (all_errors / first_error, compiled_all / compiled_first))
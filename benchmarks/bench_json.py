@@ -0,0 +1,29 @@
+"""
+Validates a JSON request body of 10000 records with extra fields, decoded by json.loads and then validated
+by the tree of nodes, and by validate_json in the default and in the fail_fast mode,
+which is left to the tree of nodes.
+
+    python benchmarks/bench_json.py
+"""
+import json
+
+from common import bench
+
+import okschema
+
+
+schema = [{'id': 'int', 'name': 'str', 'price': 'decimal', 'weight': 'float', 'tags': ['str'],
+           'meta': {'a': 'int', '@optional': True}}]
+raw = json.dumps([{'id': i, 'name': 'item %d' % i, 'price': '%d.99' % i, 'weight': '1.5', 'tags': ['a', 'b'],
+                   'meta': {'a': 1}, 'extra': {'x': [1, 2, 3], 'y': 'zzz'}, 'note': 'n' * 20}
+                  for i in range(10000)]).encode()
+
+
+if __name__ == '__main__':
+    validator = okschema.compile(schema)
+    assert okschema.validate_json(schema, raw) == okschema.validate_json(schema, memoryview(raw), fail_fast=True) \
+        == validator.validate(json.loads(raw))
+    bench('json.loads only', lambda: json.loads(raw), 10)
+    bench('json.loads, then tree', lambda: validator.validate(json.loads(raw)), 10)
+    bench('validate_json', lambda: okschema.validate_json(schema, raw), 10)
+    bench('validate_json, fail_fast', lambda: okschema.validate_json(schema, raw, fail_fast=True), 10)
@@ -0,0 +1,31 @@
+"""
+Reads the customer and the first line of an order with 10000 lines,
+validating the whole order and validating it lazily.
+
+    python benchmarks/bench_lazy.py
+"""
+from common import bench
+
+import okschema
+
+
+schema = {
+    'customer': {'name': 'str', 'email': {'@t': 'str', '@format': 'email'}},
+    'lines': [{'sku': {'@t': 'str', '@regexp': '[A-Z]{3}-[0-9]{4}'}, 'price': {'@t': 'decimal', '@gt': 0},
+               'quantity': {'@t': 'int', '@gt': 0}}],
+}
+data = {
+    'customer': {'name': 'John', 'email': 'john@example.com'},
+    'lines': [{'sku': 'ABC-%04d' % i, 'price': '%d.50' % i, 'quantity': 1} for i in range(1, 10001)],
+}
+
+
+def read(order):
+    return order['customer']['email'], order['lines'][0]['price']
+
+
+if __name__ == '__main__':
+    assert read(okschema.validate(schema, data)) == read(okschema.validate_lazy(schema, data))
+    full = bench('validate()', lambda: read(okschema.validate(schema, data)), 20)
+    lazy = bench('validate_lazy()', lambda: read(okschema.validate_lazy(schema, data)), 20)
+    print('speedup: %.1fx' % (full / lazy))
@@ -0,0 +1,31 @@
+"""
+Rejects a list of a million records where at most 100 are allowed,
+with a list length limit, with okschema.Limits and without either.
+
+    python benchmarks/bench_limits.py
+"""
+from common import bench
+
+import okschema
+
+
+item = {'id': 'int', 'name': {'@t': 'str', '@lt': 100}}
+data = [{'id': i, 'name': 'x' * 200} for i in range(10 ** 6)]
+
+
+def rejected(validate):
+    try:
+        validate(data)
+    except okschema.ValidationError:
+        return True
+    return False
+
+
+if __name__ == '__main__':
+    unlimited = okschema.compile([item])
+    length_limited = okschema.compile([item, {'@lteq': 100}])
+    limits = okschema.Limits(max_nodes=1000)
+    full = bench('validate() of every item', lambda: rejected(unlimited.validate), 3)
+    length = bench('list length limit', lambda: rejected(length_limited.validate), 3)
+    budget = bench('Limits(max_nodes=1000)', lambda: rejected(lambda d: unlimited.validate(d, limits=limits)), 3)
+    print('speedup: %.0fx with the length limit, %.0fx with the budget' % (full / length, full / budget))
@@ -0,0 +1,33 @@
+"""
+Validates a map of 100000 uuid keys to stock counts, with checked and trusted keys,
+and the same map checked by a dict-level validator, the way it was done without maps.
+
+    python benchmarks/bench_map.py
+"""
+import uuid
+
+from common import bench
+
+import okschema
+
+
+key = {'@t': 'str', '@format': 'uuid'}
+count = {'@t': 'int', '@gteq': 0}
+checked = {'@t': 'map', '@keys': key, '@values': count}
+trusted = {'@t': 'map', '@values': count}
+data = {str(uuid.UUID(int=i)): i for i in range(10 ** 5)}
+
+
+def check_stock(stock):
+    key_validator, count_validator = okschema.compile(key), okschema.compile(count)
+    return {key_validator.validate(k): count_validator.validate(v) for k, v in stock.items()}
+
+
+if __name__ == '__main__':
+    bench('dict-level validator', lambda: check_stock(data), 10)
+    for backend in ['tree', 'codegen']:
+        checked_validator = okschema.compile(checked, backend=backend)
+        trusted_validator = okschema.compile(trusted, backend=backend)
+        assert checked_validator.validate(data) == trusted_validator.validate(data) == data
+        bench('%s, checked keys' % backend, lambda: checked_validator.validate(data), 10)
+        bench('%s, trusted keys' % backend, lambda: trusted_validator.validate(data), 10)
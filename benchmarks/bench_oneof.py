@@ -0,0 +1,25 @@
+"""
+Validates 10000 events of a union of 20 event types,
+picking the branch by the discriminator and trying the branches in turn.
+
+    python benchmarks/bench_oneof.py
+"""
+from common import bench
+
+import okschema
+
+
+branches = {'event%d' % i: {'type': 'str', 'id': 'int', 'value%d' % i: 'decimal'} for i in range(20)}
+discriminated = [{'@discriminator': 'type', '@oneof': branches}]
+tried = [{'@oneof': list(branches.values())}]
+data = [{'type': 'event%d' % (i % 20), 'id': i, 'value%d' % (i % 20): '1.5'} for i in range(10000)]
+
+
+if __name__ == '__main__':
+    for backend in ['tree', 'codegen']:
+        by_discriminator = okschema.compile(discriminated, backend=backend)
+        in_turn = okschema.compile(tried, backend=backend)
+        assert by_discriminator.validate(data) == in_turn.validate(data)
+        fast = bench('%s, discriminator' % backend, lambda: by_discriminator.validate(data), 10)
+        slow = bench('%s, branches tried in turn' % backend, lambda: in_turn.validate(data), 10)
+        print('speedup: %.1fx' % (slow / fast))
@@ -0,0 +1,37 @@
+"""
+Compares serial validation of a large list with validation split across a process pool.
+
+    python benchmarks/bench_parallel.py
+"""
+import concurrent.futures, os
+
+from common import bench
+
+import okschema
+from okschema import fmt_uuid
+
+
+def val_even_id(x):
+    if x % 2:
+        raise okschema.NotValidError(okschema.ValidationCode.BAD_VALUE)
+    return x
+
+
+schema = [{
+    'id': {'@t': 'int', '@val': val_even_id},
+    'uuid': {'@t': 'str', '@regexp': fmt_uuid},
+    'price': {'@t': 'decimal', '@gteq': 0, '@lt': 1000},
+    'tags': [{'@t': 'str', '@lteq': 10}],
+}]
+data = [{'id': 2 * i, 'uuid': 'dbc8911c-92e8-4cdb-85b8-47a7a6a82db1', 'price': '%d.99' % (i % 1000),
+         'tags': ['a', 'b']} for i in range(200000)]
+
+
+if __name__ == '__main__':
+    validator = okschema.compile(schema)
+    workers = os.cpu_count() or 1
+    serial = bench('serial', lambda: validator.validate(data), 1, repeat=3)
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        validator.validate(data, executor=executor)  # start the workers
+        parallel = bench('%d processes' % workers, lambda: validator.validate(data, executor=executor), 1, repeat=3)
+    print('speedup: %.2fx' % (serial / parallel))
@@ -0,0 +1,40 @@
+"""
+Validates 10k order lines repeating a few product and address blocks,
+with and without the '@pure' option on those blocks.
+
+    python benchmarks/bench_pure.py
+"""
+from common import bench
+
+import okschema
+
+
+def schema(pure):
+    product = {
+        'sku': {'@t': 'str', '@regexp': '[A-Z]{3}-[0-9]{4}', '@fullmatch': True},
+        'name': {'@t': 'str', '@lteq': 200},
+        'price': {'@t': 'decimal', '@gt': 0},
+        'tags': [{'@t': 'str', '@in': ['new', 'sale', 'eco']}],
+        '@pure': pure,
+    }
+    address = {
+        'street': 'str', 'city': 'str', 'zip': {'@t': 'str', '@regexp': '[0-9]{5}'},
+        'country': {'@t': 'str', '@format': 'lang'}, '@pure': pure,
+    }
+    return [{'id': 'int', 'quantity': {'@t': 'int', '@gt': 0}, 'product': product, 'ship_to': address}]
+
+
+products = [{'sku': 'ABC-%04d' % i, 'name': 'Product %d' % i, 'price': '%d.99' % i, 'tags': ['new', 'eco']}
+            for i in range(1, 21)]
+addresses = [{'street': 'Main %d' % i, 'city': 'Berlin', 'zip': '1%04d' % i, 'country': 'de'} for i in range(5)]
+data = [{'id': i, 'quantity': 1 + i % 3, 'product': dict(products[i % 20]), 'ship_to': dict(addresses[i % 5])}
+        for i in range(10000)]
+
+
+if __name__ == '__main__':
+    plain = okschema.compile(schema(False))
+    pure = okschema.compile(schema(True))
+    assert plain.validate(data) == pure.validate(data)
+    without = bench('without @pure', lambda: plain.validate(data), 10)
+    with_pure = bench('with @pure', lambda: pure.validate(data), 10)
+    print('speedup: %.1fx' % (without / with_pure))
@@ -0,0 +1,40 @@
+"""
+Validates a comment thread of 9841 comments nested 9 levels deep with a recursive schema,
+and with the schema unrolled to the depth of the thread, the way it was done without references.
+
+    python benchmarks/bench_ref.py
+"""
+from common import bench
+
+import okschema
+
+
+DEPTH = 9
+recursive = {'@defs': {'comment': {'id': 'int', 'text': 'str', 'replies': [{'@ref': 'comment'}, {'@optional': True}]}},
+             '@ref': 'comment'}
+
+
+def unrolled(depth):
+    comment = {'id': 'int', 'text': 'str'}
+    if depth > 1:
+        comment['replies'] = [unrolled(depth - 1), {'@optional': True}]
+    return comment
+
+
+def thread(depth, ids):
+    comment = {'id': next(ids), 'text': 'comment'}
+    if depth > 1:
+        comment['replies'] = [thread(depth - 1, ids) for i in range(3)]
+    return comment
+
+
+data = thread(DEPTH, iter(range(10 ** 6)))
+
+
+if __name__ == '__main__':
+    for backend in ['tree', 'iterative']:
+        by_ref = okschema.compile(recursive, backend=backend)
+        by_copy = okschema.compile(unrolled(DEPTH), backend=backend)
+        assert by_ref.validate(data) == by_copy.validate(data) == data
+        bench('%s, unrolled schema' % backend, lambda: by_copy.validate(data), 10)
+        bench('%s, references' % backend, lambda: by_ref.validate(data), 10)
@@ -0,0 +1,45 @@
+"""
+Changes the price of one line of an order with 1000 lines,
+validating the whole patched order again and revalidating only the change.
+
+    python benchmarks/bench_revalidate.py
+"""
+import copy
+
+from common import bench
+
+import okschema
+
+
+def add_total(order):
+    order['total'] = sum(line['price'] for line in order['lines'])
+    return order
+
+
+schema = {
+    'customer': {'name': 'str', 'email': {'@t': 'str', '@format': 'email'}},
+    'lines': [{'sku': {'@t': 'str', '@regexp': '[A-Z]{3}-[0-9]{4}'}, 'price': {'@t': 'decimal', '@gt': 0},
+               'quantity': {'@t': 'int', '@gt': 0}}],
+    '@val': add_total,
+}
+data = {
+    'customer': {'name': 'John', 'email': 'john@example.com'},
+    'lines': [{'sku': 'ABC-%04d' % i, 'price': '%d.50' % i, 'quantity': 1} for i in range(1, 1001)],
+}
+
+
+if __name__ == '__main__':
+    validator = okschema.compile(schema)
+    previous = validator.validate(data)
+    patch = [{'op': 'replace', 'path': '/lines/500/price', 'value': '9.99'}]
+
+    def validate_patched():
+        patched = copy.copy(data)
+        patched['lines'] = list(data['lines'])
+        patched['lines'][500] = dict(data['lines'][500], price='9.99')
+        return validator.validate(patched)
+
+    assert validate_patched() == validator.revalidate(previous, patch)
+    full = bench('validate() of the patched order', validate_patched, 100)
+    incremental = bench('revalidate()', lambda: validator.revalidate(previous, patch), 100)
+    print('speedup: %.1fx' % (full / incremental))
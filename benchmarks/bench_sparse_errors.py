@@ -0,0 +1,43 @@
+"""
+Compares the default and the sparse error format when one item of a 1,000,000 element list fails.
+
+    python benchmarks/bench_sparse_errors.py
+"""
+import tracemalloc
+
+from common import bench
+
+import okschema
+from okschema import ValidationError
+
+
+schema = {'values': [{'@t': 'int', '@gteq': 0}]}
+data = {'values': list(range(1000000))}
+data['values'][500000] = -1
+
+
+def error_of(validate_fun):
+    try:
+        validate_fun(data)
+    except ValidationError as e:
+        return e
+    raise AssertionError('should raise')
+
+
+def peak_memory(fun):
+    tracemalloc.start()
+    fun()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    validator = okschema.compile(schema)
+    dense = lambda: error_of(validator.validate).js
+    sparse = lambda: error_of(lambda d: validator.validate(d, sparse=True)).js
+    assert error_of(lambda d: validator.validate(d, sparse=True)).to_dense() == dense()
+    number = 3
+    bench('default error format', dense, number)
+    bench('sparse=True', sparse, number)
+    print('peak memory: default %.1f MB, sparse %.1f MB' % (peak_memory(dense) / 1e6, peak_memory(sparse) / 1e6))
@@ -0,0 +1,30 @@
+"""
+Validates a list of 10^6 ints, item by item and at once with NumPy (see okschema.vectorized).
+
+    python benchmarks/bench_vectorized.py
+"""
+import array
+
+from common import bench
+
+import okschema
+from okschema import vectorized
+
+
+schema = [{'@t': 'int', '@gteq': 0, '@lt': 1000}]
+data = [i % 1000 for i in range(10 ** 6)]
+
+
+if __name__ == '__main__':
+    validator = okschema.compile(schema)
+    min_length, vectorized.MIN_LENGTH = vectorized.MIN_LENGTH, len(data) + 1
+    item_by_item = bench('item by item', lambda: validator.validate(data), 1, repeat=3)
+    vectorized.MIN_LENGTH = min_length
+    if vectorized.numpy is None:
+        print('numpy is not installed')
+    else:
+        at_once = bench('list, numpy', lambda: validator.validate(data), 1, repeat=3)
+        print('speedup: %.2fx' % (item_by_item / at_once))
+        ints = array.array('q', data)
+        at_once = bench('array.array, numpy', lambda: validator.validate(ints), 1, repeat=3)
+        print('speedup: %.2fx' % (item_by_item / at_once))
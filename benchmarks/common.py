@@ -0,0 +1,11 @@
+"""Helpers shared by the benchmark scripts."""
+import os, sys, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def bench(name, fun, number, repeat=5):
+    """Prints and returns the best time of `number` calls of fun."""
+    seconds = min(timeit.repeat(fun, number=number, repeat=repeat))
+    print('%-40s %10.1f us/call' % (name, seconds / number * 1e6))
+    return seconds
@@ -1,4 +1,14 @@
 from .schema import  NotValidError, NotValidButContinueError, ValidationCode, SchemaCode, \
     validate, ValidationError, SchemaError, val_date, val_datetime, NotHere, fmt_lang, fmt_uuid
+from .checker import check_schema
+from .compiler import compile, Validator, is_valid
+from .cache import SchemaCache, schema_cache, compile_cached
+from .stream import iter_validate
+from .aio import avalidate
+from .batch import validate_batch
+from .memo import cached, CachedValidator
+from .lazy import validate_lazy, LazyDict, LazyList
+from .limits import Limits
+from .jsonio import validate_json
 
 VERSION = '0.2'
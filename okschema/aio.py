@@ -0,0 +1,176 @@
+"""
+Validation with asynchronous validators.
+
+Validators may be `async def` functions (or return any awaitable), e.g. validators looking values up in a database.
+Fields of a dict and items of a list are validated concurrently; the validators of a single field
+are still called one after another, with the same NotValidButContinueError handling as call_validators.
+References to definitions of '@defs' are followed up to compiler.DEFAULT_MAX_REF_DEPTH nested references.
+"""
+import asyncio, inspect
+
+from .schema import NotValidError, NotValidButContinueError, ValidationCode, ValidationError, SchemaError, \
+    SchemaCode, NotHere, _StructureCode, determine_field_type, handle_optional_and_default_when_data_nothere, \
+    cast_data, get_bool_opt_from_schema, verify_regexp_and_blank, verify_limit, pendulum_value, \
+    verify_list_length, select_oneof_branch
+from .compiler import DEFAULT_MAX_REF_DEPTH
+
+
+async def avalidate(schema, data, limit=None):
+    """
+    Validates data according to the schema, same as validate(), awaiting asynchronous validators.
+    :param limit: maximum number of validators awaited at the same time, None for no limit
+    """
+    semaphore = asyncio.Semaphore(limit) if limit is not None else None
+    try:
+        return await _avalidate(schema, data, semaphore, schema.get('@defs') if isinstance(schema, dict) else None)
+    except NotValidError as e:
+        raise ValidationError(e.jsonize(), schema)
+
+
+async def _avalidate(schema, data, semaphore, defs=None, depth=0):
+    """Validates a single json value, see _validate. depth is the number of nested references to defs."""
+    if isinstance(schema, list):
+        return await _ahandle_list(schema, data, semaphore, defs, depth)
+    if isinstance(schema, dict) and '@ref' in schema and '@t' not in schema:
+        if (data is NotHere and get_bool_opt_from_schema(schema, '@optional')) or \
+                (data is None and get_bool_opt_from_schema(schema, '@null')):
+            return handle_optional_and_default_when_data_nothere(schema) if data is NotHere else None
+        if not isinstance(defs, dict) or schema['@ref'] not in defs:
+            raise SchemaError(SchemaCode.BAD_REF)
+        if depth >= DEFAULT_MAX_REF_DEPTH:
+            raise NotValidError(ValidationCode.TOO_DEEP, DEFAULT_MAX_REF_DEPTH)
+        return await _avalidate(defs[schema['@ref']], data, semaphore, defs, depth + 1)
+
+    ftype = determine_field_type(schema)
+
+    if data is NotHere:
+        return handle_optional_and_default_when_data_nothere(schema)
+    if data is None:
+        if not get_bool_opt_from_schema(schema, '@null'):
+            raise NotValidError(ValidationCode.NULL)
+        return None
+    data = cast_data(ftype, data)
+
+    if ftype == 'oneof':
+        if '@discriminator' in schema:
+            return await _avalidate(select_oneof_branch(schema, data), data, semaphore, defs, depth)
+        errors = []
+        for branch in schema['@oneof']:
+            try:
+                return await _avalidate(branch, data, semaphore, defs, depth)
+            except NotValidError as e:
+                errors.append(e.jsonize())
+        raise NotValidError(ValidationCode.MANY_ERRORS, errors)
+
+    if ftype == 'map':
+        keys = list(data)
+        if '@keys' in schema:
+            rc_keys = await _gather([_avalidate(schema['@keys'], key, semaphore, defs, depth) for key in keys])
+        else:
+            rc_keys = keys
+        valid_keys = [key for key, rc_key in zip(keys, rc_keys) if not isinstance(rc_key, NotValidError)]
+        results = iter(await _gather([_avalidate(schema['@values'], data[key], semaphore, defs, depth)
+                                      for key in valid_keys]))
+        error_details = {}
+        rc_data = {}
+        for key, rc_key in zip(keys, rc_keys):
+            # Errors are recorded in the order of the keys, like validate() does.
+            if isinstance(rc_key, NotValidError):
+                error_details[key] = {'code': ValidationCode.BAD_KEY.value, 'details': rc_key.jsonize()}
+                continue
+            rc_subdata = next(results)
+            if isinstance(rc_subdata, NotValidError):
+                error_details[key] = rc_subdata.jsonize()
+            else:
+                rc_data[rc_key] = rc_subdata
+        if error_details:
+            raise NotValidError(_StructureCode.DICT, error_details)
+        return rc_data
+
+    if ftype == 'dict':
+        fieldnames = [fieldname for fieldname in schema if fieldname[0] != '@'] if isinstance(schema, dict) else []
+        results = await _gather([_avalidate(schema[fieldname], data.get(fieldname, NotHere), semaphore, defs, depth)
+                                 for fieldname in fieldnames])
+        error_details = {}
+        rc_data = {}
+        for fieldname, rc_subdata in zip(fieldnames, results):
+            if isinstance(rc_subdata, NotValidError):
+                error_details[fieldname] = rc_subdata.jsonize()
+            elif rc_subdata is not NotHere:
+                rc_data[fieldname] = rc_subdata
+        if error_details:
+            raise NotValidError(_StructureCode.DICT, error_details)
+        if '@val' in schema:
+            rc_data = await acall_validators(schema['@val'], rc_data, semaphore)
+        return rc_data
+
+    if ftype in ['date', 'datetime'] and get_bool_opt_from_schema(schema, '@pendulum'):
+        data = pendulum_value(data)
+    if not isinstance(schema, dict):
+        return data
+    verify_regexp_and_blank(schema, ftype, data)
+    for optname, optval in schema.items():
+        if optname == '@val':
+            data = await acall_validators(optval, data, semaphore)
+        elif optname[0] == '@':
+            verify_limit(ftype, optname[1:], optval, data)
+    return data
+
+
+async def _ahandle_list(schema, data, semaphore, defs=None, depth=0):
+    list_opts = schema[1] if len(schema) == 2 else {}
+    if data is NotHere:
+        return handle_optional_and_default_when_data_nothere(list_opts)
+    if not isinstance(data, list):
+        raise NotValidError(ValidationCode.BAD_TYPE)
+    verify_list_length(list_opts, data)
+    results = await _gather([_avalidate(schema[0], data_item, semaphore, defs, depth) for data_item in data])
+    if any(isinstance(result, NotValidError) for result in results):
+        raise NotValidError(_StructureCode.LIST,
+                            [result.jsonize() if isinstance(result, NotValidError) else None for result in results])
+    return results
+
+
+async def _gather(coroutines):
+    """Runs coroutines concurrently, returns their results with NotValidErrors in place of failed results."""
+    results = await asyncio.gather(*coroutines, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, NotValidError):
+            raise result
+    return results
+
+
+async def acall_validators(validators, data, semaphore=None):
+    """Calls validators on data like call_validators, awaiting those returning awaitables."""
+    if callable(validators):
+        return await _call(validators, data, semaphore)
+    if not isinstance(validators, list):
+        raise SchemaError(SchemaCode.VAL_NOT_CALLABLE)
+    error_collection = []
+    try:
+        for val_fun in validators:
+            if not callable(val_fun):
+                raise SchemaError(SchemaCode.VAL_NOT_CALLABLE)
+            try:
+                data = await _call(val_fun, data, semaphore)
+            except NotValidButContinueError as e:
+                # Continue calling next validators with the same input.
+                error_collection.append(e)
+    except NotValidError as e:
+        error_collection.append(e)
+
+    if error_collection:
+        if len(error_collection) == 1:
+            raise error_collection[0]
+        raise NotValidError(ValidationCode.MANY_ERRORS, [e.jsonize() for e in error_collection])
+    return data
+
+
+async def _call(val_fun, data, semaphore):
+    result = val_fun(data)
+    if inspect.isawaitable(result):
+        if semaphore is None:
+            return await result
+        async with semaphore:
+            return await result
+    return result
@@ -0,0 +1,212 @@
+"""
+Columnar validation of lists of flat records.
+
+validate_batch(schema, records) returns the same results and errors as validate([schema], records).
+Instead of validating one record after another, the values of every scalar field are gathered into a column
+and each check of the field (type, regexp, format, blank strings, @in, comparisons, validators) runs over the whole
+column in one pass. Per-record results and errors are then rebuilt from the columns.
+Fields holding dicts or lists, and dict-level validators, are still validated record by record.
+"""
+from .schema import NotValidError, ValidationCode, ValidationError, NotHere
+from .cache import compile_cached
+from . import formats
+from .compiler import _Context, _DictNode, _ScalarNode, _INVALID, _comparisons, _compile_validators
+
+
+def validate_batch(schema, records, fail_fast=False):
+    """
+    Validates a list of records, same as validate([schema], records, fail_fast).
+    The schema is compiled through okschema.cache.
+    """
+    validator = compile_cached([schema])
+    item = validator._root.item
+    if fail_fast or type(item) is not _DictNode or not isinstance(records, list):
+        return validator.validate(records, fail_fast)
+    ctx = _Context()
+    errors = {}
+    dict_indices = []
+    results = [None] * len(records)
+    for i, record in enumerate(records):
+        if isinstance(record, dict):
+            dict_indices.append(i)
+        else:
+            result = item.not_a_dict(record, ctx)
+            if result is _INVALID:
+                errors[i] = ctx.error
+            else:
+                results[i] = result
+    columns = []
+    field_specs = [spec for fieldname, spec in validator.spec['item']['fields']]
+    for (fieldname, node), spec in zip(item.fields, field_specs):
+        values = [records[i].get(fieldname, NotHere) for i in dict_indices]
+        columns.append((fieldname, values, _validate_column(node, spec, values, ctx)))
+
+    for j, i in enumerate(dict_indices):
+        rc_data = {}
+        record_errors = None
+        for fieldname, values, column_errors in columns:
+            if j in column_errors:
+                if record_errors is None:
+                    record_errors = {}
+                record_errors[fieldname] = column_errors[j]
+            elif values[j] is not NotHere:
+                rc_data[fieldname] = values[j]
+        if record_errors is not None:
+            errors[i] = record_errors
+        elif item.validators is not None:
+            result = item.validators(rc_data, ctx)
+            if result is _INVALID:
+                errors[i] = ctx.error
+            else:
+                results[i] = result
+        else:
+            results[i] = rc_data
+    if errors:
+        error_list = [None] * len(records)
+        for i, error in errors.items():
+            error_list[i] = error
+        raise ValidationError(error_list, validator.schema)
+    return results
+
+
+def _validate_column(node, spec, values, ctx):
+    """Replaces values of a column with validated values, returns {index: error} of the invalid ones."""
+    errors = {}
+    if type(node) is not _ScalarNode:
+        for j, value in enumerate(values):
+            result = node.validate(value, ctx)
+            if result is _INVALID:
+                errors[j] = ctx.error
+            else:
+                values[j] = result
+        return errors
+
+    # Missing values and nulls.
+    indices = []
+    for j, value in enumerate(values):
+        if value is NotHere or value is None:
+            result = node.validate(value, ctx)
+            if result is _INVALID:
+                errors[j] = ctx.error
+            else:
+                values[j] = result
+        else:
+            indices.append(j)
+
+    for check in _column_checks(node, spec):
+        if not indices:
+            break
+        bad = check(values, indices, errors, ctx)
+        if bad:
+            bad = set(bad)
+            indices = [j for j in indices if j not in bad]
+    return errors
+
+
+def _column_checks(node, spec):
+    """Checks of a scalar column in the order of the per-value checks, see compiler._compile_checks."""
+    checks = [_type_check(spec['type'], node.cast)]
+    if spec['regexp'] is not None:
+        checks.append(_regexp_check(spec['regexp'], spec['fullmatch']))
+    if spec['format'] is not None:
+        checks.append(_format_check(spec['format']))
+    if spec['type'] == 'str' and not spec['blank']:
+        checks.append(_not_blank_check)
+    for optname, optval in spec['checks']:
+        if optname == 'in':
+            checks.append(_in_check(optval))
+        elif optname == 'val':
+            checks.append(_validators_check(optval))
+        else:
+            op, code = _comparisons[optname]
+            checks.append(_comparison_check(op, code, optval, spec['type'] == 'str'))
+    return checks
+
+
+# A check takes the column, the indices of values still valid and the error map,
+# and returns the indices of values that failed, after storing their errors.
+
+def _fail(errors, bad, ctx, code, details=None):
+    for j in bad:
+        ctx.fail(code, details)
+        errors[j] = ctx.error
+    return bad
+
+
+def _type_check(ftype, cast):
+    if ftype in ['str', 'int']:
+        expected = str if ftype == 'str' else int
+
+        def check(values, indices, errors, ctx):
+            bad = [j for j in indices if not isinstance(values[j], expected)]
+            return _fail(errors, bad, ctx, ValidationCode.BAD_TYPE)
+        return check
+
+    def check(values, indices, errors, ctx):
+        bad = []
+        for j in indices:
+            value = cast(values[j])
+            if value is _INVALID:
+                bad.append(j)
+            else:
+                values[j] = value
+        return _fail(errors, bad, ctx, ValidationCode.BAD_TYPE)
+    return check
+
+
+def _regexp_check(pattern, fullmatch=False):
+    match = pattern.fullmatch if fullmatch else pattern.match
+
+    def check(values, indices, errors, ctx):
+        bad = [j for j in indices if not match(values[j])]
+        return _fail(errors, bad, ctx, ValidationCode.REGEXP)
+    return check
+
+
+def _format_check(name):
+    is_valid = formats.FORMATS[name]
+
+    def check(values, indices, errors, ctx):
+        bad = [j for j in indices if not is_valid(values[j])]
+        return _fail(errors, bad, ctx, ValidationCode.BAD_FORMAT, name)
+    return check
+
+
+def _not_blank_check(values, indices, errors, ctx):
+    bad = [j for j in indices if not len(values[j])]
+    return _fail(errors, bad, ctx, ValidationCode.NOT_GT, 0)
+
+
+def _in_check(allowed):
+    def check(values, indices, errors, ctx):
+        bad = [j for j in indices if values[j] not in allowed]
+        return _fail(errors, bad, ctx, ValidationCode.NOT_IN)
+    return check
+
+
+def _comparison_check(op, code, bound, by_length):
+    if by_length:
+        def check(values, indices, errors, ctx):
+            bad = [j for j in indices if not op(len(values[j]), bound)]
+            return _fail(errors, bad, ctx, code, bound)
+    else:
+        def check(values, indices, errors, ctx):
+            bad = [j for j in indices if not op(values[j], bound)]
+            return _fail(errors, bad, ctx, code, bound)
+    return check
+
+
+def _validators_check(validators):
+    call = _compile_validators(validators)
+
+    def check(values, indices, errors, ctx):
+        bad = []
+        for j in indices:
+            try:
+                values[j] = call(values[j])
+            except NotValidError as e:
+                ctx.fail_with(e)
+                errors[j] = ctx.error
+                bad.append(j)
+        return bad
+    return check
@@ -0,0 +1,141 @@
+"""
+Cache of compiled schemas.
+
+Schemas are keyed by a structural fingerprint, so a schema dict rebuilt for every request
+(e.g. by a `lambda m: {...}` schema factory) maps to the validator compiled the first time.
+Nodes of identical subschemas are interned and shared by all validators compiled through the same cache.
+"""
+import collections, re, threading, types, weakref
+
+from . import compiler
+
+
+def fingerprint(schema):
+    """
+    Returns a hashable value identifying the structure of a schema (raw or normalized).
+    Schemas with equal fingerprints validate data the same way.
+    """
+    tokens = []
+    _tokens(schema, tokens.append)
+    return tuple(tokens)
+
+
+def _tokens(value, append):
+    # Flat prefix encoding, cheaper to build and hash than nested tuples.
+    vtype = type(value)
+    append(vtype)
+    if vtype is str or vtype is int:
+        append(value)
+    elif isinstance(value, dict):
+        append(len(value))
+        for key, subvalue in value.items():
+            _tokens(key, append)
+            _tokens(subvalue, append)
+    elif isinstance(value, (list, tuple)):
+        append(len(value))
+        for subvalue in value:
+            _tokens(subvalue, append)
+    elif isinstance(value, (set, frozenset)):
+        append(frozenset(fingerprint(subvalue) for subvalue in value))
+    elif vtype is types.FunctionType:
+        # Functions created by the same code with the same defaults and closure behave the same,
+        # even if a schema factory creates new function objects every time.
+        append(id(value.__code__))
+        _tokens(value.__defaults__, append)
+        _tokens(value.__kwdefaults__, append)
+        closure = value.__closure__ or ()
+        append(len(closure))
+        for cell in closure:
+            contents = cell.cell_contents
+            if callable(contents):
+                append(id(contents))  # don't follow (possibly recursive) references between functions
+            else:
+                _tokens(contents, append)
+    elif vtype is types.MethodType:
+        _tokens(value.__func__, append)
+        append(id(value.__self__))
+    elif vtype is re.Pattern:
+        append(value.pattern)
+        append(value.flags)
+    else:
+        try:
+            hash(value)
+        except TypeError:
+            value = id(value)
+        append(value)
+
+
+class SchemaCache:
+    """
+    Bounded LRU cache of compiled validators.
+    Thread safe. Validators hold references to their schemas, which keeps identity based parts
+    of the fingerprints (ids of objects) valid for as long as an entry is cached.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = self.misses = self.evictions = 0
+        self._validators = collections.OrderedDict()
+        self._interned = _InternTable()
+        self._lock = threading.Lock()
+
+    def compile(self, schema, backend='tree'):
+        """Returns the cached validator for the schema, compiling it on first use."""
+        key = backend, fingerprint(schema)
+        with self._lock:
+            validator = self._validators.get(key)
+            if validator is not None:
+                self._validators.move_to_end(key)
+                self.hits += 1
+                return validator
+            self.misses += 1
+        validator = compiler.compile(schema, backend, interned=self._interned)
+        with self._lock:
+            self._validators[key] = validator
+            self._validators.move_to_end(key)
+            while len(self._validators) > self.maxsize:
+                self._validators.popitem(last=False)
+                self.evictions += 1
+        return validator
+
+    def stats(self):
+        """Returns hit, miss and eviction counters and the current size of the cache."""
+        with self._lock:
+            return {
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self._validators), 'maxsize': self.maxsize, 'interned_nodes': len(self._interned),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._validators.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+class _InternTable:
+    """Nodes of compiled subschemas keyed by fingerprints, kept only while some validator uses them."""
+
+    def __init__(self):
+        self._nodes = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def node(self, spec, build):
+        key = fingerprint(spec)
+        with self._lock:
+            node = self._nodes.get(key)
+        if node is None:
+            node = build()
+            with self._lock:
+                node = self._nodes.setdefault(key, node)
+        return node
+
+
+schema_cache = SchemaCache()
+
+
+def compile_cached(schema, backend='tree'):
+    """Compiles the schema through the default schema_cache."""
+    return schema_cache.compile(schema, backend)
@@ -0,0 +1,407 @@
+"""
+Static schema analysis.
+
+Walks the whole schema once, reports every problem together with its path and
+normalizes the schema into the internal form used by compiled validators:
+
+    {
+        'type': 'str' | 'int' | 'decimal' | 'float' | 'bool' | 'date' | 'datetime' | 'dict' | 'map' | 'list' | 'oneof'
+                | 'ref',
+        'optional': bool,
+        'null': bool,
+        'default': value,  # only present when the schema defines a default
+        # scalars
+        'blank': bool,
+        'regexp': compiled pattern or None,
+        'fullmatch': bool,  # the regexp must match the whole string
+        'format': name of a format in okschema.formats or None,
+        'pendulum': bool,  # dates and datetimes are converted to pendulum values
+        'checks': [('in' | 'gt' | 'gteq' | 'lt' | 'lteq' | 'neq' | 'val', value), ...],  # in schema order
+        # dicts
+        'fields': [(fieldname, normalized subschema), ...],
+        'val': (val_fun, ...) or None,
+        'pure': bool,  # dicts and lists, results are cached for repeated values (see compiler._PureNode)
+        # lists
+        'item': normalized subschema,
+        'ndarray': bool,  # see okschema.vectorized
+        'length': [('gt' | 'gteq' | 'lt' | 'lteq', int), ...],  # limits of the length of the list, in schema order
+        # maps
+        'keys': normalized string subschema or None,  # None when keys are not checked
+        'values': normalized subschema,
+        # references, schemas with '@ref', missing values and nulls are accepted if either the reference
+        # or the definition accepts them
+        'definition': Definition,
+        # unions, schemas with '@oneof'
+        'discriminator': fieldname or None,  # None when branches are tried in turn
+        'branches': [(discriminator value or index, normalized subschema), ...],
+    }
+"""
+import re
+
+from .schema import SchemaError, SchemaCode
+from . import formats, vectorized
+
+
+SCALAR_TYPES = {'string': 'str', 'str': 'str', 'int': 'int', 'decimal': 'decimal', 'float': 'float', 'bool': 'bool',
+                'date': 'date', 'datetime': 'datetime'}
+DATE_TYPES = ['date', 'datetime']
+COMPARABLE_TYPES = ['str', 'int', 'decimal', 'float']
+COMPARISONS = ['gt', 'gteq', 'lt', 'lteq', 'neq']
+
+_comparison_options = ['@' + op for op in COMPARISONS]
+_common_options = ['@t', '@optional', '@null', '@default']
+_scalar_options = _common_options + ['@blank', '@regexp', '@fullmatch', '@format', '@pendulum', '@in', '@val'] \
+    + _comparison_options
+_dict_options = _common_options + ['@val', '@pure']
+_list_length_options = ['@gt', '@gteq', '@lt', '@lteq']
+_list_options = ['@optional', '@default', '@ndarray', '@pure'] + _list_length_options
+_map_options = _common_options + ['@keys', '@values']
+_oneof_options = ['@optional', '@null', '@default', '@oneof', '@discriminator']
+_ref_options = ['@optional', '@null', '@default', '@ref']
+_known_options = set(_scalar_options + _dict_options + _map_options + _list_options + _oneof_options + _ref_options)
+_string_flags = ['@optional', '@null', '@pendulum']
+
+
+def check_schema(schema):
+    """
+    Returns a list of problems found in the schema, empty if there are none.
+    Every problem is {'path': [key or index, ...], 'code': SchemaCode, 'details': ...}.
+    """
+    problems = []
+    _normalize_root(schema, problems)
+    return problems
+
+
+def normalize(schema):
+    """Returns the internal form of the schema or raises SchemaError with the list of all problems."""
+    problems = []
+    spec = _normalize_root(schema, problems)
+    if problems:
+        raise SchemaError(problems)
+    return spec
+
+
+class Definition:
+    """
+    A named schema of '@defs', normalized once. References to it link to this object, so its spec may contain
+    itself through them. Compiled validators compile it once into node (see compiler._RefNode).
+    """
+
+    __slots__ = ('name', 'spec', 'node', 'compiling')
+
+    def __init__(self, name):
+        self.name = name
+        self.spec = None
+        self.node = None
+        self.compiling = False
+
+    def __getstate__(self):
+        # Compiled nodes are not pickled, e.g. for okschema.parallel.
+        return self.name, self.spec
+
+    def __setstate__(self, state):
+        self.__init__(state[0])
+        self.spec = state[1]
+
+    def __repr__(self):
+        return 'Definition(%r)' % self.name
+
+
+def _normalize_root(schema, problems):
+    """Named definitions are only allowed at the top of the schema, where they are visible everywhere."""
+    defs = None
+    if isinstance(schema, dict) and '@defs' in schema:
+        defs = _definitions(schema['@defs'], ['@defs'], problems)
+        schema = {key: value for key, value in schema.items() if key != '@defs'}
+    return _normalize(schema, [], problems, defs)
+
+
+def _definitions(definitions, path, problems):
+    if not isinstance(definitions, dict):
+        _problem(problems, path, SchemaCode.BAD_SCHEMA, 'definitions must be a dict')
+        return None
+    defs = {}
+    for name in definitions:
+        if not isinstance(name, str) or not name:
+            _problem(problems, path + [name], SchemaCode.BAD_FIELD_NAME)
+        else:
+            defs[name] = Definition(name)
+    for name, definition in defs.items():
+        definition.spec = _normalize(definitions[name], path + [name], problems, defs)
+    for name, definition in defs.items():
+        # A definition reaching itself through references and unions only, without a dict or a list in between,
+        # would validate the same value over and over.
+        reached = set()
+        todo = _unnested_refs(definition.spec)
+        while todo:
+            target = todo.pop()
+            if target not in reached:
+                reached.add(target)
+                todo.extend(_unnested_refs(target.spec))
+        if definition in reached:
+            _problem(problems, path + [name], SchemaCode.BAD_REF, 'reference cycle')
+    return defs
+
+
+def _unnested_refs(spec):
+    """Definitions a value is validated with by spec itself, not by the fields or items of its dicts or lists."""
+    if spec['type'] == 'ref':
+        return [spec['definition']]
+    if spec['type'] == 'oneof':
+        return [definition for key, subspec in spec['branches'] for definition in _unnested_refs(subspec)]
+    return []
+
+
+def _problem(problems, path, code, details=None):
+    problem = {'path': list(path), 'code': code}
+    if details is not None:
+        problem['details'] = details
+    problems.append(problem)
+
+
+def _normalize(schema, path, problems, defs=None):
+    if isinstance(schema, list):
+        return _normalize_list(schema, path, problems, defs)
+    if isinstance(schema, str):
+        ftype, *flags = schema.split(',')
+        for flag in flags:
+            if flag not in _string_flags:
+                _problem(problems, path, SchemaCode.UNKNOWN_OPTION, flag)
+        spec = {'optional': '@optional' in flags, 'null': '@null' in flags}
+        if ftype == 'dict':
+            spec.update(type='dict', fields=[], val=None, pure=False)
+            return spec
+        # Blank strings are only rejected when the schema is a dict.
+        spec.update(type=_scalar_type(ftype, path, problems), blank=True, regexp=None, fullmatch=False, format=None,
+                    pendulum='@pendulum' in flags, checks=[])
+        if spec['pendulum'] and spec['type'] not in DATE_TYPES:
+            _problem(problems, path, SchemaCode.BAD_OPTION, 'pendulum needs a date type')
+        return spec
+    if not isinstance(schema, dict):
+        _problem(problems, path, SchemaCode.BAD_SCHEMA, type(schema).__name__)
+        return {'type': 'dict', 'optional': False, 'null': False, 'fields': [], 'val': None}
+
+    ftype = schema.get('@t', 'oneof' if '@oneof' in schema else 'dict')
+    spec = {'optional': bool(schema.get('@optional', False)), 'null': bool(schema.get('@null', False))}
+    if '@default' in schema:
+        spec['default'] = schema['@default']
+    if ftype == 'oneof' and '@t' not in schema:
+        return _normalize_oneof(schema, spec, path, problems, defs)
+    if '@ref' in schema and '@t' not in schema:
+        return _normalize_ref(schema, spec, path, problems, defs)
+    if ftype == 'dict':
+        spec.update(type='dict', fields=[], val=None, pure=bool(schema.get('@pure', False)))
+        for key, value in schema.items():
+            if not isinstance(key, str) or not key:
+                _problem(problems, path + [key], SchemaCode.BAD_FIELD_NAME)
+            elif key[0] != '@':
+                spec['fields'].append((key, _normalize(value, path + [key], problems, defs)))
+            elif key == '@val':
+                spec['val'] = _validators(value, path + [key], problems)
+            elif key not in _dict_options:
+                _unsupported_option(key, path, problems, 'dict')
+        if spec['pure']:
+            _check_pure(spec, path + ['@pure'], problems)
+        return spec
+    if ftype == 'map':
+        return _normalize_map(schema, spec, path, problems, defs)
+
+    spec.update(type=_scalar_type(ftype, path + ['@t'], problems), blank=bool(schema.get('@blank', False)),
+                regexp=None, fullmatch=bool(schema.get('@fullmatch', False)), format=None,
+                pendulum=bool(schema.get('@pendulum', False)), checks=[])
+    for key, value in schema.items():
+        if not isinstance(key, str) or not key:
+            _problem(problems, path + [key], SchemaCode.BAD_FIELD_NAME)
+        elif key[0] != '@':
+            # Subfields of scalars are never looked at.
+            _problem(problems, path + [key], SchemaCode.BAD_OPTION, 'fields need dict type')
+        elif key not in _scalar_options:
+            _unsupported_option(key, path, problems, spec['type'])
+        elif key == '@regexp':
+            if spec['type'] != 'str':
+                _problem(problems, path + [key], SchemaCode.BAD_OPTION, 'regexp needs a string type')
+            try:
+                spec['regexp'] = re.compile(value)
+            except (re.error, TypeError) as e:
+                _problem(problems, path + [key], SchemaCode.BAD_OPTION, str(e))
+        elif key == '@fullmatch':
+            if '@regexp' not in schema:
+                _problem(problems, path + [key], SchemaCode.BAD_OPTION, 'fullmatch needs a regexp')
+        elif key == '@format':
+            if spec['type'] != 'str':
+                _problem(problems, path + [key], SchemaCode.BAD_OPTION, 'format needs a string type')
+            if not isinstance(value, str) or value not in formats.FORMATS:
+                _problem(problems, path + [key], SchemaCode.BAD_OPTION, 'unknown format')
+            else:
+                spec['format'] = value
+        elif key == '@pendulum':
+            if spec['type'] not in DATE_TYPES:
+                _problem(problems, path + [key], SchemaCode.BAD_OPTION, 'pendulum needs a date type')
+        elif key == '@in':
+            if not hasattr(value, '__contains__') and not hasattr(value, '__iter__'):
+                _problem(problems, path + [key], SchemaCode.BAD_OPTION, 'not a container')
+            spec['checks'].append(('in', value))
+        elif key in _comparison_options:
+            if spec['type'] not in COMPARABLE_TYPES:
+                _problem(problems, path + [key], SchemaCode.ILLEGAL_COMPARISON)
+            spec['checks'].append((key[1:], value))
+        elif key == '@val':
+            spec['checks'].append(('val', _validators(value, path + [key], problems)))
+    return spec
+
+
+def _normalize_list(schema, path, problems, defs=None):
+    spec = {'type': 'list', 'optional': False, 'null': False, 'ndarray': False, 'pure': False, 'length': []}
+    if len(schema) not in [1, 2]:
+        _problem(problems, path, SchemaCode.BAD_SCHEMA, 'list schema must have 1 or 2 elements')
+    if len(schema) == 0:
+        spec['item'] = _normalize({}, path + [0], [])
+        return spec
+    spec['item'] = _normalize(schema[0], path + [0], problems, defs)
+    if len(schema) == 2:
+        list_opts = schema[1]
+        if not isinstance(list_opts, dict):
+            _problem(problems, path + [1], SchemaCode.BAD_SCHEMA, 'list options must be a dict')
+            return spec
+        for key, value in list_opts.items():
+            if key not in _list_options:
+                _unsupported_option(key, path + [1], problems, 'list')
+            elif key in _list_length_options:
+                if not isinstance(value, int) or isinstance(value, bool):
+                    _problem(problems, path + [1, key], SchemaCode.BAD_OPTION, 'list length limit must be an int')
+                spec['length'].append((key[1:], value))
+        spec['optional'] = bool(list_opts.get('@optional', False))
+        spec['ndarray'] = bool(list_opts.get('@ndarray', False))
+        spec['pure'] = bool(list_opts.get('@pure', False))
+        if spec['pure']:
+            _check_pure(spec, path + [1, '@pure'], problems)
+        if spec['ndarray'] and vectorized.numpy is None:
+            _problem(problems, path + [1, '@ndarray'], SchemaCode.BAD_OPTION, 'needs numpy')
+        if '@default' in list_opts:
+            spec['default'] = list_opts['@default']
+    return spec
+
+
+def _normalize_ref(schema, spec, path, problems, defs=None):
+    spec['type'] = 'ref'
+    for key in schema:
+        if not isinstance(key, str) or not key:
+            _problem(problems, path + [key], SchemaCode.BAD_FIELD_NAME)
+        elif key[0] != '@':
+            _problem(problems, path + [key], SchemaCode.BAD_OPTION, 'fields need dict type')
+        elif key not in _ref_options:
+            _unsupported_option(key, path, problems, 'ref')
+    name = schema['@ref']
+    try:
+        spec['definition'] = defs[name]
+    except (KeyError, TypeError):
+        _problem(problems, path + ['@ref'], SchemaCode.BAD_REF, name if isinstance(name, str) else None)
+        spec['definition'] = Definition(name)
+        spec['definition'].spec = _normalize({}, path, [])
+    return spec
+
+
+def _normalize_map(schema, spec, path, problems, defs=None):
+    spec.update(type='map', keys=None)
+    for key in schema:
+        if not isinstance(key, str) or not key:
+            _problem(problems, path + [key], SchemaCode.BAD_FIELD_NAME)
+        elif key[0] != '@':
+            _problem(problems, path + [key], SchemaCode.BAD_OPTION, 'fields need dict type')
+        elif key not in _map_options:
+            _unsupported_option(key, path, problems, 'map')
+    if '@keys' in schema:
+        spec['keys'] = _normalize(schema['@keys'], path + ['@keys'], problems, defs)
+        if spec['keys']['type'] != 'str':
+            _problem(problems, path + ['@keys'], SchemaCode.BAD_OPTION, 'keys must be strings')
+    if '@values' in schema:
+        spec['values'] = _normalize(schema['@values'], path + ['@values'], problems, defs)
+    else:
+        _problem(problems, path, SchemaCode.BAD_OPTION, 'map without @values')
+        spec['values'] = _normalize({}, path + ['@values'], [])
+    return spec
+
+
+def _normalize_oneof(schema, spec, path, problems, defs=None):
+    discriminator = schema.get('@discriminator')
+    spec.update(type='oneof', discriminator=discriminator, branches=[])
+    for key in schema:
+        if not isinstance(key, str) or not key:
+            _problem(problems, path + [key], SchemaCode.BAD_FIELD_NAME)
+        elif key[0] != '@':
+            _problem(problems, path + [key], SchemaCode.BAD_OPTION, 'fields need dict type')
+        elif key not in _oneof_options:
+            _unsupported_option(key, path, problems, 'oneof')
+    branches = schema['@oneof']
+    if '@discriminator' not in schema:
+        if not isinstance(branches, list) or not branches:
+            _problem(problems, path + ['@oneof'], SchemaCode.BAD_OPTION, 'must be a non-empty list of schemas')
+            return spec
+        items = enumerate(branches)
+    else:
+        if not isinstance(discriminator, str) or not discriminator or discriminator[0] == '@':
+            _problem(problems, path + ['@discriminator'], SchemaCode.BAD_OPTION, 'must be a field name')
+        if not isinstance(branches, dict) or not branches:
+            _problem(problems, path + ['@oneof'], SchemaCode.BAD_OPTION, 'must be a non-empty dict of schemas')
+            return spec
+        items = branches.items()
+    for key, branch in items:
+        subspec = _normalize(branch, path + ['@oneof', key], problems, defs)
+        if '@discriminator' in schema and (subspec['type'] != 'dict' or
+                                           discriminator not in [fieldname for fieldname, f in subspec['fields']]):
+            # Results keep the discriminator, so they can be told apart (e.g. by okschema.patch).
+            _problem(problems, path + ['@oneof', key], SchemaCode.BAD_OPTION,
+                     'discriminated branches must be dicts with the discriminator field')
+        spec['branches'].append((key, subspec))
+    return spec
+
+
+def _check_pure(spec, path, problems):
+    # Results of pure nodes are reused for equal values, a default created by a call could differ every time.
+    # The default of the pure node itself is not cached.
+    subspecs = [subspec for fieldname, subspec in spec['fields']] if spec['type'] == 'dict' else [spec['item']]
+    if any(_has_callable_default(subspec) for subspec in subspecs):
+        _problem(problems, path, SchemaCode.BAD_OPTION, 'pure schema with a callable default')
+
+
+def _has_callable_default(spec):
+    if callable(spec.get('default')):
+        return True
+    if spec['type'] == 'dict':
+        return any(_has_callable_default(subspec) for fieldname, subspec in spec['fields'])
+    if spec['type'] == 'list':
+        return _has_callable_default(spec['item'])
+    if spec['type'] == 'map':
+        return _has_callable_default(spec['values'])
+    if spec['type'] == 'oneof':
+        return any(_has_callable_default(subspec) for key, subspec in spec['branches'])
+    return False
+
+
+def _unsupported_option(key, path, problems, ftype):
+    if key in _comparison_options:
+        _problem(problems, path + [key], SchemaCode.ILLEGAL_COMPARISON)
+    elif key in _known_options:
+        _problem(problems, path + [key], SchemaCode.BAD_OPTION, 'not allowed for %s' % ftype)
+    else:
+        _problem(problems, path + [key], SchemaCode.UNKNOWN_OPTION)
+
+
+def _scalar_type(ftype, path, problems):
+    try:
+        return SCALAR_TYPES[ftype]
+    except (KeyError, TypeError):
+        _problem(problems, path, SchemaCode.UNKNOWN_TYPE, ftype)
+        return 'str'
+
+
+def _validators(validators, path, problems):
+    if callable(validators):
+        return (validators,)
+    if not isinstance(validators, list):
+        _problem(problems, path, SchemaCode.VAL_NOT_CALLABLE)
+        return ()
+    for i, val_fun in enumerate(validators):
+        if not callable(val_fun):
+            _problem(problems, path + [i], SchemaCode.VAL_NOT_CALLABLE)
+    return tuple(val_fun for val_fun in validators if callable(val_fun))
@@ -0,0 +1,309 @@
+"""
+Code generation backend: emits one flat Python function per schema.
+
+The generated function inlines dict field lookups, type checks, bound checks and @in tests as straight-line code.
+Errors are built as json values in local variables instead of being raised and caught at every level,
+the only try/except blocks left are around decimal/float parsing and calls to custom validators.
+"""
+import decimal, functools
+
+from .schema import NotValidError, ValidationCode, NotHere, pendulum_value
+from . import compiler, formats, vectorized
+
+
+class _Emitter:
+
+    def __init__(self):
+        self.lines = []
+        self.indent = 1
+        self.constants = {}
+        self.counter = 0
+
+    def line(self, text):
+        self.lines.append('    ' * self.indent + text)
+
+    def var(self):
+        self.counter += 1
+        return self.counter
+
+    def const(self, value):
+        name = 'c%d' % len(self.constants)
+        self.constants[name] = value
+        return name
+
+
+def generate(spec):
+    """Returns the source of the function validating the normalized schema and the constants it refers to."""
+    em = _Emitter()
+    em.lines.append('def validate(x0):')
+    em.line('r0 = None')
+    _emit_node(em, spec, 0)
+    em.line('return r0, e0')
+    return '\n'.join(em.lines) + '\n', em.constants
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_source(source):
+    # Schemas of the same shape generate the same source, they only differ in constants.
+    return compile(source, '<okschema>', 'exec')
+
+
+def build(spec):
+    """Generates, compiles and returns (function, source) for the normalized schema."""
+    source, constants = generate(spec)
+    namespace = {
+        'NotHere': NotHere, 'NotValidError': NotValidError, 'decimal': decimal,
+    }
+    namespace.update(constants)
+    exec(_compile_source(source), namespace)
+    return namespace['validate'], source
+
+
+def _error(em, code, details=None):
+    if details is None:
+        return "{'code': %d}" % code
+    return "{'code': %d, 'details': %s}" % (code, em.const(details))
+
+
+def _emit_node(em, spec, n):
+    """Emits code validating x<n> into r<n>, or setting e<n> to the json error."""
+    em.line('e%d = None' % n)
+    _emit_missing(em, spec, n)
+    if spec['type'] != 'list':
+        # Lists don't accept nulls, None is reported as BAD_TYPE.
+        em.line('elif x%d is None:' % n)
+        em.indent += 1
+        if spec['null']:
+            em.line('r%d = None' % n)
+        else:
+            em.line('e%d = %s' % (n, _error(em, ValidationCode.NULL)))
+        em.indent -= 1
+    em.line('else:')
+    em.indent += 1
+    if spec['type'] == 'oneof' or \
+            spec['type'] == 'list' and (spec['ndarray'] or vectorized.vector_check(spec['item']) is not None):
+        em.line('r%d, e%d = %s(x%d)' % (n, n, em.const(_tree_node(spec)), n))
+    elif spec['type'] == 'list':
+        _emit_list(em, spec, n)
+    elif spec['type'] == 'dict':
+        _emit_dict(em, spec, n)
+    elif spec['type'] == 'map':
+        _emit_map(em, spec, n)
+    else:
+        _emit_scalar(em, spec, n)
+    em.indent -= 1
+
+
+def _emit_missing(em, spec, n):
+    em.line('if x%d is NotHere:' % n)
+    em.indent += 1
+    if not spec['optional']:
+        em.line('e%d = %s' % (n, _error(em, ValidationCode.MISSING)))
+    elif 'default' in spec:
+        default = compiler.default_factory(spec['default'])
+        em.line('r%d = %s%s' % (n, em.const(default), '()' if callable(default) else ''))
+    else:
+        em.line('r%d = NotHere' % n)
+    em.indent -= 1
+
+
+def _emit_dict(em, spec, n):
+    em.line('if not isinstance(x%d, dict):' % n)
+    em.indent += 1
+    em.line('e%d = %s' % (n, _error(em, ValidationCode.BAD_TYPE)))
+    em.indent -= 1
+    em.line('else:')
+    em.indent += 1
+    em.line('r%d = {}' % n)
+    em.line('ed%d = None' % n)
+    for fieldname, subspec in spec['fields']:
+        m = em.var()
+        em.line('x%d = x%d.get(%r, NotHere)' % (m, n, fieldname))
+        _emit_node(em, subspec, m)
+        em.line('if e%d is not None:' % m)
+        em.indent += 1
+        em.line('if ed%d is None:' % n)
+        em.line('    ed%d = {}' % n)
+        em.line('ed%d[%r] = e%d' % (n, fieldname, m))
+        em.indent -= 1
+        em.line('elif r%d is not NotHere:' % m)
+        em.line('    r%d[%r] = r%d' % (n, fieldname, m))
+    em.line('if ed%d is not None:' % n)
+    em.line('    e%d = ed%d' % (n, n))
+    if spec['val'] is not None:
+        em.line('else:')
+        em.indent += 1
+        _emit_validators(em, spec['val'], n)
+        em.indent -= 1
+    em.indent -= 1
+
+
+def _emit_map(em, spec, n):
+    k, m = em.var(), em.var()
+    em.line('if not isinstance(x%d, dict):' % n)
+    em.line('    e%d = %s' % (n, _error(em, ValidationCode.BAD_TYPE)))
+    em.line('else:')
+    em.indent += 1
+    em.line('r%d = {}' % n)
+    em.line('ed%d = None' % n)
+    em.line('for x%d, x%d in x%d.items():' % (k, m, n))
+    em.indent += 1
+    if spec['keys'] is None:
+        # Trusted keys, only values are validated.
+        em.line('r%d = x%d' % (k, k))
+    else:
+        _emit_node(em, spec['keys'], k)
+        em.line('if e%d is not None:' % k)
+        em.indent += 1
+        em.line('if ed%d is None:' % n)
+        em.line('    ed%d = {}' % n)
+        em.line("ed%d[x%d] = {'code': %d, 'details': e%d}" % (n, k, ValidationCode.BAD_KEY, k))
+        em.line('continue')
+        em.indent -= 1
+    _emit_node(em, spec['values'], m)
+    em.line('if e%d is not None:' % m)
+    em.indent += 1
+    em.line('if ed%d is None:' % n)
+    em.line('    ed%d = {}' % n)
+    em.line('ed%d[x%d] = e%d' % (n, k, m))
+    em.indent -= 1
+    em.line('else:')
+    em.line('    r%d[r%d] = r%d' % (n, k, m))
+    em.indent -= 1
+    em.line('if ed%d is not None:' % n)
+    em.line('    e%d = ed%d' % (n, n))
+    em.indent -= 1
+
+
+def _emit_list(em, spec, n):
+    item_spec = spec['item']
+    m = em.var()
+    em.line('if not isinstance(x%d, list):' % n)
+    em.line('    e%d = %s' % (n, _error(em, ValidationCode.BAD_TYPE)))
+    for optname, bound in spec['length']:
+        # Length limits are checked before the items.
+        op, code = _comparison_operators[optname]
+        em.line('elif not len(x%d) %s %s:' % (n, op, em.const(bound)))
+        em.line('    e%d = %s' % (n, _error(em, code, bound)))
+    em.line('else:')
+    em.indent += 1
+    em.line('r%d = []' % n)
+    em.line('el%d = None' % n)
+    em.line('for i%d, x%d in enumerate(x%d):' % (n, m, n))
+    em.indent += 1
+    _emit_node(em, item_spec, m)
+    em.line('if e%d is not None:' % m)
+    em.indent += 1
+    em.line('if el%d is None:' % n)
+    em.line('    el%d = [None] * i%d' % (n, n))
+    em.line('el%d.append(e%d)' % (n, m))
+    em.indent -= 1
+    em.line('else:')
+    em.indent += 1
+    em.line('r%d.append(r%d)' % (n, m))
+    em.line('if el%d is not None:' % n)
+    em.line('    el%d.append(None)' % n)
+    em.indent -= 2
+    em.line('if el%d is not None:' % n)
+    em.line('    e%d = el%d' % (n, n))
+    em.indent -= 1
+
+
+def _tree_node(spec):
+    """Validates with a node of the tree backend, used for unions and lists of numbers (see okschema.vectorized)."""
+    node = compiler.compile_node(spec)
+
+    def validate(data):
+        ctx = compiler._Context()
+        result = node.validate(data, ctx)
+        if result is compiler._INVALID:
+            return None, ctx.error
+        return result, None
+    return validate
+
+
+_comparison_operators = {
+    'gt': ('>', ValidationCode.NOT_GT),
+    'gteq': ('>=', ValidationCode.NOT_GTEQ),
+    'lt': ('<', ValidationCode.NOT_LT),
+    'lteq': ('<=', ValidationCode.NOT_LTEQ),
+    'neq': ('!=', ValidationCode.NOT_EQ),
+}
+
+
+def _emit_scalar(em, spec, n):
+    ftype = spec['type']
+    bad_type = _error(em, ValidationCode.BAD_TYPE)
+    if ftype in ['str', 'decimal', 'float']:
+        em.line('if not isinstance(x%d, str):' % n)
+        em.line('    e%d = %s' % (n, bad_type))
+        em.line('else:')
+        if ftype == 'decimal':
+            em.line('    try:')
+            em.line('        r%d = decimal.Decimal(x%d)' % (n, n))
+            em.line('    except (decimal.InvalidOperation, TypeError):')
+            em.line('        e%d = %s' % (n, bad_type))
+        elif ftype == 'float':
+            em.line('    try:')
+            em.line('        r%d = float(x%d)' % (n, n))
+            em.line('    except (ValueError, TypeError):')
+            em.line('        e%d = %s' % (n, bad_type))
+        else:
+            em.line('    r%d = x%d' % (n, n))
+    elif ftype == 'bool':
+        em.line('r%d = bool(x%d)' % (n, n))
+    elif ftype == 'int':
+        em.line('if not isinstance(x%d, int):' % n)
+        em.line('    e%d = %s' % (n, bad_type))
+        em.line('else:')
+        em.line('    r%d = x%d' % (n, n))
+    elif ftype in ['date', 'datetime']:
+        parse = formats.parse_date if ftype == 'date' else formats.parse_datetime
+        em.line('if not isinstance(x%d, str):' % n)
+        em.line('    e%d = %s' % (n, bad_type))
+        em.line('else:')
+        em.line('    r%d = %s(x%d)' % (n, em.const(parse), n))
+        em.line('    if r%d is None:' % n)
+        em.line('        e%d = %s' % (n, bad_type))
+        if spec['pendulum']:
+            em.line('    else:')
+            em.line('        r%d = %s(r%d)' % (n, em.const(pendulum_value), n))
+
+    checks = []
+    if spec['regexp'] is not None:
+        match = spec['regexp'].fullmatch if spec['fullmatch'] else spec['regexp'].match
+        checks.append(('lines', ['if not %s(r%d):' % (em.const(match), n),
+                                 '    e%d = %s' % (n, _error(em, ValidationCode.REGEXP))]))
+    if spec['format'] is not None:
+        checks.append(('lines', ['if not %s(r%d):' % (em.const(formats.FORMATS[spec['format']]), n),
+                                 '    e%d = %s' % (n, _error(em, ValidationCode.BAD_FORMAT, spec['format']))]))
+    if ftype == 'str' and not spec['blank']:
+        checks.append(('lines', ['if not len(r%d):' % n,
+                                 '    e%d = %s' % (n, _error(em, ValidationCode.NOT_GT, 0))]))
+    for optname, optval in spec['checks']:
+        if optname == 'in':
+            checks.append(('lines', ['if r%d not in %s:' % (n, em.const(optval)),
+                                     '    e%d = %s' % (n, _error(em, ValidationCode.NOT_IN))]))
+        elif optname == 'val':
+            checks.append(('val', optval))
+        else:
+            op, code = _comparison_operators[optname]
+            xdata = ('len(r%d)' if ftype == 'str' else 'r%d') % n
+            checks.append(('lines', ['if not %s %s %s:' % (xdata, op, em.const(optval)),
+                                     '    e%d = %s' % (n, _error(em, code, optval))]))
+    for kind, check in checks:
+        em.line('if e%d is None:' % n)
+        em.indent += 1
+        if kind == 'lines':
+            for line in check:
+                em.line(line)
+        else:
+            _emit_validators(em, check, n)
+        em.indent -= 1
+
+
+def _emit_validators(em, validators, n):
+    em.line('try:')
+    em.line('    r%d = %s(r%d)' % (n, em.const(compiler._compile_validators(validators)), n))
+    em.line('except NotValidError as ex:')
+    em.line('    e%d = ex.jsonize()' % n)
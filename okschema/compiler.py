@@ -0,0 +1,970 @@
+import copy, decimal, functools, operator, sys
+
+from .schema import NotValidError, NotValidButContinueError, ValidationCode, ValidationError, NotHere, pendulum_value, \
+    _StructureCode
+from .checker import normalize
+from .errors import ErrorNode, DictErrors, ListErrors
+from .memo import value_key, fields_key
+from . import formats, vectorized
+
+
+DEFAULT_MAX_DEPTH = 256
+DEFAULT_MAX_REF_DEPTH = 100
+
+
+def compile(schema, backend='tree', debug=False, interned=None, max_depth=DEFAULT_MAX_DEPTH,
+            max_ref_depth=DEFAULT_MAX_REF_DEPTH):
+    """
+    Compiles the schema into a reusable validator.
+    See okschema.cache for compiling schemas rebuilt for every request.
+    :param backend: 'tree' builds a tree of node validators,
+                    'codegen' generates and execs one flat Python function for the whole schema,
+                    'iterative' walks the tree of nodes without recursion, see okschema.iterative
+    :param debug: dump the generated source to stderr (codegen backend)
+    :param interned: table of nodes shared between validators, used by okschema.cache
+    :param max_depth: maximum number of nested dicts and lists, None for no limit (iterative backend)
+    :param max_ref_depth: maximum number of nested '@ref' values validated by the tree and codegen backends,
+                          is_valid() allows DEFAULT_MAX_REF_DEPTH
+    """
+    if backend == 'tree':
+        return Validator(schema, interned, max_ref_depth)
+    elif backend == 'codegen':
+        return CodegenValidator(schema, debug, interned, max_ref_depth)
+    elif backend == 'iterative':
+        from .iterative import IterativeValidator
+        return IterativeValidator(schema, max_depth, interned)
+    raise ValueError("unknown backend: %r" % backend)
+
+
+def is_valid(schema, data):
+    """Checks data without building the validated copy. The schema is compiled through okschema.cache."""
+    from .cache import compile_cached
+    return compile_cached(schema).is_valid(data)
+
+
+class Validator:
+    """
+    A schema compiled into a tree of nodes.
+    The schema is checked and normalized once by okschema.checker, raising SchemaError listing all its problems.
+    Everything that depends only on the schema (types, options, comparison operators, validator lists)
+    is resolved then, so validation only does the work that depends on the data.
+    """
+
+    def __init__(self, schema, interned=None, max_ref_depth=DEFAULT_MAX_REF_DEPTH):
+        self.schema = schema
+        self.spec = normalize(schema)
+        self.max_ref_depth = max_ref_depth
+        self._root = compile_node(self.spec, interned)
+
+    def validate(self, data, fail_fast=False, in_place=False, sparse=False, executor=None, workers=None,
+                 limits=None):
+        """
+        Validates data, same as okschema.validate(self.schema, data, fail_fast).
+        :param in_place: store cast values in the dicts and lists of data (and drop extra dict fields)
+                         instead of building a copy; data may be partially modified when validation fails
+        :param sparse: report list errors as {index: error} maps, see okschema.errors
+        :param executor: concurrent.futures executor validating chunks of large lists, see okschema.parallel
+        :param workers: validate large lists with a new pool of that many workers
+        :param limits: okschema.Limits budget of the call, data over it is rejected before validation
+        """
+        if limits is not None:
+            limits.check(data, self.schema, sparse)
+        if workers is not None and executor is None:
+            from . import parallel
+            with parallel.default_executor(workers) as executor:
+                return self.validate(data, fail_fast, in_place, sparse, executor)
+        ctx = _Context(fail_fast, in_place, sparse)
+        ctx.max_ref_depth = self.max_ref_depth
+        if executor is not None:
+            from .parallel import Parallel
+            ctx.parallel = Parallel(executor)
+        result = self._root.validate(data, ctx)
+        if result is _INVALID:
+            raise ValidationError(ctx.error, self.schema)
+        return result
+
+    def revalidate(self, previous_result, patch, fail_fast=False, sparse=False):
+        """
+        Validates a partial update of previous_result, a result returned by this validator,
+        only validating the values changed by the patch again. See okschema.patch.
+        :param patch: list of RFC 6902 add, replace and remove operations, or {JSON pointer: new value}
+        :return: the validated patched document
+        :raises: ValidationError, ValueError when the patch doesn't apply
+        """
+        from .patch import revalidate
+        return revalidate(self, previous_result, patch, fail_fast, sparse)
+
+    def is_valid(self, data):
+        """
+        Returns True if data is valid.
+        No result containers or error objects are created for valid data,
+        except where a dict-level validator needs the validated dict.
+        """
+        return self._root.is_valid(data)
+
+    def check(self, data):
+        """Raises ValidationError if data is not valid, without building the validated copy otherwise."""
+        if not self._root.is_valid(data):
+            self.validate(data)
+
+
+class CodegenValidator(Validator):
+    """
+    A validator running Python source generated for the schema, see okschema.codegen.
+    The generated function implements the default mode, other modes use the tree of nodes.
+    """
+
+    def __init__(self, schema, debug=False, interned=None, max_ref_depth=DEFAULT_MAX_REF_DEPTH):
+        from . import codegen
+        super().__init__(schema, interned, max_ref_depth)
+        if _has_pure(self.spec) or _has_ref(self.spec):
+            # Results of pure nodes are reused within a call by the tree of nodes, see _PureNode.
+            # References link nodes into cycles, which generated code can't unroll.
+            self._fun, self.source = None, None
+            return
+        self._fun, self.source = codegen.build(self.spec)
+        if debug:
+            print(self.source, file=sys.stderr)
+
+    def validate(self, data, fail_fast=False, in_place=False, sparse=False, executor=None, workers=None,
+                 limits=None):
+        if self._fun is None or fail_fast or in_place or sparse or executor is not None or workers is not None:
+            return super().validate(data, fail_fast, in_place, sparse, executor, workers, limits)
+        if limits is not None:
+            limits.check(data, self.schema)
+        data, errors = self._fun(data)
+        if errors is not None:
+            raise ValidationError(errors, self.schema)
+        return data
+
+
+class _InvalidClass:
+    pass
+# Returned by nodes instead of raising, the error is left in the context.
+_INVALID = _InvalidClass()
+
+
+class _Context:
+    """
+    Options of a single validation call, passed down the tree of nodes.
+    Also collects the error of the node that returned _INVALID last: nodes return errors as values
+    and ValidationError is raised only once, by Validator.validate.
+    """
+
+    __slots__ = ('fail_fast', 'in_place', 'sparse', 'error', 'parallel', 'memo', 'ref_depth', 'max_ref_depth')
+
+    def __init__(self, fail_fast=False, in_place=False, sparse=False):
+        self.fail_fast, self.in_place, self.sparse = fail_fast, in_place, sparse
+        self.error = None
+        self.parallel = None  # okschema.parallel.Parallel splitting large lists
+        self.memo = None  # results of pure nodes, see _PureNode
+        self.ref_depth = 0  # number of _RefNodes being validated
+        self.max_ref_depth = DEFAULT_MAX_REF_DEPTH
+
+    def fail(self, code, details=None):
+        """Stores the error of a single value, returns _INVALID."""
+        if self.sparse:
+            self.error = ErrorNode(code, details)
+        elif details is None:
+            self.error = {'code': code.value}
+        else:
+            self.error = {'code': code.value, 'details': details}
+        return _INVALID
+
+    def fail_with(self, e):
+        """Stores the error of a NotValidError raised by a validator function, returns _INVALID."""
+        self.error = _error_node(e) if self.sparse else e.jsonize()
+        return _INVALID
+
+
+# Used by is_valid() where only the outcome matters; the errors left in it are never read.
+_probe_context = _Context(fail_fast=True, sparse=True)
+
+
+def _error_node(e):
+    """Error node of a NotValidError raised in sparse mode."""
+    if e.code == _StructureCode.DICT or e.code == _StructureCode.LIST:
+        return e.details
+    return ErrorNode(e.code, e.details)
+
+
+def compile_node(spec, interned=None):
+    """Builds the node validating a single json value described by a normalized schema."""
+    if interned is not None:
+        return interned.node(spec, lambda: _build_node(spec, interned))
+    return _build_node(spec, interned)
+
+
+def _build_node(spec, interned):
+    node = _node_classes[spec['type']](spec, interned)
+    if spec.get('pure'):
+        return _PureNode(node)
+    return node
+
+
+class _Node:
+    """
+    Handling of missing values and nulls shared by all nodes.
+    node.validate(data, ctx) returns the validated value, or _INVALID with the error stored by ctx.
+    """
+
+    __slots__ = ('optional', 'allow_null', 'has_default', 'default', '__weakref__')
+
+    def __init__(self, spec, interned=None):
+        self.optional = spec['optional']
+        self.allow_null = spec['null']
+        self.has_default = 'default' in spec
+        self.default = default_factory(spec.get('default'))
+
+    def is_valid_missing_or_null(self, data):
+        if data is NotHere:
+            return self.optional
+        return self.allow_null
+
+    def missing(self, ctx):
+        # No value supplied in json. Check if it's allowed and if there is a default value.
+        if not self.optional:
+            return ctx.fail(ValidationCode.MISSING)
+        if not self.has_default:
+            return NotHere  # Optional field has no default.
+        default = self.default
+        if callable(default):
+            default = default()
+        return default  # Default is returned as is, no validators are runned.
+
+
+def default_factory(default):
+    """Default of a normalized schema with mutable dicts, lists and sets turned into callables copying them."""
+    if isinstance(default, (dict, list, set)):
+        # Interned nodes are shared by schemas with equal defaults, results must not share them.
+        return functools.partial(copy.deepcopy, default)
+    return default
+
+
+class _DictNode(_Node):
+
+    __slots__ = ('fields', 'fieldnames', 'validators')
+
+    def __init__(self, spec, interned=None):
+        super().__init__(spec)
+        self.fields = [(fieldname, compile_node(subspec, interned)) for fieldname, subspec in spec['fields']]
+        self.fieldnames = frozenset(fieldname for fieldname, subspec in spec['fields'])
+        self.validators = _validators_check(spec['val']) if spec['val'] is not None else None
+
+    def validate(self, data, ctx):
+        if not isinstance(data, dict):
+            return self.not_a_dict(data, ctx)
+        in_place = ctx.in_place
+        rc_data = data if in_place else {}
+        errors = None
+        for fieldname, node in self.fields:
+            subdata = data.get(fieldname, NotHere)
+            rc_subdata = node.validate(subdata, ctx)
+            if rc_subdata is _INVALID:
+                if errors is None:
+                    errors = {}
+                errors[fieldname] = ctx.error
+                if ctx.fail_fast:
+                    break
+                continue
+            if rc_subdata is not NotHere and (rc_subdata is not subdata or not in_place):
+                rc_data[fieldname] = rc_subdata
+        return self.finish(data, rc_data, errors, ctx)
+
+    def not_a_dict(self, data, ctx):
+        if data is NotHere:
+            return self.missing(ctx)
+        if data is None:
+            if not self.allow_null:
+                return ctx.fail(ValidationCode.NULL)
+            return None
+        return ctx.fail(ValidationCode.BAD_TYPE)
+
+    def finish(self, data, rc_data, errors, ctx):
+        """Completes validation of a dict once all its fields are validated."""
+        if errors is not None:
+            ctx.error = DictErrors(errors) if ctx.sparse else errors
+            return _INVALID
+        if ctx.in_place and not data.keys() <= self.fieldnames:
+            # Extra fields are discarded.
+            for fieldname in [fieldname for fieldname in data if fieldname not in self.fieldnames]:
+                del data[fieldname]
+        if self.validators is not None:
+            rc_data = self.validators(rc_data, ctx)
+        return rc_data
+
+    def is_valid(self, data):
+        if data is NotHere or data is None:
+            return self.is_valid_missing_or_null(data)
+        if not isinstance(data, dict):
+            return False
+        if self.validators is not None:
+            # The whole-dict validator needs the validated dict.
+            return self.validate(data, _probe_context) is not _INVALID
+        for fieldname, node in self.fields:
+            if not node.is_valid(data.get(fieldname, NotHere)):
+                return False
+        return True
+
+
+class _MapNode(_Node):
+    """
+    Dict with arbitrary keys, checked by the key node (not at all without one), and values checked by the value node.
+    Errors are keyed by the keys, invalid keys are reported as BAD_KEY with the error of the key.
+    """
+
+    __slots__ = ('keys', 'values')
+
+    def __init__(self, spec, interned=None):
+        super().__init__(spec)
+        self.keys = compile_node(spec['keys'], interned) if spec['keys'] is not None else None
+        self.values = compile_node(spec['values'], interned)
+
+    not_a_dict = _DictNode.not_a_dict
+
+    def validate(self, data, ctx):
+        if not isinstance(data, dict):
+            return self.not_a_dict(data, ctx)
+        value_validate = self.values.validate
+        in_place = ctx.in_place
+        rc_data = data if in_place else {}
+        errors = renamed = None
+        if self.keys is None:
+            # Trusted keys, only values are validated.
+            for key, subdata in data.items():
+                rc_subdata = value_validate(subdata, ctx)
+                if rc_subdata is _INVALID:
+                    if errors is None:
+                        errors = {}
+                    errors[key] = ctx.error
+                    if ctx.fail_fast:
+                        break
+                elif not in_place or rc_subdata is not subdata:
+                    rc_data[key] = rc_subdata
+            return self.finish(data, rc_data, errors, renamed, ctx)
+        key_validate = self.validate_key
+        for key, subdata in data.items():
+            rc_key = key_validate(key, ctx)
+            rc_subdata = value_validate(subdata, ctx) if rc_key is not _INVALID else _INVALID
+            if rc_subdata is _INVALID:
+                if errors is None:
+                    errors = {}
+                errors[key] = ctx.error
+                if ctx.fail_fast:
+                    break
+            elif rc_key is not key and in_place:
+                if renamed is None:
+                    renamed = []
+                renamed.append((key, rc_key, rc_subdata))
+            elif not in_place or rc_subdata is not subdata:
+                rc_data[rc_key] = rc_subdata
+        return self.finish(data, rc_data, errors, renamed, ctx)
+
+    def validate_key(self, key, ctx):
+        """Returns the validated key, or _INVALID with the BAD_KEY error in ctx."""
+        rc_key = self.keys.validate(key, ctx)
+        if rc_key is _INVALID:
+            error = ctx.error
+            return ctx.fail(ValidationCode.BAD_KEY, error.jsonize() if ctx.sparse else error)
+        return rc_key
+
+    def finish(self, data, rc_data, errors, renamed, ctx):
+        """
+        Completes validation of a map once all its values are validated.
+        renamed lists (key, validated key, validated value) of keys changed by validators in place.
+        """
+        if errors is not None:
+            ctx.error = DictErrors(errors) if ctx.sparse else errors
+            return _INVALID
+        if renamed is not None:
+            for key, rc_key, rc_subdata in renamed:
+                del data[key]
+            for key, rc_key, rc_subdata in renamed:
+                data[rc_key] = rc_subdata
+        return rc_data
+
+    def is_valid(self, data):
+        if data is NotHere or data is None:
+            return self.is_valid_missing_or_null(data)
+        if not isinstance(data, dict):
+            return False
+        value_is_valid = self.values.is_valid
+        if self.keys is None:
+            for subdata in data.values():
+                if not value_is_valid(subdata):
+                    return False
+            return True
+        key_is_valid = self.keys.is_valid
+        for key, subdata in data.items():
+            if not key_is_valid(key) or not value_is_valid(subdata):
+                return False
+        return True
+
+
+class _ListNode(_Node):
+
+    __slots__ = ('item', 'item_spec', 'vector', 'ndarray', 'length_checks')
+
+    def __init__(self, spec, interned=None):
+        super().__init__(spec)
+        self.item = compile_node(spec['item'], interned)
+        self.item_spec = spec['item']
+        self.vector = vectorized.vector_check(spec['item'])
+        self.ndarray = spec['ndarray']
+        self.length_checks = tuple(_comparisons[optname] + (bound,) for optname, bound in spec['length'])
+
+    def validate(self, data, ctx):
+        if not isinstance(data, list):
+            if self.vector is not None and vectorized.buffer_type(data) == self.vector.type:
+                if self.length_checks and self.check_length(data, ctx) is _INVALID:
+                    return _INVALID
+                return self.validate_buffer(data, ctx)
+            return self.not_a_list(data, ctx)
+        if self.length_checks and self.check_length(data, ctx) is _INVALID:
+            return _INVALID
+        if self.vector is not None and len(data) >= vectorized.MIN_LENGTH:
+            bad_indices = self.vector.bad_indices(data)
+            if bad_indices is not None:
+                return self.validate_items_at(data, bad_indices, ctx)
+        if ctx.parallel is not None and len(data) >= ctx.parallel.threshold:
+            return ctx.parallel.validate_list(self, data, ctx)
+        item_validate = self.item.validate
+        in_place = ctx.in_place
+        result_data = data if in_place else []
+        errors = None
+        for i, data_item in enumerate(data):
+            item_result_data = item_validate(data_item, ctx)
+            if item_result_data is _INVALID:
+                if errors is None:
+                    errors = {}
+                errors[i] = ctx.error
+                if ctx.fail_fast:
+                    break
+                continue
+            if not in_place:
+                result_data.append(item_result_data)
+            elif item_result_data is not data_item:
+                data[i] = item_result_data
+        return self.finish(data, result_data, errors, ctx)
+
+    def check_length(self, data, ctx):
+        """Checks the length limits of the list before its items are validated, returns _INVALID if they fail."""
+        length = len(data)
+        for op, code, bound in self.length_checks:
+            if not op(length, bound):
+                return ctx.fail(code, bound)
+        return data
+
+    def validate_items_at(self, data, indices, ctx):
+        """Validates a list whose items other than those at indices are known to be valid."""
+        item_validate = self.item.validate
+        errors = None
+        for i in indices:
+            if item_validate(data[i], ctx) is _INVALID:
+                if errors is None:
+                    errors = {}
+                errors[i] = ctx.error
+                if ctx.fail_fast:
+                    break
+        return self.finish(data, data if ctx.in_place else list(data), errors, ctx)
+
+    def validate_buffer(self, data, ctx):
+        """Validates an array of numbers of the item type, see okschema.vectorized."""
+        indices = self.vector.bad_indices(data)
+        if indices is None:
+            indices = range(len(data))
+        checks = self.item.checks
+        errors = None
+        for i in indices:
+            value = vectorized.item(data, i)
+            for check in checks:
+                value = check(value, ctx)
+                if value is _INVALID:
+                    if errors is None:
+                        errors = {}
+                    errors[i] = ctx.error
+                    break
+            if errors is not None and ctx.fail_fast:
+                break
+        return self.finish(data, data if self.ndarray else data.tolist(), errors, ctx)
+
+    def not_a_list(self, data, ctx):
+        if data is NotHere:
+            return self.missing(ctx)
+        return ctx.fail(ValidationCode.BAD_TYPE)
+
+    def finish(self, data, result_data, errors, ctx):
+        """Completes validation of a list once all its items are validated."""
+        if errors is not None:
+            # Errors in list items.
+            length = max(errors) + 1 if ctx.fail_fast else len(data)
+            if ctx.sparse:
+                ctx.error = ListErrors(length, errors)
+                return _INVALID
+            error_list = [None] * length
+            for i, error in errors.items():
+                error_list[i] = error
+            ctx.error = error_list
+            return _INVALID
+        if self.ndarray:
+            return vectorized.as_ndarray(result_data)
+        return result_data
+
+    def is_valid(self, data):
+        if data is NotHere:
+            return self.optional
+        if not isinstance(data, list):
+            return vectorized.buffer_type(data) is not None and self.validate(data, _probe_context) is not _INVALID
+        if self.length_checks and self.check_length(data, _probe_context) is _INVALID:
+            return False
+        if self.vector is not None and len(data) >= vectorized.MIN_LENGTH:
+            bad_indices = self.vector.bad_indices(data)
+            if bad_indices is not None:
+                return not bad_indices
+        item_is_valid = self.item.is_valid
+        for data_item in data:
+            if not item_is_valid(data_item):
+                return False
+        return True
+
+
+class _ScalarNode(_Node):
+
+    __slots__ = ('cast', 'checks')
+
+    def __init__(self, spec, interned=None):
+        super().__init__(spec)
+        self.cast = _casts[spec['type']]
+        if spec['pendulum']:
+            self.cast = _pendulum_cast(self.cast)
+        self.checks = _compile_checks(spec)
+
+    def validate(self, data, ctx):
+        if data is NotHere:
+            return self.missing(ctx)
+        if data is None:
+            if not self.allow_null:
+                return ctx.fail(ValidationCode.NULL)
+            return None
+        data = self.cast(data)
+        if data is _INVALID:
+            return ctx.fail(ValidationCode.BAD_TYPE)
+        for check in self.checks:
+            data = check(data, ctx)
+            if data is _INVALID:
+                return _INVALID
+        return data
+
+    def is_valid(self, data):
+        if data is NotHere or data is None:
+            return self.is_valid_missing_or_null(data)
+        return self.validate(data, _probe_context) is not _INVALID
+
+
+class _OneOfNode(_Node):
+    """
+    Union of schemas. With a discriminator, the branch is looked up by the value of the discriminator field of a dict,
+    and only that branch validates it. Without one, branches are tried in turn and the first valid result is returned,
+    or MANY_ERRORS with the errors of all branches.
+    """
+
+    __slots__ = ('discriminator', 'branches', 'nodes')
+
+    def __init__(self, spec, interned=None):
+        super().__init__(spec)
+        self.discriminator = spec['discriminator']
+        self.nodes = tuple(compile_node(subspec, interned) for key, subspec in spec['branches'])
+        self.branches = {key: node for (key, subspec), node in zip(spec['branches'], self.nodes)}
+
+    def validate(self, data, ctx):
+        if data is NotHere:
+            return self.missing(ctx)
+        if data is None:
+            if not self.allow_null:
+                return ctx.fail(ValidationCode.NULL)
+            return None
+        if self.discriminator is None:
+            return self.first_valid(data, ctx, _validate_with)
+        node = self.select(data, ctx)
+        if node is _INVALID:
+            return _INVALID
+        return node.validate(data, ctx)
+
+    def select(self, data, ctx):
+        """Returns the branch node for a dict by its discriminator, or _INVALID."""
+        if not isinstance(data, dict):
+            return ctx.fail(ValidationCode.BAD_TYPE)
+        value = data.get(self.discriminator, NotHere)
+        try:
+            node = self.branches.get(value)
+        except TypeError:
+            node = None  # unhashable value
+        if node is None:
+            ctx.fail(ValidationCode.MISSING if value is NotHere else ValidationCode.NOT_IN)
+            ctx.error = DictErrors({self.discriminator: ctx.error}) if ctx.sparse else {self.discriminator: ctx.error}
+            return _INVALID
+        return node
+
+    def first_valid(self, data, ctx, validate):
+        """
+        Validates data with the first branch it is valid for, calling validate(node, data, ctx) for every branch tried.
+        Branches that fail never validate data in place.
+        """
+        in_place = ctx.in_place
+        ctx.in_place = False
+        errors = []
+        try:
+            for node in self.nodes:
+                result = validate(node, data, ctx)
+                if result is not _INVALID:
+                    break
+                errors.append(ctx.error.to_dense() if ctx.sparse else ctx.error)
+            else:
+                return ctx.fail(ValidationCode.MANY_ERRORS, errors)
+        finally:
+            ctx.in_place = in_place
+        if in_place:
+            return validate(node, data, ctx)
+        return result
+
+    def is_valid(self, data):
+        if data is NotHere or data is None:
+            return self.is_valid_missing_or_null(data)
+        if self.discriminator is None:
+            return any(node.is_valid(data) for node in self.nodes)
+        node = self.select(data, _probe_context)
+        return node is not _INVALID and node.is_valid(data)
+
+
+def _validate_with(node, data, ctx):
+    return node.validate(data, ctx)
+
+
+class _RefNode(_Node):
+    """
+    Reference to a definition of '@defs'. Every definition is compiled once into a node shared by its references,
+    so recursive schemas are cycles of nodes and references cost no lookup. Recursion is bounded by
+    ctx.max_ref_depth nested references, deeper values fail with TOO_DEEP instead of exhausting the stack.
+    Missing values and nulls accepted by the reference don't reach the definition.
+    """
+
+    __slots__ = ('definition', 'target')
+
+    def __init__(self, spec, interned=None):
+        super().__init__(spec)
+        self.definition = spec['definition']
+        self.target = _definition_node(self.definition, interned)  # None until a cycle is compiled, see resolve()
+
+    def resolve(self):
+        """Returns the node of the definition."""
+        target = self.target
+        if target is None:
+            target = self.target = self.definition.node
+        return target
+
+    def handles(self, data):
+        """True if data is a missing value or null accepted by the reference itself."""
+        return (data is NotHere and self.optional) or (data is None and self.allow_null)
+
+    def validate(self, data, ctx):
+        if (data is NotHere or data is None) and self.handles(data):
+            return self.missing(ctx) if data is NotHere else None
+        if ctx is _probe_context:
+            ctx = _Context(fail_fast=True, sparse=True)  # the shared probe context can't count the depth
+        depth = ctx.ref_depth
+        if depth >= ctx.max_ref_depth:
+            return ctx.fail(ValidationCode.TOO_DEEP, ctx.max_ref_depth)
+        ctx.ref_depth = depth + 1
+        result = (self.target or self.resolve()).validate(data, ctx)
+        ctx.ref_depth = depth  # left as it was by exceptions, which end the validation call
+        return result
+
+    def is_valid(self, data):
+        if self.handles(data):
+            return True
+        return self.validate(data, _Context(fail_fast=True, sparse=True)) is not _INVALID
+
+
+def _definition_node(definition, interned):
+    """Compiles a definition on first use, returns None while it is being compiled."""
+    if definition.node is None and not definition.compiling:
+        definition.compiling = True
+        try:
+            definition.node = compile_node(definition.spec, interned)
+        finally:
+            definition.compiling = False
+    return definition.node
+
+
+def _has_ref(spec):
+    if spec['type'] == 'ref':
+        return True
+    if spec['type'] == 'dict':
+        return any(_has_ref(subspec) for fieldname, subspec in spec['fields'])
+    if spec['type'] == 'list':
+        return _has_ref(spec['item'])
+    if spec['type'] == 'map':
+        return (spec['keys'] is not None and _has_ref(spec['keys'])) or _has_ref(spec['values'])
+    if spec['type'] == 'oneof':
+        return any(_has_ref(subspec) for key, subspec in spec['branches'])
+    return False
+
+
+def _has_pure(spec):
+    if spec.get('pure'):
+        return True
+    if spec['type'] == 'dict':
+        return any(_has_pure(subspec) for fieldname, subspec in spec['fields'])
+    if spec['type'] == 'list':
+        return _has_pure(spec['item'])
+    if spec['type'] == 'map':
+        return _has_pure(spec['values'])
+    if spec['type'] == 'oneof':
+        return any(_has_pure(subspec) for key, subspec in spec['branches'])
+    return False
+
+
+MEMO_MAXSIZE = 10000  # results of pure nodes kept by a single validation call
+
+
+class _PureNode:
+    """
+    Wraps the node of a dict or list marked '@pure', reusing its results for equal values within a validation call.
+    Values are keyed by their structure (see okschema.memo), dicts only by the fields of the schema.
+    Equal values then cost a lookup and share the same result or error.
+    Nothing is cached by is_valid() or when validating in place.
+    """
+
+    __slots__ = ('node', 'fieldnames', '__weakref__')
+
+    def __init__(self, node):
+        self.node = node
+        self.fieldnames = [fieldname for fieldname, subnode in node.fields] if type(node) is _DictNode else None
+
+    def validate(self, data, ctx):
+        if data is NotHere or data is None or ctx.in_place or ctx is _probe_context:
+            return self.node.validate(data, ctx)
+        try:
+            if self.fieldnames is not None and type(data) is dict:
+                key = self, fields_key(data, self.fieldnames)
+            else:
+                key = self, value_key(data)
+        except TypeError:
+            return self.node.validate(data, ctx)
+        memo = ctx.memo
+        if memo is None:
+            memo = ctx.memo = {}
+        else:
+            entry = memo.get(key)
+            if entry is not None:
+                result, error = entry
+                if result is _INVALID:
+                    ctx.error = error
+                return result
+        result = self.node.validate(data, ctx)
+        if len(memo) < MEMO_MAXSIZE:
+            memo[key] = result, ctx.error if result is _INVALID else None
+        return result
+
+    def is_valid(self, data):
+        return self.node.is_valid(data)
+
+
+_node_classes = {
+    'dict': _DictNode,
+    'map': _MapNode,
+    'list': _ListNode,
+    'oneof': _OneOfNode,
+    'ref': _RefNode,
+    'str': _ScalarNode,
+    'int': _ScalarNode,
+    'decimal': _ScalarNode,
+    'float': _ScalarNode,
+    'bool': _ScalarNode,
+    'date': _ScalarNode,
+    'datetime': _ScalarNode,
+}
+
+
+# Casts return _INVALID for data of a bad type.
+
+def _cast_str(data):
+    if not isinstance(data, str):
+        return _INVALID
+    return data
+
+
+def _cast_decimal(data):
+    if not isinstance(data, str):
+        return _INVALID
+    try:
+        return decimal.Decimal(data)
+    except (decimal.InvalidOperation, TypeError):
+        return _INVALID
+
+
+def _cast_float(data):
+    if not isinstance(data, str):
+        return _INVALID
+    try:
+        return float(data)
+    except (ValueError, TypeError):
+        return _INVALID
+
+
+def _cast_int(data):
+    if not isinstance(data, int):
+        return _INVALID
+    return data
+
+
+def _cast_date(data):
+    if not isinstance(data, str):
+        return _INVALID
+    data = formats.parse_date(data)
+    return _INVALID if data is None else data
+
+
+def _cast_datetime(data):
+    if not isinstance(data, str):
+        return _INVALID
+    data = formats.parse_datetime(data)
+    return _INVALID if data is None else data
+
+
+def _pendulum_cast(cast):
+    def pendulum_cast(data):
+        data = cast(data)
+        return data if data is _INVALID else pendulum_value(data)
+    return pendulum_cast
+
+
+_casts = {
+    'str': _cast_str,
+    'decimal': _cast_decimal,
+    'float': _cast_float,
+    'bool': bool,
+    'int': _cast_int,
+    'date': _cast_date,
+    'datetime': _cast_datetime,
+}
+
+_comparisons = {
+    'gt': (operator.gt, ValidationCode.NOT_GT),
+    'gteq': (operator.ge, ValidationCode.NOT_GTEQ),
+    'lt': (operator.lt, ValidationCode.NOT_LT),
+    'lteq': (operator.le, ValidationCode.NOT_LTEQ),
+    'neq': (operator.ne, ValidationCode.NOT_EQ),
+}
+
+
+def _compile_checks(spec):
+    """
+    Turns constraints of a scalar value into a list of checks, in the order verify_value_options uses.
+    check(data, ctx) returns the checked value or _INVALID.
+    """
+    checks = []
+    if spec['regexp'] is not None:
+        checks.append(_regexp_check(spec['regexp'], spec['fullmatch']))
+    if spec['format'] is not None:
+        checks.append(_format_check(spec['format']))
+    if spec['type'] == 'str' and not spec['blank']:
+        checks.append(_not_blank_check)
+    for optname, optval in spec['checks']:
+        if optname == 'in':
+            checks.append(_in_check(optval))
+        elif optname == 'val':
+            checks.append(_validators_check(optval))
+        else:
+            op, code = _comparisons[optname]
+            checks.append(_comparison_check(op, code, optval, spec['type'] == 'str'))
+    return tuple(checks)
+
+
+def _regexp_check(pattern, fullmatch=False):
+    match = pattern.fullmatch if fullmatch else pattern.match
+
+    def check(data, ctx):
+        if not match(data):
+            return ctx.fail(ValidationCode.REGEXP)
+        return data
+    return check
+
+
+def _format_check(name):
+    is_valid = formats.FORMATS[name]
+
+    def check(data, ctx):
+        if not is_valid(data):
+            return ctx.fail(ValidationCode.BAD_FORMAT, name)
+        return data
+    return check
+
+
+def _not_blank_check(data, ctx):
+    if not len(data):
+        return ctx.fail(ValidationCode.NOT_GT, 0)
+    return data
+
+
+def _in_check(values):
+    def check(data, ctx):
+        if data not in values:
+            return ctx.fail(ValidationCode.NOT_IN)
+        return data
+    return check
+
+
+def _comparison_check(op, code, bound, by_length):
+    if by_length:
+        def check(data, ctx):
+            if not op(len(data), bound):
+                return ctx.fail(code, bound)
+            return data
+    else:
+        def check(data, ctx):
+            if not op(data, bound):
+                return ctx.fail(code, bound)
+            return data
+    return check
+
+
+def _validators_check(validators):
+    """Check calling validator functions, the only place where the tree of nodes catches NotValidError."""
+    call = _compile_validators(validators)
+
+    def check(data, ctx):
+        try:
+            return call(data)
+        except NotValidError as e:
+            return ctx.fail_with(e)
+    return check
+
+
+def _compile_validators(validators):
+    """Returns a function calling a tuple of validators the way call_validators does."""
+    if len(validators) == 1:
+        # A single validator behaves the same whether it's given alone or in a list.
+        return validators[0]
+
+    def call(data):
+        error_collection = None
+        try:
+            for val_fun in validators:
+                try:
+                    data = val_fun(data)
+                except NotValidButContinueError as e:
+                    # Continue calling next validators with the same input.
+                    if error_collection is None:
+                        error_collection = []
+                    error_collection.append(e)
+        except NotValidError as e:
+            if error_collection is None:
+                error_collection = []
+            error_collection.append(e)
+        if error_collection is not None:
+            if len(error_collection) == 1:
+                raise error_collection[0]
+            raise NotValidError(ValidationCode.MANY_ERRORS, [e.jsonize() for e in error_collection])
+        return data
+    return call
@@ -0,0 +1,67 @@
+"""
+Compact error nodes used by the sparse error format.
+
+Errors of list items are kept in {index: error} maps instead of lists with a None for every valid item.
+Nodes are turned into json only when ValidationError.js is accessed:
+
+    {'code': ValidationCode.BAD_TYPE}               # ErrorNode
+    {'field': error, ...}                           # DictErrors
+    {index: error, ...}                             # ListErrors, sparse
+
+to_dense() converts them to the default format, with lists holding None for items without errors.
+"""
+import enum
+
+
+class ErrorNode:
+    """Error of a single value."""
+
+    __slots__ = ('code', 'details')
+
+    def __init__(self, code, details=None):
+        self.code, self.details = code, details
+
+    def jsonize(self):
+        if self.details is None:
+            return {'code': self.code.value}
+        if isinstance(self.code, enum.IntEnum):
+            return {'code': self.code.value, 'details': self.details}
+        return {'code': self.code, 'details': self.details}
+
+    to_dense = jsonize
+
+
+class DictErrors:
+    """Errors of dict fields, {fieldname: error node}."""
+
+    __slots__ = ('errors',)
+
+    def __init__(self, errors):
+        self.errors = errors
+
+    def jsonize(self):
+        return {fieldname: error.jsonize() for fieldname, error in self.errors.items()}
+
+    def to_dense(self):
+        return {fieldname: error.to_dense() for fieldname, error in self.errors.items()}
+
+
+class ListErrors:
+    """Errors of list items, {index: error node}, of a list of given length."""
+
+    __slots__ = ('length', 'errors')
+
+    def __init__(self, length, errors):
+        self.length, self.errors = length, errors
+
+    def jsonize(self):
+        return {i: error.jsonize() for i, error in self.errors.items()}
+
+    def to_dense(self):
+        error_list = [None] * self.length
+        for i, error in self.errors.items():
+            error_list[i] = error.to_dense()
+        return error_list
+
+
+error_node_types = (ErrorNode, DictErrors, ListErrors)
@@ -0,0 +1,110 @@
+"""
+Built-in string formats used by the '@format' option.
+
+Every format is a function returning a true value for strings in that format.
+uuid, email and ipv4 are the full match of a regular expression compiled once, lang is a hand-written check
+faster than one. date and datetime are parsed by the datetime module, as fast as a regular expression while also
+rejecting days that don't exist. ipv6 is a hand-written check accepting every form ipaddress does, it is about
+half as fast as a regular expression covering the common forms only (see benchmarks/bench_formats.py).
+Strings not in the format are reported as ValidationCode.BAD_FORMAT.
+"""
+import datetime, re, string
+
+
+_uuid = re.compile('[0-9A-Fa-f]{8}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{12}')
+# The length is checked first, long strings are rejected before any backtracking.
+_email = re.compile(r'(?=.{0,318}\Z)[^@\s]{1,64}@(?:(?!-)[A-Za-z0-9-]{1,63}(?<!-)\.)+(?!-)[A-Za-z0-9-]{1,63}(?<!-)')
+_ipv4_byte = '(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])'
+_ipv4 = re.compile(r'(?:%s\.){3}%s' % (_ipv4_byte, _ipv4_byte))
+_ipv6_chars = frozenset(string.hexdigits + ':')
+
+
+# 8-4-4-4-12 hex digits, like fmt_uuid but without trailing characters.
+is_uuid = _uuid.fullmatch
+
+
+def is_lang(value):
+    """1 to 3 ASCII letters, like fmt_lang."""
+    return 0 < len(value) <= 3 and value.isascii() and value.isalpha()
+
+
+# local@domain.tld with no whitespace, a local part of at most 64 characters
+# and a domain of dot separated letters, digits and '-' not starting or ending a label.
+is_email = _email.fullmatch
+
+# Dotted decimal IPv4 address, without leading zeros.
+is_ipv4 = _ipv4.fullmatch
+
+
+def is_ipv6(value):
+    """IPv6 address in any of its text forms, without a zone index, like ipaddress.IPv6Address."""
+    if len(value) > 45:
+        return False
+    groups = 8
+    if '.' in value:
+        # Trailing IPv4 address, as two groups.
+        value, colon, ipv4 = value.rpartition(':')
+        if not colon or not is_ipv4(ipv4) or value == '':
+            return False
+        groups = 6
+        if value.endswith(':'):
+            value += ':'  # '::' right before the IPv4 address, standing for no groups after it
+    if not _ipv6_chars.issuperset(value):
+        return False
+    head, compressed, tail = value.partition('::')
+    parts = (head.split(':') if head else []) + (tail.split(':') if tail else [])
+    if compressed:
+        if '::' in tail or len(parts) >= groups:
+            return False
+    elif len(parts) != groups:
+        return False
+    for part in parts:
+        if not 0 < len(part) <= 4:
+            return False
+    return True
+
+
+def is_date(value):
+    """ISO 8601 date, YYYY-MM-DD."""
+    return parse_date(value) is not None
+
+
+def is_datetime(value):
+    """ISO 8601 date and time, YYYY-MM-DDTHH:MM[:SS[.ffffff]] with an optional Z or +HH:MM offset."""
+    return parse_datetime(value) is not None
+
+
+def parse_date(value):
+    """Returns the datetime.date of an ISO 8601 date, None if the string is not one."""
+    if len(value) != 10 or value[4] != '-' or value[7] != '-':
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def parse_datetime(value):
+    """
+    Returns the datetime.datetime of an ISO 8601 date and time, None if the string is not one.
+    Datetimes with an offset are aware, others are naive.
+    """
+    if len(value) < 16 or value[4] != '-' or value[7] != '-' or value[10] != 'T' or value[13] != ':':
+        return None
+    if value[-1] == 'Z':
+        value = value[:-1] + '+00:00'  # not accepted by fromisoformat before Python 3.11
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+FORMATS = {
+    'uuid': is_uuid,
+    'lang': is_lang,
+    'email': is_email,
+    'ipv4': is_ipv4,
+    'ipv6': is_ipv6,
+    'date': is_date,
+    'datetime': is_datetime,
+}
@@ -0,0 +1,215 @@
+"""
+Validation of deeply nested documents without Python recursion.
+
+The compiled tree of nodes is walked with an explicit stack of frames, one frame per dict or list
+being validated, so the nesting depth of data is limited by max_depth instead of the interpreter's
+recursion limit. Values nested deeper than max_depth are rejected with ValidationCode.TOO_DEEP
+before they are looked into. Results and error trees are the same as those of the tree of nodes.
+Unions with a discriminator are walked as the branch they pick, branches of unions without one
+are tried by nested runs, one per union. References to definitions of '@defs' are walked as the definition,
+so recursive schemas are limited by max_depth too.
+"""
+from .schema import ValidationCode, ValidationError, NotHere
+from .compiler import Validator, DEFAULT_MAX_DEPTH, _Context, _DictNode, _MapNode, _ListNode, _OneOfNode, _PureNode, \
+    _RefNode, _INVALID
+
+
+class IterativeValidator(Validator):
+    """
+    A validator walking its tree of nodes with an explicit stack.
+    :param max_depth: maximum number of nested dicts and lists, None for no limit
+    """
+
+    def __init__(self, schema, max_depth=DEFAULT_MAX_DEPTH, interned=None):
+        super().__init__(schema, interned)
+        self.max_depth = max_depth
+
+    def validate(self, data, fail_fast=False, in_place=False, sparse=False, executor=None, workers=None,
+                 limits=None):
+        """Same as Validator.validate, except that lists are not validated in parallel."""
+        if executor is not None or workers is not None:
+            raise ValueError('the iterative backend does not validate lists in parallel, use the tree backend')
+        if limits is not None:
+            limits.check(data, self.schema, sparse)
+        ctx = _Context(fail_fast, in_place, sparse)
+        result = run(self._root, data, ctx, self.max_depth)
+        if result is _INVALID:
+            raise ValidationError(ctx.error, self.schema)
+        return result
+
+    def is_valid(self, data):
+        return run(self._root, data, _Context(fail_fast=True, sparse=True), self.max_depth) is not _INVALID
+
+    def check(self, data):
+        if not self.is_valid(data):
+            self.validate(data)
+
+
+class _DictFrame:
+
+    __slots__ = ('node', 'data', 'rc_data', 'errors', 'i', 'fieldname', 'subdata')
+
+    def __init__(self, node, data, ctx):
+        self.node, self.data = node, data
+        self.rc_data = data if ctx.in_place else {}
+        self.errors = None
+        self.i = 0
+
+    def next(self, ctx):
+        """Returns (node, data) of the next field, or None when all fields are done."""
+        fields = self.node.fields
+        if self.i == len(fields):
+            return None
+        self.fieldname, node = fields[self.i]
+        self.i += 1
+        self.subdata = self.data.get(self.fieldname, NotHere)
+        return node, self.subdata
+
+    def add(self, result, ctx):
+        """Stores the result of the current field, returns False when the rest of the fields is skipped."""
+        if result is _INVALID:
+            if self.errors is None:
+                self.errors = {}
+            self.errors[self.fieldname] = ctx.error
+            return not ctx.fail_fast
+        if result is not NotHere and (result is not self.subdata or not ctx.in_place):
+            self.rc_data[self.fieldname] = result
+        return True
+
+    def finish(self, ctx):
+        return self.node.finish(self.data, self.rc_data, self.errors, ctx)
+
+
+class _MapFrame:
+
+    __slots__ = ('node', 'data', 'rc_data', 'errors', 'renamed', 'items', 'key', 'rc_key', 'subdata')
+
+    def __init__(self, node, data, ctx):
+        self.node, self.data = node, data
+        self.rc_data = data if ctx.in_place else {}
+        self.errors = self.renamed = None
+        self.items = iter(data.items())
+
+    def next(self, ctx):
+        """Returns (node, data) of the next value with a valid key, or None when all values are done."""
+        for self.key, self.subdata in self.items:
+            if self.node.keys is None:
+                self.rc_key = self.key
+                return self.node.values, self.subdata
+            self.rc_key = self.node.validate_key(self.key, ctx)
+            if self.rc_key is not _INVALID:
+                return self.node.values, self.subdata
+            if not self.add(_INVALID, ctx):
+                return None
+        return None
+
+    def add(self, result, ctx):
+        if result is _INVALID:
+            if self.errors is None:
+                self.errors = {}
+            self.errors[self.key] = ctx.error
+            return not ctx.fail_fast
+        if self.rc_key is not self.key and ctx.in_place:
+            if self.renamed is None:
+                self.renamed = []
+            self.renamed.append((self.key, self.rc_key, result))
+        elif not ctx.in_place or result is not self.subdata:
+            self.rc_data[self.rc_key] = result
+        return True
+
+    def finish(self, ctx):
+        return self.node.finish(self.data, self.rc_data, self.errors, self.renamed, ctx)
+
+
+class _ListFrame:
+
+    __slots__ = ('node', 'data', 'result_data', 'errors', 'i')
+
+    def __init__(self, node, data, ctx):
+        self.node, self.data = node, data
+        self.result_data = data if ctx.in_place else []
+        self.errors = None
+        self.i = -1
+
+    def next(self, ctx):
+        if self.i + 1 == len(self.data):
+            return None
+        self.i += 1
+        return self.node.item, self.data[self.i]
+
+    def add(self, result, ctx):
+        if result is _INVALID:
+            if self.errors is None:
+                self.errors = {}
+            self.errors[self.i] = ctx.error
+            return not ctx.fail_fast
+        if not ctx.in_place:
+            self.result_data.append(result)
+        elif result is not self.data[self.i]:
+            self.data[self.i] = result
+        return True
+
+    def finish(self, ctx):
+        return self.node.finish(self.data, self.result_data, self.errors, ctx)
+
+
+def run(root, data, ctx, max_depth=DEFAULT_MAX_DEPTH):
+    """Validates data with the tree of nodes under root, returns the result or _INVALID with the error in ctx."""
+    stack = []
+    node = root
+    while True:
+        # Descend into the value until a result is known.
+        while type(node) is _RefNode and not node.handles(data):
+            node = node.resolve()
+        if type(node) is _PureNode:
+            node = node.node  # results are not reused, the subtree is walked like any other
+        if type(node) is _DictNode:
+            nested, frame_class = isinstance(data, dict), _DictFrame
+        elif type(node) is _MapNode:
+            nested, frame_class = isinstance(data, dict), _MapFrame
+        elif type(node) is _ListNode:
+            # Lists of numbers are validated at once, they don't nest any further.
+            nested, frame_class = isinstance(data, list), _ListFrame if node.vector is None else None
+        else:
+            nested = False
+        if type(node) is _OneOfNode and data is not NotHere and data is not None:
+            if node.discriminator is None:
+                # Branches tried in turn are each walked by a run of their own.
+                depth = None if max_depth is None else max_depth - len(stack)
+                result = node.first_valid(data, ctx, lambda branch, data, ctx: run(branch, data, ctx, depth))
+            else:
+                # The branch picked by the discriminator is walked in place of the union.
+                branch = node.select(data, ctx)
+                if branch is not _INVALID:
+                    node = branch
+                    continue
+                result = _INVALID
+        elif not nested:
+            # Scalars, missing values, nulls and bad types.
+            result = node.validate(data, ctx)
+        elif max_depth is not None and len(stack) >= max_depth:
+            result = ctx.fail(ValidationCode.TOO_DEEP, max_depth)
+        elif frame_class is None:
+            result = node.validate(data, ctx)
+        elif frame_class is _ListFrame and node.length_checks and node.check_length(data, ctx) is _INVALID:
+            result = _INVALID
+        else:
+            frame = frame_class(node, data, ctx)
+            child = frame.next(ctx)
+            if child is not None:
+                stack.append(frame)
+                node, data = child
+                continue
+            result = frame.finish(ctx)
+        # Hand results up until some frame has another value to validate.
+        while stack:
+            frame = stack[-1]
+            if frame.add(result, ctx):
+                child = frame.next(ctx)
+                if child is not None:
+                    node, data = child
+                    break
+            stack.pop()
+            result = frame.finish(ctx)
+        else:
+            return result
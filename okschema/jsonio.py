@@ -0,0 +1,29 @@
+"""
+Validation of raw JSON documents, e.g. request bodies.
+
+validate_json(schema, raw) decodes and validates in one call, with the same result as
+validate(schema, json.loads(raw)). The document is decoded by the C scanner of the json module, which is faster
+than any decoder driven by the schema from Python could be, and validated by the codegen validator of the schema
+(see okschema.codegen), compiled through okschema.cache. That is the gain over json.loads followed by the default
+validate(), the fail_fast mode is left to the tree of nodes like in CodegenValidator.validate.
+Decimals and floats are JSON strings in okschema documents, they are parsed once, from the decoded string.
+"""
+import json
+
+from .cache import compile_cached
+
+
+def validate_json(schema, raw, fail_fast=False, limits=None):
+    """
+    Decodes a JSON document and validates it, see module doc.
+    :param raw: str, or bytes, bytearray or memoryview of UTF-8, UTF-16 or UTF-32 encoded JSON;
+                memoryviews are decoded straight from their buffer
+    :param fail_fast: stop at the first error
+    :param limits: okschema.Limits budget of the call, checked on the decoded document
+    :raises: ValidationError, json.JSONDecodeError when raw is not well formed
+    """
+    if isinstance(raw, memoryview):
+        # json.loads only takes str, bytes and bytearray; str() decodes the buffer without copying it into bytes.
+        raw = str(raw, json.detect_encoding(bytes(raw[:4])), 'surrogatepass')
+    data = json.loads(raw)
+    return compile_cached(schema, backend='codegen').validate(data, fail_fast, limits=limits)
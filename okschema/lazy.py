@@ -0,0 +1,194 @@
+"""
+Lazy validation of large documents of which only a few fields are read.
+
+validate_lazy(schema, data) returns read-only proxies of the dicts and lists of data. Each field or item
+is validated and cast the first time it is read, and the result is kept for later reads.
+Invalid values raise ValidationError when they are read, with the error placed at its path in the document
+and the path in ValidationError.path. materialize() validates everything left and returns plain dicts and lists,
+with all errors like validate().
+
+Dicts with a dict-level validator and lists of numbers (see okschema.vectorized) are validated as a whole
+when they are read, since their validation needs all their values. So are maps and unions without
+a discriminator, while dicts of discriminated unions are proxies of the branch picked by the discriminator.
+References to definitions of '@defs' are proxies of the definition, so recursive documents are validated
+one level at a time.
+"""
+import collections.abc
+
+from .schema import NotHere, ValidationError
+from .cache import compile_cached
+from .compiler import _Context, _DictNode, _ListNode, _OneOfNode, _PureNode, _RefNode, _INVALID
+
+
+def validate_lazy(schema, data):
+    """
+    Returns a LazyDict or LazyList proxy of data validated on access, or the validated value for other schemas.
+    The schema is compiled through okschema.cache.
+    """
+    validator = compile_cached(schema)
+    return _lazy_value(validator._root, data, (), schema)
+
+
+def _lazy_value(node, data, trail, schema):
+    """Proxy of a dict or list, or the validated value of anything else. trail is ((key or index, list length), ...)."""
+    ctx = _Context()
+    while isinstance(data, (dict, list)) and (type(node) is _RefNode or
+                                             type(node) is _OneOfNode and node.discriminator is not None):
+        node = node.resolve() if type(node) is _RefNode else node.select(data, ctx)
+        if node is _INVALID:
+            raise _error(ctx.error, trail, schema)
+    if type(node) is _PureNode:
+        node = node.node
+    if type(node) is _DictNode and isinstance(data, dict) and node.validators is None:
+        return LazyDict(node, data, trail, schema)
+    if type(node) is _ListNode and isinstance(data, list) and node.vector is None and not node.ndarray:
+        if node.length_checks and node.check_length(data, ctx) is _INVALID:
+            raise _error(ctx.error, trail, schema)
+        return LazyList(node, data, trail, schema)
+    result = node.validate(data, ctx)
+    if result is _INVALID:
+        raise _error(ctx.error, trail, schema)
+    return result
+
+
+def _error(error, trail, schema):
+    """ValidationError of a value at the end of trail, with the error nested like in errors of the whole document."""
+    for key, length in reversed(trail):
+        if length is None:
+            error = {key: error}
+        else:
+            error_list = [None] * length
+            error_list[key] = error
+            error = error_list
+    return ValidationError(error, schema, [key for key, length in trail])
+
+
+class _Lazy:
+
+    __slots__ = ('_node', '_data', '_trail', '_schema', '_values')
+
+    def __init__(self, node, data, trail, schema):
+        self._node, self._data, self._trail, self._schema = node, data, trail, schema
+        self._values = {}  # validated values by key or index
+
+    def materialize(self):
+        """Validates what wasn't read yet, returns plain validated dicts and lists or raises ValidationError."""
+        ctx = _Context()
+        result = self._materialize(ctx)
+        if result is _INVALID:
+            raise _error(ctx.error, self._trail, self._schema)
+        return result
+
+    def _validated(self, key, node, data, length=None):
+        value = self._values.get(key, _INVALID)
+        if value is _INVALID:
+            value = self._values[key] = _lazy_value(node, data, self._trail + ((key, length),), self._schema)
+        return value
+
+    def _materialized(self, key, node, data, ctx):
+        value = self._values.get(key, _INVALID)
+        if value is _INVALID:
+            return node.validate(data, ctx)
+        if isinstance(value, _Lazy):
+            return value._materialize(ctx)
+        return value
+
+
+class LazyDict(_Lazy, collections.abc.Mapping):
+    """
+    Read-only mapping of the fields of a validated dict. Extra fields of data are left out, like in validate().
+    Reading a required field missing from data raises ValidationError.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, fieldname):
+        node = _field_nodes(self._node).get(fieldname)
+        if node is None:
+            raise KeyError(fieldname)
+        value = self._validated(fieldname, node, self._data.get(fieldname, NotHere))
+        if value is NotHere:
+            raise KeyError(fieldname)  # an optional field without a default
+        return value
+
+    def __contains__(self, fieldname):
+        node = _field_nodes(self._node).get(fieldname)
+        return node is not None and (fieldname in self._data or not node.optional or node.has_default)
+
+    def __iter__(self):
+        data = self._data
+        for fieldname, node in self._node.fields:
+            if fieldname in data or not node.optional or node.has_default:
+                yield fieldname
+
+    def __len__(self):
+        return sum(1 for fieldname in self)
+
+    def _materialize(self, ctx):
+        rc_data = {}
+        errors = None
+        for fieldname, node in self._node.fields:
+            result = self._materialized(fieldname, node, self._data.get(fieldname, NotHere), ctx)
+            if result is _INVALID:
+                if errors is None:
+                    errors = {}
+                errors[fieldname] = ctx.error
+            elif result is not NotHere:
+                rc_data[fieldname] = result
+        return self._node.finish(self._data, rc_data, errors, ctx)
+
+    def __repr__(self):
+        return 'LazyDict(%r)' % self._data
+
+
+class LazyList(_Lazy, collections.abc.Sequence):
+    """Read-only sequence of the items of a validated list."""
+
+    __slots__ = ()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._data)))]
+        length = len(self._data)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('list index out of range')
+        return self._validated(index, self._node.item, self._data[index], length)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, LazyList)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def _materialize(self, ctx):
+        result_data = []
+        errors = None
+        for i, data_item in enumerate(self._data):
+            result = self._materialized(i, self._node.item, data_item, ctx)
+            if result is _INVALID:
+                if errors is None:
+                    errors = {}
+                errors[i] = ctx.error
+            else:
+                result_data.append(result)
+        return self._node.finish(self._data, result_data, errors, ctx)
+
+    def __repr__(self):
+        return 'LazyList(%r)' % self._data
+
+
+_field_node_maps = {}
+
+
+def _field_nodes(node):
+    """{fieldname: node} of a dict node."""
+    fields = _field_node_maps.get(node)
+    if fields is None:
+        if len(_field_node_maps) >= 1024:
+            _field_node_maps.clear()
+        fields = _field_node_maps[node] = dict(node.fields)
+    return fields
@@ -0,0 +1,84 @@
+"""
+Resource budgets of single validation calls.
+
+    validator.validate(data, limits=okschema.Limits(max_nodes=100000, max_depth=32, max_string_length=10 ** 6))
+
+Data is walked once before validation, without recursion, and rejected as soon as it goes over a limit,
+so hostile payloads cost at most the budget instead of their whole size. Every value counts as a node,
+including extra dict fields the schema doesn't look at; each number of an array counts too.
+The depth is the number of nested dicts and lists, like the max_depth of the iterative backend.
+The string length is the total number of characters of strings and dict keys.
+
+A payload over a limit raises ValidationError with ValidationCode.TOO_LARGE at the top of the error tree,
+details naming the limit, {'max_nodes': 100000}, and the path of the value found over it in ValidationError.path.
+"""
+from .schema import ValidationCode, ValidationError
+from .errors import ErrorNode
+from . import vectorized
+
+
+class Limits:
+    """
+    Limits of data accepted by a validation call, None for no limit.
+    :param max_nodes: maximum number of values
+    :param max_depth: maximum number of nested dicts and lists
+    :param max_string_length: maximum total length of strings and dict keys
+    """
+
+    __slots__ = ('max_nodes', 'max_depth', 'max_string_length')
+
+    def __init__(self, max_nodes=None, max_depth=None, max_string_length=None):
+        self.max_nodes, self.max_depth, self.max_string_length = max_nodes, max_depth, max_string_length
+
+    def check(self, data, schema, sparse=False):
+        """Raises ValidationError if data goes over a limit."""
+        exceeded = self.exceeded(data)
+        if exceeded is not None:
+            details, path = exceeded
+            if sparse:
+                raise ValidationError(ErrorNode(ValidationCode.TOO_LARGE, details), schema, path)
+            raise ValidationError({'code': ValidationCode.TOO_LARGE.value, 'details': details}, schema, path)
+
+    def exceeded(self, data):
+        """Returns ({limit name: limit}, path) of the first limit data goes over, or None."""
+        max_nodes, max_depth, max_string_length = self.max_nodes, self.max_depth, self.max_string_length
+        nodes = string_length = 0
+        path = []
+        stack = [iter([(None, data)])]  # iterators of (key or index, value) of the dicts and lists entered
+        while stack:
+            for key, value in stack[-1]:
+                break
+            else:
+                stack.pop()
+                if path:
+                    path.pop()
+                continue
+            nodes += 1
+            if max_nodes is not None and nodes > max_nodes:
+                return {'max_nodes': max_nodes}, _path(path, key, stack)
+            vtype = type(value)
+            if max_string_length is not None:
+                if type(key) is str:
+                    string_length += len(key)
+                if vtype is str:
+                    string_length += len(value)
+                if string_length > max_string_length:
+                    return {'max_string_length': max_string_length}, _path(path, key, stack)
+            if vtype is dict or vtype is list:
+                if max_depth is not None and len(stack) > max_depth:
+                    return {'max_depth': max_depth}, _path(path, key, stack)
+                stack.append(iter(value.items()) if vtype is dict else enumerate(value))
+                if len(stack) > 2:
+                    path.append(key)
+            elif vtype not in _json_scalar_types and vectorized.buffer_type(value) is not None:
+                nodes += len(value)
+                if max_nodes is not None and nodes > max_nodes:
+                    return {'max_nodes': max_nodes}, _path(path, key, stack)
+        return None
+
+
+_json_scalar_types = frozenset([str, int, float, bool, type(None)])
+
+
+def _path(path, key, stack):
+    return path + [key] if len(stack) > 1 else []
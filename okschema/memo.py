@@ -0,0 +1,138 @@
+"""
+Memoizing cache of validators.
+
+    '@val': okschema.cached(normalize_address, maxsize=10000, ttl=60)
+
+A cached validator is called once for equal input values while they stay in the cache, and
+NotValidErrors raised by it are cached too. Validators are expected to be pure: results and errors are
+shared by all calls with the same input, so they shouldn't be modified by the caller.
+Dicts, lists and tuples are keyed by their contents, other unhashable values are not cached.
+Asynchronous validators (see okschema.aio) are cached once their result is awaited.
+"""
+import collections, copy, decimal, inspect, threading, time
+
+from .schema import NotValidError, NotHere
+
+
+def cached(fn, maxsize=1024, ttl=None):
+    """
+    Wraps a validator into a CachedValidator.
+    :param maxsize: maximum number of cached values, the least recently used ones are evicted first
+    :param ttl: number of seconds a value stays cached, None for no limit
+    """
+    return CachedValidator(fn, maxsize, ttl)
+
+
+class CachedValidator:
+    """
+    Validator remembering results and errors of the wrapped validator, with LRU and TTL eviction.
+    Thread safe. The wrapped validator is called without holding the lock, so concurrent misses
+    of the same value may call it more than once.
+    """
+
+    def __init__(self, fn, maxsize=1024, ttl=None):
+        if not callable(fn):
+            raise TypeError('validator must be callable')
+        self.fn = fn
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self._entries = collections.OrderedDict()  # key: (expiry time or None, is error, result or error)
+        self._lock = threading.Lock()
+
+    def __call__(self, data):
+        try:
+            key = value_key(data)
+        except TypeError:
+            return self.fn(data)  # unhashable data
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, is_error, value = entry
+                if expires is not None and expires <= time.monotonic():
+                    del self._entries[key]
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    if is_error:
+                        raise copy.copy(value)
+                    return value
+            self.misses += 1
+        try:
+            result = self.fn(data)
+        except NotValidError as e:
+            self._store(key, True, copy.copy(e))
+            raise
+        if inspect.isawaitable(result):
+            return self._await(key, result)
+        self._store(key, False, result)
+        return result
+
+    async def _await(self, key, result):
+        try:
+            result = await result
+        except NotValidError as e:
+            self._store(key, True, copy.copy(e))
+            raise
+        self._store(key, False, result)
+        return result
+
+    def _store(self, key, is_error, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = expires, is_error, value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Returns hit, miss, eviction and expiration counters and the current size of the cache."""
+        with self._lock:
+            return {
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'expirations': self.expirations, 'size': len(self._entries), 'maxsize': self.maxsize,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __reduce__(self):
+        # Pickled without the cached values and the lock, e.g. for process pools (see okschema.parallel).
+        return CachedValidator, (self.fn, self.maxsize, self.ttl)
+
+    def __repr__(self):
+        return 'cached(%r, maxsize=%r, ttl=%r)' % (self.fn, self.maxsize, self.ttl)
+
+
+# Types whose values are only equal to values of the same type, used in keys as they are.
+_plain_types = frozenset([str, int, type(None)])
+
+
+def value_key(value):
+    """Hashable key of a value, equal for equal values of the same types. Raises TypeError for unhashable values."""
+    vtype = type(value)
+    if vtype in _plain_types:
+        return value
+    if vtype is dict:
+        return vtype, tuple([(key, subvalue if type(subvalue) in _plain_types else value_key(subvalue))
+                             for key, subvalue in value.items()])
+    if vtype is list or vtype is tuple:
+        return vtype, tuple([subvalue if type(subvalue) in _plain_types else value_key(subvalue)
+                             for subvalue in value])
+    if vtype is float or vtype is decimal.Decimal:
+        return vtype, repr(value)  # 1.0 and 1.00, or 0.0 and -0.0, are equal but not the same value
+    hash(value)
+    return vtype, value  # bools are equal to ints
+
+
+def fields_key(data, fieldnames):
+    """Key of the values of some fields of a dict, see value_key. Other fields are left out."""
+    key = []
+    for fieldname in fieldnames:
+        subvalue = data.get(fieldname, NotHere)
+        key.append(subvalue if type(subvalue) in _plain_types else value_key(subvalue))
+    return tuple(key)
@@ -0,0 +1,108 @@
+"""
+Validation of large lists split into chunks validated by a pool of workers.
+
+A list with at least THRESHOLD items is split into chunks of CHUNK_SIZE items validated by an executor,
+and the results and per-index errors are merged back in order. Smaller lists are validated serially.
+Only the outermost large list of a path is split, lists nested in its items are validated by the workers.
+
+For process pools the normalized schema of the list items is pickled once per call and compiled once
+per worker process. Callables referenced by @val and @default must then be picklable: module level functions
+are, lambdas and closures are too when cloudpickle is installed.
+"""
+import concurrent.futures, pickle, sys
+
+try:
+    import cloudpickle
+except ImportError:
+    cloudpickle = None
+
+from .compiler import compile_node, _Context, _INVALID
+
+
+THRESHOLD = 10000
+CHUNK_SIZE = 2000
+
+
+def default_executor(workers):
+    """A pool of processes, or of threads on free-threaded builds where threads run Python code in parallel."""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    if is_gil_enabled is not None and not is_gil_enabled():
+        return concurrent.futures.ThreadPoolExecutor(workers)
+    return concurrent.futures.ProcessPoolExecutor(workers)
+
+
+class Parallel:
+    """Executor used by a single validation call, see _ListNode.validate."""
+
+    __slots__ = ('executor', 'threshold', 'chunk_size', '_blobs')
+
+    def __init__(self, executor, threshold=None, chunk_size=None):
+        self.executor = executor
+        self.threshold = THRESHOLD if threshold is None else threshold
+        self.chunk_size = CHUNK_SIZE if chunk_size is None else chunk_size
+        self._blobs = {}
+
+    def validate_list(self, node, data, ctx):
+        """Validates items of a list node in chunks, returns the result or _INVALID with the error in ctx."""
+        if isinstance(self.executor, concurrent.futures.ThreadPoolExecutor):
+            task, item = _validate_items, node.item
+        else:
+            task, item = _validate_pickled_items, self._pickled_spec(node)
+        futures = [(start, self.executor.submit(task, item, data[start:start + self.chunk_size],
+                                                ctx.fail_fast, ctx.sparse))
+                   for start in range(0, len(data), self.chunk_size)]
+        result_data = data if ctx.in_place else []
+        errors = None
+        for start, future in futures:
+            results, chunk_errors = future.result()
+            if chunk_errors:
+                if errors is None:
+                    errors = {}
+                for i, error in chunk_errors.items():
+                    errors[start + i] = error
+                if ctx.fail_fast:
+                    for pending_start, pending in futures:
+                        pending.cancel()
+                    break
+            elif errors is None:
+                if ctx.in_place:
+                    data[start:start + len(results)] = results
+                else:
+                    result_data.extend(results)
+        return node.finish(data, result_data, errors, ctx)
+
+    def _pickled_spec(self, node):
+        blob = self._blobs.get(id(node))
+        if blob is None:
+            blob = self._blobs[id(node)] = (cloudpickle or pickle).dumps(node.item_spec)
+        return blob
+
+
+def _validate_items(item, items, fail_fast, sparse):
+    """Returns results of valid items and {index in items: error}."""
+    ctx = _Context(fail_fast, False, sparse)
+    item_validate = item.validate
+    results = []
+    errors = {}
+    for i, data_item in enumerate(items):
+        item_result_data = item_validate(data_item, ctx)
+        if item_result_data is _INVALID:
+            errors[i] = ctx.error
+            if fail_fast:
+                break
+        else:
+            results.append(item_result_data)
+    return results, errors
+
+
+# Nodes compiled in a worker process, keyed by the pickled spec.
+_worker_nodes = {}
+
+
+def _validate_pickled_items(blob, items, fail_fast, sparse):
+    item = _worker_nodes.get(blob)
+    if item is None:
+        if len(_worker_nodes) >= 64:
+            _worker_nodes.clear()
+        item = _worker_nodes[blob] = compile_node(pickle.loads(blob))
+    return _validate_items(item, items, fail_fast, sparse)
@@ -0,0 +1,239 @@
+"""
+Incremental revalidation of partial updates.
+
+Validator.revalidate(previous_result, patch) validates the values set by the patch and keeps the values of
+previous_result that were not touched, which were validated already. Dicts and lists holding changed values
+are completed again, so the dict-level validators enclosing a change are called again, with the validated
+dict rebuilt from the fields of the schema. The result is the same as validating the patched document,
+as long as dict-level validators leave the fields of the schema as they are.
+
+A patch is either a list of RFC 6902 operations ('add', 'replace' and 'remove'), or a dict mapping
+JSON pointers (RFC 6901) to new values, replacing the value at the pointer or adding it when there is none
+('-' appends to a list). NotHere as the new value removes the value.
+Patch values are raw json, like the data passed to validate(). previous_result is neither validated again
+nor modified: dicts and lists on the paths of changes are copied.
+Changes inside unions need a discriminator, which the patch may not change; replace the whole union value instead.
+"""
+import copy
+
+from .schema import NotHere, ValidationError
+from .compiler import _Context, _DictNode, _MapNode, _ListNode, _OneOfNode, _PureNode, _RefNode, _INVALID
+
+
+def revalidate(validator, previous, patch, fail_fast=False, sparse=False):
+    """Returns the validated result of previous patched with patch, or raises ValidationError, see module doc."""
+    doc = _PatchedDocument(previous)
+    for op, path, value in _operations(patch):
+        doc.apply(op, path, value)
+    ctx = _Context(fail_fast, False, sparse)
+    result = doc.revalidate(validator._root, doc.root, ctx)
+    if result is _INVALID:
+        raise ValidationError(ctx.error, validator.schema)
+    return result
+
+
+def parse_pointer(pointer):
+    """Returns the list of reference tokens of a JSON pointer."""
+    if not isinstance(pointer, str):
+        raise ValueError('JSON pointer must be a string: %r' % (pointer,))
+    if pointer == '':
+        return []
+    if pointer[0] != '/':
+        raise ValueError('JSON pointer must start with /: %r' % pointer)
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def _operations(patch):
+    if isinstance(patch, dict):
+        for pointer, value in patch.items():
+            yield 'remove' if value is NotHere else 'set', parse_pointer(pointer), value
+        return
+    if not isinstance(patch, list):
+        raise ValueError('patch must be a list of operations or a dict of JSON pointers')
+    for operation in patch:
+        try:
+            op, pointer = operation['op'], operation['path']
+        except (KeyError, TypeError):
+            raise ValueError('bad patch operation: %r' % (operation,))
+        if op not in ['add', 'replace', 'remove']:
+            raise ValueError('unsupported patch operation: %r' % (op,))
+        if op != 'remove' and 'value' not in operation:
+            raise ValueError('patch operation without a value: %r' % (operation,))
+        yield op, parse_pointer(pointer), operation.get('value')
+
+
+class _Raw:
+    """A value set by the patch, validated from scratch."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class _PatchedDocument:
+    """
+    The previous result with the changes of a patch applied. Containers on the paths of changes are copies,
+    remembered by id; values set by the patch are wrapped in _Raw, removed dict fields are _Raw(NotHere).
+    """
+
+    def __init__(self, previous):
+        self.root = previous
+        self._copies = {}  # id: copy, the copies are kept alive so their ids stay unique
+
+    def _own(self, container):
+        if id(container) in self._copies:
+            return container
+        if isinstance(container, dict):
+            container = dict(container)
+        elif isinstance(container, list):
+            container = list(container)
+        else:
+            return None
+        self._copies[id(container)] = container
+        return container
+
+    def apply(self, op, path, value):
+        if not path:
+            if op == 'remove':
+                raise ValueError('the whole document cannot be removed')
+            self.root = _Raw(copy.deepcopy(value))
+            return
+        if type(self.root) is _Raw:
+            self.root.value = _apply_raw(self.root.value, op, path, value)
+            return
+        parent = self.root = self._own(self.root)
+        for i, token in enumerate(path[:-1]):
+            key = _key(parent, token, path)
+            child = parent[key]
+            if type(child) is _Raw:
+                child.value = _apply_raw(child.value, op, path[i + 1:], value)
+                return
+            child = self._own(child)
+            if child is None:
+                raise ValueError('path not found: %r' % (path,))
+            parent[key] = parent = child
+        _apply_last(parent, op, path, value)
+
+    def revalidate(self, node, value, ctx):
+        """Validates value with node, only looking into what the patch changed."""
+        if type(value) is _Raw:
+            return node.validate(value.value, ctx)
+        if id(value) not in self._copies:
+            return value  # validated already
+        while type(node) is _RefNode:
+            node = node.resolve()
+        if type(node) is _PureNode:
+            node = node.node
+        if type(node) is _OneOfNode:
+            # The branch of the previous result is known by its discriminator, unions without one can't tell.
+            if node.discriminator is None or not isinstance(value, dict):
+                raise ValueError('changes in unions without a discriminator cannot be revalidated')
+            if type(value.get(node.discriminator)) is _Raw:
+                raise ValueError('the discriminator of a union cannot be patched')
+            node = node.select(value, ctx)
+            if node is _INVALID:
+                raise ValueError('the previous result does not match the schema')
+            return self.revalidate(node, value, ctx)
+        if type(node) is _DictNode and isinstance(value, dict):
+            rc_data = {}
+            errors = None
+            for fieldname, subnode in node.fields:
+                subvalue = value.get(fieldname, NotHere)
+                if subvalue is NotHere:
+                    continue  # an optional field without a default, left as it was
+                result = self.revalidate(subnode, subvalue, ctx)
+                if result is _INVALID:
+                    if errors is None:
+                        errors = {}
+                    errors[fieldname] = ctx.error
+                    if ctx.fail_fast:
+                        break
+                elif result is not NotHere:
+                    rc_data[fieldname] = result
+            return node.finish(value, rc_data, errors, ctx)
+        if type(node) is _MapNode and isinstance(value, dict):
+            rc_data = {}
+            errors = None
+            for key, subvalue in value.items():
+                if type(subvalue) is _Raw and subvalue.value is NotHere:
+                    continue  # a removed key
+                if type(subvalue) is _Raw and node.keys is not None:
+                    # Keys of values set by the patch may be new.
+                    rc_key = node.validate_key(key, ctx)
+                    result = self.revalidate(node.values, subvalue, ctx) if rc_key is not _INVALID else _INVALID
+                else:
+                    rc_key, result = key, self.revalidate(node.values, subvalue, ctx)
+                if result is _INVALID:
+                    if errors is None:
+                        errors = {}
+                    errors[key] = ctx.error
+                    if ctx.fail_fast:
+                        break
+                else:
+                    rc_data[rc_key] = result
+            return node.finish(value, rc_data, errors, None, ctx)
+        if type(node) is _ListNode and isinstance(value, list):
+            if node.length_checks and node.check_length(value, ctx) is _INVALID:
+                return _INVALID
+            result_data = []
+            errors = None
+            for i, item in enumerate(value):
+                result = self.revalidate(node.item, item, ctx)
+                if result is _INVALID:
+                    if errors is None:
+                        errors = {}
+                    errors[i] = ctx.error
+                    if ctx.fail_fast:
+                        break
+                else:
+                    result_data.append(result)
+            return node.finish(value, result_data, errors, ctx)
+        raise ValueError('the previous result does not match the schema')
+
+
+def _key(container, token, path, add=False):
+    """Returns the dict key or the list index of a reference token."""
+    if isinstance(container, dict):
+        if not add and token not in container:
+            raise ValueError('path not found: %r' % (path,))
+        return token
+    if isinstance(container, list):
+        if add and token == '-':
+            return len(container)
+        if not (token.isascii() and token.isdigit()) or (token[0] == '0' and token != '0'):
+            raise ValueError('bad list index in path: %r' % (path,))
+        index = int(token)
+        if index > len(container) or (index == len(container) and not add):
+            raise ValueError('list index out of range in path: %r' % (path,))
+        return index
+    raise ValueError('path not found: %r' % (path,))
+
+
+def _apply_last(parent, op, path, value, raw=False):
+    """Applies an operation to the container holding its target, values set in raw json are not wrapped."""
+    key = _key(parent, path[-1], path, add=op in ['add', 'set'])
+    if op == 'remove':
+        if isinstance(parent, dict) and not raw:
+            parent[key] = _Raw(NotHere)  # the field is validated as missing
+        else:
+            del parent[key]
+        return
+    value = copy.deepcopy(value) if raw else _Raw(copy.deepcopy(value))
+    if isinstance(parent, list) and (op == 'add' or key == len(parent)):
+        parent.insert(key, value)
+    else:
+        parent[key] = value
+
+
+def _apply_raw(raw, op, path, value):
+    """Applies an operation to a raw json value set by an earlier operation, returns the new value."""
+    if not path:
+        if op == 'remove':
+            raise ValueError('the whole value cannot be removed')
+        return copy.deepcopy(value)
+    parent = raw
+    for token in path[:-1]:
+        parent = parent[_key(parent, token, path)]
+    _apply_last(parent, op, path, value, raw=True)
+    return raw
@@ -1,5 +1,7 @@
-import decimal, re, enum
-import pendulum
+import copy, datetime, decimal, functools, re, enum
+
+from .errors import error_node_types
+from . import formats, vectorized
 
 
 fmt_uuid = '[0-9A-Fa-f]{8}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{12}'
@@ -7,17 +9,30 @@ fmt_lang = '[A-Za-z]{1,3}'
 
 
 def val_datetime(val):
-    try:
-        return pendulum.from_format(val, "YYYY-MM-DDTHH:mm:ss.SSSSSS")
-    except ValueError as e:
+    """Parses an ISO 8601 datetime into a pendulum DateTime, UTC unless the string has an offset."""
+    rc = formats.parse_datetime(val)
+    if rc is None:
         raise NotValidError(ValidationCode.BAD_TYPE, "bad datetime format")
+    return pendulum_value(rc)
 
 
 def val_date(val):
-    try:
-        return pendulum.from_format(val, "YYYY-MM-DD")
-    except ValueError as e:
+    """Parses an ISO 8601 date into a pendulum DateTime at midnight UTC."""
+    rc = formats.parse_date(val)
+    if rc is None:
         raise NotValidError(ValidationCode.BAD_TYPE, "bad date format")
+    return pendulum_value(datetime.datetime(rc.year, rc.month, rc.day))
+
+
+def pendulum_value(value):
+    """
+    Converts a datetime.date or datetime.datetime into a pendulum Date or DateTime, naive datetimes become UTC.
+    pendulum is imported on the first call, so it is only needed when pendulum values are asked for.
+    """
+    import pendulum
+    if isinstance(value, datetime.datetime):
+        return pendulum.instance(value)
+    return pendulum.date(value.year, value.month, value.day)
 
 
 class NotHereClass:
@@ -33,12 +48,37 @@ class SchemaCode(enum.IntEnum):
     UNKNOWN_OPTION = 1000
     ILLEGAL_COMPARISON = 2000
     VAL_NOT_CALLABLE = 3000
+    UNKNOWN_TYPE = 4000
+    BAD_OPTION = 5000  # option value or option not applicable to the type
+    BAD_SCHEMA = 6000  # malformed schema node
+    BAD_FIELD_NAME = 7000
+    BAD_REF = 8000  # @ref to an unknown definition, or definitions only referring to each other
 
 
 class ValidationError(Exception):
 
-    def __init__(self, js, schema):
-        self.js, schema = js, schema
+    def __init__(self, js, schema, path=None):
+        # js may also be a tree of okschema.errors nodes (sparse format), turned into json on first access.
+        # path is the list of keys and indices of the invalid value read from a lazy proxy (see okschema.lazy)
+        # or of the value found over a limit (see okschema.limits).
+        self.schema = schema
+        self.path = path
+        if isinstance(js, error_node_types):
+            self.errors, self._js = js, None
+        else:
+            self.errors, self._js = None, js
+
+    @property
+    def js(self):
+        if self._js is None:
+            self._js = self.errors.jsonize()
+        return self._js
+
+    def to_dense(self):
+        """Returns errors in the default format, with lists holding None for items without errors."""
+        if self.errors is not None:
+            return self.errors.to_dense()
+        return self.js
 
 
 class NotValidError(Exception):
@@ -78,6 +118,10 @@ class ValidationCode(enum.IntEnum):
     NOT_LT = 11
     NOT_LTEQ = 12
     NOT_EQ = 13
+    TOO_DEEP = 14  # data nested deeper than the validator's max_depth
+    BAD_FORMAT = 15  # string not in the @format, details hold the format name
+    TOO_LARGE = 16  # data over a limit of okschema.Limits, details hold {limit name: limit}
+    BAD_KEY = 17  # map key not valid for @keys, details hold the error of the key
 
     # Application dependent, not generated here but could be used by validators or some other code
     BAD_VALUE = 50  # things like bad password
@@ -91,28 +135,46 @@ class _StructureCode(enum.IntEnum):
     LIST = -2
 
 
-def validate(schema, data):
-    """Validates data according to the schema."""
+# Comparisons of the list options, checked against the length of the list.
+LIST_LENGTH_OPTIONS = ['@gt', '@gteq', '@lt', '@lteq']
+
+
+def validate(schema, data, fail_fast=False, executor=None, workers=None, limits=None):
+    """
+    Validates data according to the schema.
+    :param fail_fast: stop at the first error, the error tree then holds only the path to that error
+    :param executor: concurrent.futures executor validating chunks of large lists in parallel,
+                     the schema is then compiled through okschema.cache, see okschema.parallel
+    :param workers: validate large lists with a new pool of that many workers
+    :param limits: okschema.Limits budget of the call, data over it is rejected before validation
+    Schemas with '@defs' are compiled through okschema.cache, references are resolved by compiled validators.
+    """
+    if executor is not None or workers is not None or (isinstance(schema, dict) and '@defs' in schema):
+        from .cache import compile_cached
+        return compile_cached(schema).validate(data, fail_fast, executor=executor, workers=workers, limits=limits)
+    if limits is not None:
+        limits.check(data, schema)
     try:
-        data = _validate(schema, data)
+        data = _validate(schema, data, fail_fast)
     except NotValidError as e:
         raise ValidationError(e.jsonize(), schema) # from None
     return data
 
 
-# TODO: design a schema to validate any possible schema
+# Schemas are checked statically by okschema.checker when they are compiled.
 
 
-def _validate(schema, data):
+def _validate(schema, data, fail_fast=False):
     """
     Validates a single json value.
     :param schema: description of the expected value
     :param data: the value to validate
+    :param fail_fast: raise on the first error instead of collecting errors of all fields and list items
     :return: validated_value
     :raises: ValidationError, SchemaError
     """
     if isinstance(schema, list):
-        return handle_list(schema, data)
+        return handle_list(schema, data, fail_fast)
 
     ftype = determine_field_type(schema)
 
@@ -129,6 +191,10 @@ def _validate(schema, data):
                 raise NotValidError(ValidationCode.NULL)
             return None  # Data is None and it is allowed.
 
+    if ftype == 'oneof':
+        return handle_oneof(schema, data, fail_fast)
+    if ftype == 'map':
+        return handle_map(schema, data, fail_fast)
     if ftype == 'dict':
         # Parse subfields of dictionary.
         error_details = {}
@@ -141,11 +207,13 @@ def _validate(schema, data):
                     subdata = NotHere  # pass NotHere to inform us recursively that there is no data for this key
                 try:
                     # Validate recursively.
-                    rc_subdata = _validate(subschema, subdata)
+                    rc_subdata = _validate(subschema, subdata, fail_fast)
                     if rc_subdata is not NotHere:
                         rc_data[fieldname] = rc_subdata
                 except NotValidError as e:
                     error_details[fieldname] = e.jsonize()
+                    if fail_fast:
+                        break
         if error_details:
             raise NotValidError(_StructureCode.DICT, error_details)
 
@@ -154,6 +222,8 @@ def _validate(schema, data):
             rc_data = call_validators(schema['@val'], rc_data)
     else:
         # Data is expected to be a scalar value.
+        if ftype in ['date', 'datetime'] and get_bool_opt_from_schema(schema, '@pendulum'):
+            data = pendulum_value(data)
         if isinstance(schema, dict):
             # The value of data has further constraints and options specified in schema.
             rc_data = verify_value_options(schema, ftype, data)
@@ -167,50 +237,174 @@ def handle_optional_and_default_when_data_nothere(schema):
     optional = get_bool_opt_from_schema(schema, '@optional')
     if not optional:
         raise NotValidError(ValidationCode.MISSING)
-    try:
-        default = schema['@default']
-        if callable(default):
-            default = default()
-    except KeyError:
+    if not isinstance(schema, dict) or '@default' not in schema:
         return NotHere  # Optional field has no default.
-    return default  # Default is returned as is, no validators are runned.
+    return default_value(schema['@default'])  # Default is returned as is, no validators are runned.
+
+
+def default_value(default):
+    """Returns the value of a default: the result of a callable, a copy of a mutable dict, list or set."""
+    if callable(default):
+        return default()
+    if isinstance(default, (dict, list, set)):
+        return copy.deepcopy(default)  # results never share a default, even if schemas do
+    return default
+
 
+def handle_map(schema, data, fail_fast=False):
+    """Validates keys of a dict with @keys (if any) and values with @values, errors are keyed by the keys."""
+    key_schema = schema.get('@keys')
+    value_schema = schema['@values']
+    error_details = {}
+    rc_data = {}
+    for key, subdata in data.items():
+        try:
+            rc_key = key if key_schema is None else _validate(key_schema, key, fail_fast)
+        except NotValidError as e:
+            error_details[key] = {'code': ValidationCode.BAD_KEY.value, 'details': e.jsonize()}
+        else:
+            try:
+                rc_data[rc_key] = _validate(value_schema, subdata, fail_fast)
+            except NotValidError as e:
+                error_details[key] = e.jsonize()
+        if error_details and fail_fast:
+            break
+    if error_details:
+        raise NotValidError(_StructureCode.DICT, error_details)
+    return rc_data
+
+
+def handle_oneof(schema, data, fail_fast=False):
+    """Validates data with the union branch picked by the discriminator, or with the first branch it is valid for."""
+    if '@discriminator' in schema:
+        return _validate(select_oneof_branch(schema, data), data, fail_fast)
+    errors = []
+    for branch in schema['@oneof']:
+        try:
+            return _validate(branch, data, fail_fast)
+        except NotValidError as e:
+            errors.append(e.jsonize())
+    raise NotValidError(ValidationCode.MANY_ERRORS, errors)
 
-def handle_list(schema, data):
+
+def select_oneof_branch(schema, data):
+    """Returns the branch schema of a discriminated union for a dict, bad discriminators are reported at the field."""
+    if not isinstance(data, dict):
+        raise NotValidError(ValidationCode.BAD_TYPE)
+    discriminator = schema['@discriminator']
+    if discriminator not in data:
+        raise NotValidError(_StructureCode.DICT, {discriminator: {'code': ValidationCode.MISSING.value}})
+    try:
+        return schema['@oneof'][data[discriminator]]
+    except (KeyError, TypeError):
+        raise NotValidError(_StructureCode.DICT, {discriminator: {'code': ValidationCode.NOT_IN.value}})
+
+
+def handle_list(schema, data, fail_fast=False):
     list_opts = {}
     if len(schema) == 2:
         list_opts = schema[1]  # must behave as dict
     item_schema = schema[0]
-    error_list = []
-    has_errors = False
-    result_data = []
     if data is NotHere:
         return handle_optional_and_default_when_data_nothere(list_opts)
+    vector = None
+    if not isinstance(data, list) or len(data) >= vectorized.MIN_LENGTH:
+        # Lists of numbers may be checked at once, see okschema.vectorized.
+        vector = vectorized.vector_check_schema(item_schema)
     if not isinstance(data, list):
-        raise NotValidError(ValidationCode.BAD_TYPE)
-    # TODO: handle list length opts
+        if vector is None or vectorized.buffer_type(data) != vector.type:
+            raise NotValidError(ValidationCode.BAD_TYPE)
+        verify_list_length(list_opts, data)
+        check_buffer(item_schema, vector, data, fail_fast)
+        result_data = data if list_opts.get('@ndarray') else data.tolist()
+    else:
+        verify_list_length(list_opts, data)
+        bad_indices = vector.bad_indices(data) if vector is not None else None
+        if bad_indices is not None:
+            result_data = handle_list_items_at(item_schema, data, bad_indices, fail_fast)
+        else:
+            result_data = handle_list_items(item_schema, data, fail_fast)
+    if list_opts.get('@ndarray'):
+        return vectorized.as_ndarray(result_data)
+    return result_data
+
+
+def verify_list_length(list_opts, data):
+    """Checks the length limits of a list, before any of its items is looked at."""
+    for optname, optval in list_opts.items():
+        if optname in LIST_LENGTH_OPTIONS:
+            verify_limit('int', optname[1:], optval, len(data))
+
+
+def handle_list_items(item_schema, data, fail_fast=False):
+    error_list = []
+    has_errors = False
+    result_data = []
     # TODO: handle list-level validators
     for data_item in data:
         try:
-            item_result_data = _validate(item_schema, data_item)
+            item_result_data = _validate(item_schema, data_item, fail_fast)
             result_data.append(item_result_data)
             error_list.append(None)
         except NotValidError as e:
             error_list.append(e.jsonize())
             has_errors = True
+            if fail_fast:
+                break
     if has_errors:
         # Errors in list items.
         raise NotValidError(_StructureCode.LIST, error_list)
     return result_data
 
 
+def handle_list_items_at(item_schema, data, indices, fail_fast=False):
+    """Validates a list whose items other than those at indices are known to be valid."""
+    errors = {}
+    for i in indices:
+        try:
+            _validate(item_schema, data[i], fail_fast)
+        except NotValidError as e:
+            errors[i] = e.jsonize()
+            if fail_fast:
+                break
+    if errors:
+        raise_list_errors(errors, max(errors) + 1 if fail_fast else len(data))
+    return list(data)
+
+
+def check_buffer(item_schema, vector, data, fail_fast=False):
+    """Checks an array of numbers of the item type, the items are checked without casting them."""
+    indices = vector.bad_indices(data)
+    if indices is None:
+        indices = range(len(data))
+    errors = {}
+    if isinstance(item_schema, dict):
+        for i in indices:
+            try:
+                verify_value_options(item_schema, vector.type, vectorized.item(data, i))
+            except NotValidError as e:
+                errors[i] = e.jsonize()
+                if fail_fast:
+                    break
+    if errors:
+        raise_list_errors(errors, max(errors) + 1 if fail_fast else len(data))
+
+
+def raise_list_errors(errors, length):
+    error_list = [None] * length
+    for i, error in errors.items():
+        error_list[i] = error
+    raise NotValidError(_StructureCode.LIST, error_list)
+
+
 def determine_field_type(schema):
     ftype = 'dict'
     if isinstance(schema, dict):
         try:
             ftype = schema['@t']
         except KeyError:
-            pass
+            if '@oneof' in schema:
+                ftype = 'oneof'
     elif isinstance(schema, str):
         ftype = schema.split(',')[0]
     return ftype
@@ -218,7 +412,7 @@ def determine_field_type(schema):
 
 def cast_data(ftype, data):
     """Cast data to given ftype or raise BAD_TYPE."""
-    if ftype == 'dict':
+    if ftype in ['dict', 'map']:
         if not isinstance(data, dict):
             raise NotValidError(ValidationCode.BAD_TYPE)
     elif ftype in ['string', 'str', 'decimal', 'float']:
@@ -234,11 +428,19 @@ def cast_data(ftype, data):
                 data = float(data)
             except (ValueError, TypeError):
                 raise NotValidError(ValidationCode.BAD_TYPE)
+    elif ftype == 'oneof':
+        pass  # checked by the branches
     elif ftype == 'bool':
         data = bool(data)
     elif ftype == 'int':
         if not isinstance(data, int):
             raise NotValidError(ValidationCode.BAD_TYPE)
+    elif ftype in ['date', 'datetime']:
+        if not isinstance(data, str):
+            raise NotValidError(ValidationCode.BAD_TYPE)
+        data = formats.parse_date(data) if ftype == 'date' else formats.parse_datetime(data)
+        if data is None:
+            raise NotValidError(ValidationCode.BAD_TYPE)
     else:
         raise SchemaError(ValidationCode.BAD_TYPE)
     return data
@@ -246,46 +448,69 @@ def cast_data(ftype, data):
 
 def verify_value_options(schema, ftype, data):
     """Checks if scalar data holds constraints specified in schema."""
+    verify_regexp_and_blank(schema, ftype, data)
+    for optname, optval in schema.items():
+        if optname == '@val':
+            data = call_validators(optval, data)
+        elif optname[0] == '@':
+            verify_limit(ftype, optname[1:], optval, data)
+    return data
+
+
+def verify_regexp_and_blank(schema, ftype, data):
+    """Checks done before other options."""
     if '@regexp' in schema:
-        regexp = schema['@regexp']
-        if not re.match(regexp, data):
+        regexp = compile_regexp(schema['@regexp'])
+        match = regexp.fullmatch if schema.get('@fullmatch') else regexp.match
+        if not match(data):
             raise NotValidError(ValidationCode.REGEXP)
+    if '@format' in schema:
+        try:
+            is_valid = formats.FORMATS[schema['@format']]
+        except (KeyError, TypeError):
+            raise SchemaError(SchemaCode.BAD_OPTION)
+        if not is_valid(data):
+            raise NotValidError(ValidationCode.BAD_FORMAT, schema['@format'])
 
     # Limits
     blank_string_allowed = get_bool_opt_from_schema(schema, "@blank")
     if ftype in ['str', 'string'] and not blank_string_allowed and not len(data):
         raise NotValidError(ValidationCode.NOT_GT, 0)
-    for optname, optval in schema.items():
-        if optname[0] == '@':
-            optname = optname[1:]
-            if optname == 'in':
-               if data not in optval:
-                    raise NotValidError(ValidationCode.NOT_IN)
-            elif optname in ['gt', 'gteq', 'lt', 'lteq', 'neq']:
-                if ftype not in ['int', 'float', 'decimal', 'string', 'str']:
-                    raise SchemaError(ValidationCode.ILLEGAL_COMPARISON)
-                if ftype in ['string', 'str']:
-                    xdata = len(data)  # Length validators check lists lengths
-                else:
-                    xdata = data
-                if optname == 'gt':
-                    if not xdata > optval:
-                        raise NotValidError(ValidationCode.NOT_GT, optval)
-                elif optname == 'gteq':
-                    if not xdata >= optval:
-                        raise NotValidError(ValidationCode.NOT_GTEQ, optval)
-                elif optname == 'lt':
-                    if not xdata < optval:
-                        raise NotValidError(ValidationCode.NOT_LT, optval)
-                elif optname == 'lteq':
-                    if not xdata <= optval:
-                        raise NotValidError(ValidationCode.NOT_LTEQ, optval)
-                elif optname == 'neq':
-                    if not xdata != optval:
-                        raise NotValidError(ValidationCode.NOT_EQ, optval)
-            elif optname == 'val':
-                data = call_validators(optval, data)
-    return data
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_regexp(regexp):
+    """Patterns are compiled once, independently of re's own small cache."""
+    return re.compile(regexp)
+
+
+def verify_limit(ftype, optname, optval, data):
+    """Checks a single @in or comparison option, other options are ignored."""
+    if optname == 'in':
+       if data not in optval:
+            raise NotValidError(ValidationCode.NOT_IN)
+    elif optname in ['gt', 'gteq', 'lt', 'lteq', 'neq']:
+        if ftype not in ['int', 'float', 'decimal', 'string', 'str']:
+            raise SchemaError(SchemaCode.ILLEGAL_COMPARISON)
+        if ftype in ['string', 'str']:
+            xdata = len(data)  # Length validators check lists lengths
+        else:
+            xdata = data
+        if optname == 'gt':
+            if not xdata > optval:
+                raise NotValidError(ValidationCode.NOT_GT, optval)
+        elif optname == 'gteq':
+            if not xdata >= optval:
+                raise NotValidError(ValidationCode.NOT_GTEQ, optval)
+        elif optname == 'lt':
+            if not xdata < optval:
+                raise NotValidError(ValidationCode.NOT_LT, optval)
+        elif optname == 'lteq':
+            if not xdata <= optval:
+                raise NotValidError(ValidationCode.NOT_LTEQ, optval)
+        elif optname == 'neq':
+            if not xdata != optval:
+                raise NotValidError(ValidationCode.NOT_EQ, optval)
 
 
 def get_bool_opt_from_schema(schema, opt):
@@ -320,7 +545,7 @@ def call_validators(validators, data):
                         error_collection.append(e)
                         continue
                 else:
-                    raise SchemaError(ValidationCode.VAL_NOT_CALLABLE)
+                    raise SchemaError(SchemaCode.VAL_NOT_CALLABLE)
         except NotValidError as e:
             error_collection.append(e)
 
@@ -331,5 +556,5 @@ def call_validators(validators, data):
                 jsonized_errors = [e.jsonize() for e in error_collection]
                 raise NotValidError(ValidationCode.MANY_ERRORS, jsonized_errors)
     else:
-        raise SchemaError(ValidationCode.VAL_NOT_CALLABLE)
+        raise SchemaError(SchemaCode.VAL_NOT_CALLABLE)
     return data
@@ -0,0 +1,140 @@
+"""
+Streaming validation of JSON arrays and NDJSON read from binary streams.
+
+Items are decoded one at a time from a buffer refilled from the stream, validated against the item schema
+the way a list schema validates its items, and yielded before the next item is read.
+Memory use is bounded by the size of a single item, not of the whole document.
+"""
+import codecs, json
+
+from .schema import ValidationError
+from .cache import compile_cached
+
+
+def iter_validate(schema_item, fileobj, format=None, fail_fast=False, chunk_size=65536):
+    """
+    Validates items of a JSON array or of NDJSON (one JSON value per line) read from a binary stream.
+    Yields (index, validated_item, None) for valid items and (index, None, ValidationError) for invalid ones.
+    :param schema_item: schema of a single item, like the first element of a list schema
+    :param fileobj: binary stream with UTF-8 encoded JSON
+    :param format: 'array' or 'ndjson', by default 'array' if the stream starts with '['.
+                   NDJSON streams of arrays need format='ndjson'.
+    :param fail_fast: stop after the first invalid item, also passed to the item validator
+    :raises: json.JSONDecodeError when the stream is not well formed
+    """
+    validator = compile_cached(schema_item)
+    reader = _Reader(fileobj, chunk_size)
+    if format is None:
+        format = 'array' if reader.next_char() == '[' else 'ndjson'
+    if format == 'array':
+        items = reader.array_items()
+    elif format == 'ndjson':
+        items = reader.lines()
+    else:
+        raise ValueError("unknown format: %r" % format)
+    for index, item in enumerate(items):
+        try:
+            yield index, validator.validate(item, fail_fast=fail_fast), None
+        except ValidationError as e:
+            yield index, None, e
+            if fail_fast:
+                return
+
+
+class _Reader:
+    """Text buffer over a binary stream, holding only the part that is not decoded yet."""
+
+    def __init__(self, fileobj, chunk_size):
+        self.fileobj, self.chunk_size = fileobj, chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Reads more of the stream, at least as much as is buffered so a long item is retried O(log n) times."""
+        chunk = self.fileobj.read(max(self.chunk_size, len(self.buf) - self.pos))
+        self.buf = self.buf[self.pos:] + self.decoder.decode(chunk, final=not chunk)
+        self.pos = 0
+        self.eof = not chunk
+
+    def next_char(self):
+        """Skips whitespace, returns the next character or '' at the end of the stream."""
+        while True:
+            buf = self.buf
+            pos = self.pos
+            while pos < len(buf) and buf[pos] in ' \t\n\r':
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if self.eof:
+                return ''
+            self.fill()
+
+    def value(self):
+        """Decodes the JSON value starting at the current position."""
+        self.next_char()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self.eof or not _truncated(e, len(self.buf)):
+                    raise  # bad JSON is reported at once, without reading the rest of the stream
+                self.fill()
+                continue
+            if end == len(self.buf) and not self.eof:
+                # A number may continue in the next chunk.
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+    def array_items(self):
+        self.expect('[')
+        if self.next_char() == ']':
+            self.pos += 1
+        else:
+            while True:
+                yield self.value()
+                char = self.next_char()
+                if char not in (',', ']'):
+                    self.error("Expecting ',' delimiter")
+                self.pos += 1
+                if char == ']':
+                    break
+        if self.next_char():
+            self.error('Extra data')
+
+    def lines(self):
+        while True:
+            newline = self.buf.find('\n', self.pos)
+            if newline == -1:
+                if not self.eof:
+                    self.fill()
+                    continue
+                newline = len(self.buf)
+            line = self.buf[self.pos:newline]
+            self.pos = newline + 1
+            if line.strip():
+                yield json.loads(line)
+            if newline == len(self.buf) and self.eof:
+                return
+
+    def expect(self, char):
+        if self.next_char() != char:
+            self.error('Expecting %r' % char)
+        self.pos += 1
+
+    def error(self, msg):
+        raise json.JSONDecodeError(msg, self.buf, self.pos)
+
+
+_decoder = json.JSONDecoder()
+
+
+def _truncated(e, length):
+    """True if a decoding error may be caused by the end of the buffered text rather than by bad JSON."""
+    # Cut literals, numbers and \\uXXXX escapes fail within a few characters of the end,
+    # strings cut before their closing quote fail at their start.
+    return e.pos >= length - 6 or e.msg.startswith('Unterminated string')
@@ -0,0 +1,137 @@
+"""
+Vectorized checks of lists of numbers.
+
+Items of lists like [{'@t': 'int', '@gteq': 0, '@lt': 1000}] that are checked only by their type, comparisons
+and @in are checked with a few NumPy operations over the whole list instead of one by one.
+Only the failing items go through the per-item error path, so errors are the same.
+
+Such list schemas also accept one-dimensional NumPy arrays, array.array and memoryview objects of numbers
+of the item type without copying them, and the '@ndarray' list option makes the result an ndarray.
+
+NumPy is optional. Without it lists are validated item by item as usual and arrays are checked item by item.
+"""
+import array, operator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+MIN_LENGTH = 1000  # shorter lists aren't worth converting to arrays
+
+_int_codes = 'bBhHiIlLqQnN'
+_float_codes = 'efd'
+_number_types = (int, float)
+
+_comparisons = {
+    'gt': operator.gt,
+    'gteq': operator.ge,
+    'lt': operator.lt,
+    'lteq': operator.le,
+    'neq': operator.ne,
+}
+
+
+def vector_check(spec):
+    """Returns the VectorCheck of list items described by the normalized schema, None if they can't be vectorized."""
+    if spec['type'] not in ['int', 'float']:
+        return None
+    for optname, optval in spec['checks']:
+        if optname == 'val':
+            return None
+        if optname == 'in':
+            try:
+                optval = list(optval)
+            except TypeError:
+                return None
+            if not all(type(value) in _number_types for value in optval):
+                return None
+        elif type(optval) not in _number_types:
+            return None
+    return VectorCheck(spec['type'], spec['checks'])
+
+
+def vector_check_schema(item_schema):
+    """Same as vector_check for a schema that is not normalized, None if it has problems."""
+    from .checker import normalize
+    from .schema import SchemaError
+    try:
+        return vector_check(normalize(item_schema))
+    except SchemaError:
+        return None
+
+
+def buffer_type(data):
+    """Returns 'int' or 'float' for one-dimensional arrays of numbers, None for anything else."""
+    if numpy is not None and isinstance(data, numpy.ndarray):
+        if data.ndim != 1:
+            return None
+        kind = data.dtype.kind
+        return 'int' if kind in 'iu' else 'float' if kind == 'f' else None
+    if isinstance(data, array.array):
+        code = data.typecode
+    elif isinstance(data, memoryview):
+        if data.ndim != 1:
+            return None
+        code = data.format.lstrip('@=<>!')
+    else:
+        return None
+    return 'int' if code in _int_codes else 'float' if code in _float_codes else None
+
+
+def item(data, i):
+    """Item of a list or an array as a Python number."""
+    value = data[i]
+    if numpy is not None and isinstance(value, numpy.generic):
+        return value.item()
+    return value
+
+
+def as_ndarray(data):
+    """Result of a list with the '@ndarray' option, arrays and memoryviews are not copied."""
+    return numpy.asarray(data)
+
+
+class VectorCheck:
+    """Comparisons and @in checks of list items, applied to whole arrays."""
+
+    __slots__ = ('type', 'checks')
+
+    def __init__(self, ftype, checks):
+        self.type = ftype
+        self.checks = [(optname, _numpy_values(optval) if optname == 'in' else optval) for optname, optval in checks]
+
+    def bad_indices(self, data):
+        """
+        Returns the list of indices of items failing the checks,
+        or None when NumPy is not available or data can't be checked at once.
+        Lists are converted to arrays, arrays and memoryviews are used without copying.
+        """
+        if numpy is None:
+            return None
+        try:
+            if isinstance(data, list):
+                if self.type != 'int':
+                    return None  # floats are parsed from strings item by item
+                values = numpy.array(data)
+                if values.ndim != 1 or values.dtype.kind not in 'iub':
+                    return None  # other types, ints too big for int64 or nested lists
+            else:
+                values = numpy.asarray(data)
+            bad = numpy.zeros(len(values), dtype=bool)
+            for optname, optval in self.checks:
+                if optname == 'in':
+                    bad |= ~numpy.isin(values, optval)
+                else:
+                    bad |= ~_comparisons[optname](values, optval)
+        except (TypeError, ValueError, OverflowError):
+            return None
+        return numpy.flatnonzero(bad).tolist()
+
+
+def _numpy_values(values):
+    values = list(values)
+    if numpy is None:
+        return values
+    return numpy.array(values)
@@ -15,8 +15,8 @@ setup(
     license = "BSD",
     url = "https://github.com/okcode-eu/okschema",
     packages=['okschema'],
-    install_requires=[
-        'pendulum',
-    ],
+    extras_require={
+        'pendulum': ['pendulum'],
+    },
     long_description=read('README.md'),
 )
@@ -1,6 +1,8 @@
-from okschema import NotValidError, NotValidButContinueError, ValidationCode, \
-    ValidationError, validate, val_date, val_datetime, NotHere, fmt_uuid
-import decimal
+from okschema import NotValidError, NotValidButContinueError, ValidationCode, SchemaCode, \
+    ValidationError, SchemaError, validate, val_date, val_datetime, NotHere, fmt_uuid
+import okschema
+from okschema import patch, vectorized
+import array, asyncio, concurrent.futures, copy, datetime, decimal, io, ipaddress, json, pickle, time, uuid
 import pendulum as dt
 import unittest
 
@@ -188,7 +190,7 @@ ok_tests = [
     (
         {'a': {'@t': 'str', '@val': val_datetime}},
         {'a': '2018-03-28T10:29:32.358Z'},
-        {'a': dt.datetime(2018, 3, 28, 10, 29, 32, 358)}
+        {'a': dt.datetime(2018, 3, 28, 10, 29, 32, 358000)}
     ),
     # Extra dict fields must be ignored
     (
@@ -396,12 +398,12 @@ bad_list_tests = [
         },
         {'a': {'code': ValidationCode.MISSING}}
     ),
-    # List length (not implemented)
-    # (
-    #     {'a': ['int', {'@gt': 2}]},
-    #     {'a': [1]},
-    #     {'a': {'code': ValidationCode.NOT_GT, 'details': 2}}
-    # )
+    # List length
+    (
+        {'a': ['int', {'@gt': 2}]},
+        {'a': [1]},
+        {'a': {'code': ValidationCode.NOT_GT, 'details': 2}}
+    ),
 ]
 
 
@@ -445,4 +447,1249 @@ class TestSchema(unittest.TestCase):
             raise
 
 
+def outcome(validate_fun, data):
+    """Result of a validation as a comparable value."""
+    try:
+        return 'ok', validate_fun(data)
+    except ValidationError as e:
+        return 'error', e.js
+
+
+class TestCompile(unittest.TestCase):
+
+    def test_same_as_validate(self):
+        for i, test in enumerate(ok_tests + bad_tests + bad_list_tests):
+            schema, data = test[0], test[1]
+            validator = okschema.compile(schema)
+            self.assertEqual(outcome(validator.validate, data), outcome(lambda d: validate(schema, d), data),
+                             "test %d: %s" % (i, test))
+
+    def test_reusable(self):
+        validator = okschema.compile({'a': {'@t': 'int', '@lt': 4}, 'b': ['str']})
+        self.assertEqual(validator.validate({'a': 1, 'b': ['x']}), {'a': 1, 'b': ['x']})
+        with self.assertRaises(ValidationError) as cm:
+            validator.validate({'a': 5, 'b': ['x', 1]})
+        self.assertEqual(cm.exception.js, {'a': {'code': ValidationCode.NOT_LT, 'details': 4},
+                                           'b': [None, {'code': ValidationCode.BAD_TYPE}]})
+        self.assertEqual(validator.validate({'a': 3, 'b': []}), {'a': 3, 'b': []})
+
+    def test_options_order(self):
+        # Options are checked in the order they appear in the schema.
+        schema = {'@t': 'int', '@val': lambda x: x * 10, '@lt': 40}
+        self.assertEqual(outcome(okschema.compile(schema).validate, 3), outcome(lambda d: validate(schema, d), 3))
+
+    def test_schema_errors(self):
+        for schema in [{'@t': 'bool', '@gt': 1}, {'@t': 'int', '@val': [lambda x: x, 12]}]:
+            with self.assertRaises(SchemaError):
+                validate(schema, 1)
+            with self.assertRaises(SchemaError):
+                okschema.compile(schema).validate(1)
+
+
+class TestCodegen(unittest.TestCase):
+
+    def test_same_as_validate(self):
+        for i, test in enumerate(ok_tests + bad_tests + bad_list_tests):
+            schema, data = test[0], test[1]
+            validator = okschema.compile(schema, backend='codegen')
+            self.assertEqual(outcome(validator.validate, data), outcome(lambda d: validate(schema, d), data),
+                             "test %d: %s" % (i, test))
+
+    def test_source(self):
+        validator = okschema.compile({'a': {'@t': 'int', '@in': [1, 2]}, 'b': ['str']}, backend='codegen')
+        self.assertIn('def validate(', validator.source)
+        self.assertNotIn('_validate', validator.source)
+        self.assertEqual(validator.validate({'a': 2, 'b': ['x']}), {'a': 2, 'b': ['x']})
+
+    def test_schema_errors(self):
+        for schema in [{'@t': 'bool', '@gt': 1}, {'@t': 'int', '@val': [lambda x: x, 12]}, {'@t': 'xxx'}]:
+            with self.assertRaises(SchemaError):
+                okschema.compile(schema, backend='codegen').validate(1)
+
+
+class TestChecker(unittest.TestCase):
+
+    def test_valid_schemas(self):
+        for i, test in enumerate(ok_tests + bad_tests + bad_list_tests):
+            self.assertEqual(okschema.check_schema(test[0]), [], "test %d: %s" % (i, test))
+
+    def test_all_problems_with_paths(self):
+        schema = {
+            'a': {'@t': 'xxx'},
+            'b': {'@t': 'bool', '@gt': 1},
+            'c': [{'@t': 'int', '@val': [lambda x: x, 12]}],
+            'd': {'@type': 'bool'},
+            'e': ['int', {'@optional': True, '@blank': True}],
+            'f': {'@t': 'str', '@regexp': '('},
+        }
+        self.assertEqual(okschema.check_schema(schema), [
+            {'path': ['a', '@t'], 'code': SchemaCode.UNKNOWN_TYPE, 'details': 'xxx'},
+            {'path': ['b', '@gt'], 'code': SchemaCode.ILLEGAL_COMPARISON},
+            {'path': ['c', 0, '@val', 1], 'code': SchemaCode.VAL_NOT_CALLABLE},
+            {'path': ['d', '@type'], 'code': SchemaCode.UNKNOWN_OPTION},
+            {'path': ['e', 1, '@blank'], 'code': SchemaCode.BAD_OPTION, 'details': 'not allowed for list'},
+            {'path': ['f', '@regexp'], 'code': SchemaCode.BAD_OPTION,
+             'details': 'missing ), unterminated subpattern at position 0'},
+        ])
+
+    def test_compile_raises(self):
+        with self.assertRaises(SchemaError) as cm:
+            okschema.compile({'a': 'int,@optional,@nul'})
+        self.assertEqual(cm.exception.args[0], [{'path': ['a'], 'code': SchemaCode.UNKNOWN_OPTION, 'details': '@nul'}])
+
+
+def schema_factory(limit):
+    return {
+        'email': {'@t': 'str', '@lteq': limit},
+        'n': {'@t': 'int', '@val': lambda x: x + 1},
+        'address': {'city': 'str', 'zip': {'@t': 'str', '@regexp': '[0-9]{2}-[0-9]{3}'}},
+    }
+
+
+class TestSchemaCache(unittest.TestCase):
+
+    def test_hits_and_misses(self):
+        cache = okschema.SchemaCache()
+        validator = cache.compile(schema_factory(10))
+        self.assertIs(cache.compile(schema_factory(10)), validator)
+        self.assertIsNot(cache.compile(schema_factory(20)), validator)
+        self.assertIsNot(cache.compile(schema_factory(10), backend='codegen'), validator)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 3)
+        data = {'email': 'a@b.c', 'n': 1, 'address': {'city': 'X', 'zip': '00-001'}}
+        self.assertEqual(validator.validate(data), validate(schema_factory(10), data))
+
+    def test_structural_keys(self):
+        cache = okschema.SchemaCache()
+        self.assertIsNot(cache.compile({'a': {'@t': 'int', '@in': [1]}}),
+                         cache.compile({'a': {'@t': 'int', '@in': [True]}}))
+        self.assertIsNot(cache.compile({'a': 'int', 'b': 'str'}), cache.compile({'b': 'str', 'a': 'int'}))
+        self.assertEqual(cache.stats()['hits'], 0)
+
+    def test_eviction(self):
+        cache = okschema.SchemaCache(maxsize=2)
+        for limit in [1, 2, 3, 1]:
+            cache.compile(schema_factory(limit))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['size']), (0, 4, 2, 2))
+
+    def test_interned_subschemas(self):
+        cache = okschema.SchemaCache()
+        first = cache.compile(schema_factory(10))
+        second = cache.compile(schema_factory(20))
+        self.assertIs(first._root.fields[2][1], second._root.fields[2][1])
+        self.assertIsNot(first._root.fields[0][1], second._root.fields[0][1])
+
+    def test_mutable_defaults(self):
+        cache = okschema.SchemaCache()
+        factory = lambda: {'tags': [{'@t': 'str'}, {'@optional': True, '@default': []}],
+                           'meta': {'@t': 'dict', '@optional': True, '@default': {'a': [1]}}}
+        for validate_fun in [cache.compile(factory()).validate, cache.compile(factory()).validate,
+                             cache.compile(factory(), backend='codegen').validate,
+                             cache.compile(factory(), backend='iterative').validate,
+                             lambda d, schema=factory(): validate(schema, d)]:
+            result = validate_fun({})
+            result['tags'].append('x')
+            result['meta']['a'].append(2)
+            self.assertEqual(validate_fun({}), {'tags': [], 'meta': {'a': [1]}})
+
+
+class TestFailFast(unittest.TestCase):
+
+    schema = {
+        'a': 'int',
+        'b': [{'x': {'@t': 'int', '@lt': 4}, 'y': 'str'}],
+        'c': 'str',
+    }
+    data = {'a': 1, 'b': [{'x': 1, 'y': 'a'}, {'x': 7, 'y': 1}, {'x': 9, 'y': 'b'}]}
+
+    def test_first_error_only(self):
+        expected = {'b': [None, {'x': {'code': ValidationCode.NOT_LT, 'details': 4}}]}
+        for validate_fun in [lambda d: validate(self.schema, d, fail_fast=True),
+                             lambda d: okschema.compile(self.schema).validate(d, fail_fast=True),
+                             lambda d: okschema.compile(self.schema, backend='codegen').validate(d, fail_fast=True)]:
+            self.assertEqual(outcome(validate_fun, self.data), ('error', expected))
+
+    def test_same_as_validate_when_valid(self):
+        for i, test in enumerate(ok_tests):
+            schema, data = test[0], test[1]
+            self.assertEqual(outcome(lambda d: validate(schema, d, fail_fast=True), data),
+                             outcome(lambda d: validate(schema, d), data), "test %d: %s" % (i, test))
+
+    def test_compiled_same_as_validate(self):
+        for i, test in enumerate(ok_tests + bad_tests + bad_list_tests):
+            schema, data = test[0], test[1]
+            self.assertEqual(outcome(lambda d: okschema.compile(schema).validate(d, fail_fast=True), data),
+                             outcome(lambda d: validate(schema, d, fail_fast=True), data), "test %d: %s" % (i, test))
+
+
+class TestIsValidAndInPlace(unittest.TestCase):
+
+    def test_is_valid(self):
+        for i, test in enumerate(ok_tests + bad_tests + bad_list_tests):
+            schema, data = test[0], test[1]
+            expected = outcome(lambda d: validate(schema, d), data)[0] == 'ok'
+            self.assertEqual(okschema.compile(schema).is_valid(data), expected, "test %d: %s" % (i, test))
+            self.assertEqual(okschema.is_valid(schema, data), expected, "test %d: %s" % (i, test))
+
+    def test_check(self):
+        validator = okschema.compile({'a': {'@t': 'int', '@lt': 4}, 'b': ['str']})
+        self.assertIsNone(validator.check({'a': 1, 'b': ['x']}))
+        with self.assertRaises(ValidationError) as cm:
+            validator.check({'a': 5, 'b': ['x', 1]})
+        self.assertEqual(cm.exception.js, {'a': {'code': ValidationCode.NOT_LT, 'details': 4},
+                                           'b': [None, {'code': ValidationCode.BAD_TYPE}]})
+
+    def test_in_place(self):
+        for i, test in enumerate(ok_tests + bad_tests + bad_list_tests):
+            schema, data = test[0], test[1]
+            expected = outcome(lambda d: validate(schema, d), copy.deepcopy(data))
+            self.assertEqual(outcome(lambda d: okschema.compile(schema).validate(d, in_place=True), copy.deepcopy(data)),
+                             expected, "test %d: %s" % (i, test))
+
+    def test_in_place_modifies_data(self):
+        schema = {'a': 'decimal', 'b': [{'c': 'float', 'd': {'@t': 'int', '@optional': True, '@default': 1}}]}
+        for backend in ['tree', 'codegen']:
+            data = {'a': '1.5', 'b': [{'c': '2.5', 'extra': 1}], 'extra': 2}
+            items = data['b']
+            result = okschema.compile(schema, backend=backend).validate(data, in_place=True)
+            self.assertIs(result, data)
+            self.assertIs(result['b'], items)
+            self.assertEqual(data, {'a': decimal.Decimal('1.5'), 'b': [{'c': 2.5, 'd': 1}]})
+
+
+class TestSparseErrors(unittest.TestCase):
+
+    def test_sparse_lists(self):
+        schema = {'a': [{'x': {'@t': 'int', '@lt': 4}}], 'b': 'str'}
+        data = {'a': [{'x': 1}] * 1000 + [{'x': 5}] + [{'x': 1}] * 1000, 'b': 1}
+        with self.assertRaises(ValidationError) as cm:
+            okschema.compile(schema).validate(data, sparse=True)
+        e = cm.exception
+        self.assertEqual(e.js, {'a': {1000: {'x': {'code': ValidationCode.NOT_LT, 'details': 4}}},
+                                'b': {'code': ValidationCode.BAD_TYPE}})
+        self.assertEqual(e.to_dense(), outcome(lambda d: validate(schema, d), data)[1])
+
+    def test_to_dense(self):
+        for i, test in enumerate(ok_tests + bad_tests + bad_list_tests):
+            schema, data = test[0], test[1]
+            expected = outcome(lambda d: validate(schema, d), data)
+            try:
+                result = 'ok', okschema.compile(schema).validate(data, sparse=True)
+            except ValidationError as e:
+                result = 'error', e.to_dense()
+            self.assertEqual(result, expected, "test %d: %s" % (i, test))
+
+    def test_fail_fast(self):
+        validator = okschema.compile(['int'])
+        with self.assertRaises(ValidationError) as cm:
+            validator.validate([1, 'x', 'y'], sparse=True, fail_fast=True)
+        self.assertEqual(cm.exception.js, {1: {'code': ValidationCode.BAD_TYPE}})
+        self.assertEqual(cm.exception.to_dense(), [None, {'code': ValidationCode.BAD_TYPE}])
+
+
+class TestErrorPath(unittest.TestCase):
+
+    def test_nested_errors(self):
+        schema = {'values': [{'@t': 'int', '@gteq': 0, '@val': [bad_val1_cont, bad_val2_cont]}], 'name': 'str'}
+        data = {'values': [1, -1, 'x'], 'name': 'leaf'}
+        for level in range(7):
+            schema = {'children': [schema], 'id': 'int'}
+            data = {'children': [data, None, data], 'id': level}
+        expected = outcome(lambda d: validate(schema, d), data)
+        self.assertEqual(expected[0], 'error')
+        self.assertEqual(outcome(okschema.compile(schema).validate, data), expected)
+        self.assertFalse(okschema.compile(schema).is_valid(data))
+
+
+class TestIterative(unittest.TestCase):
+
+    def test_same_as_validate(self):
+        for i, test in enumerate(ok_tests + bad_tests + bad_list_tests):
+            schema, data = test[0], test[1]
+            validator = okschema.compile(schema, backend='iterative')
+            for fail_fast in [False, True]:
+                self.assertEqual(outcome(lambda d: validator.validate(d, fail_fast=fail_fast), data),
+                                 outcome(lambda d: validate(schema, d, fail_fast=fail_fast), data),
+                                 "test %d: %s" % (i, test))
+            self.assertEqual(validator.is_valid(data), outcome(validator.validate, data)[0] == 'ok')
+
+    def test_signature(self):
+        validator = okschema.compile(['int'], backend='iterative')
+        self.assertEqual(validator.validate([1, 2], False, False, False, None, None, None), [1, 2])
+        self.assertRaises(ValueError, validator.validate, [1, 2], workers=2)
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            self.assertRaises(ValueError, validator.validate, [1, 2], executor=executor)
+
+    def test_in_place_and_sparse(self):
+        schema = {'a': [{'x': {'@t': 'decimal', '@lt': 4}}], 'b': 'str'}
+        data = {'a': [{'x': '1'}, {'x': '5'}, {'x': '2', 'extra': 1}], 'b': 'ok', 'c': 1}
+        with self.assertRaises(ValidationError) as cm:
+            okschema.compile(schema, backend='iterative').validate(copy.deepcopy(data), sparse=True)
+        self.assertEqual(cm.exception.js, {'a': {1: {'x': {'code': ValidationCode.NOT_LT, 'details': 4}}}})
+        data['a'][1]['x'] = '3'
+        result = okschema.compile(schema, backend='iterative').validate(data, in_place=True)
+        self.assertIs(result, data)
+        self.assertEqual(data, {'a': [{'x': decimal.Decimal(1)}, {'x': decimal.Decimal(3)}, {'x': decimal.Decimal(2)}],
+                                'b': 'ok'})
+
+    def test_max_depth(self):
+        schema, data = 'int', 1
+        for level in range(5):
+            schema, data = [schema], [data]
+        self.assertEqual(okschema.compile(schema, backend='iterative', max_depth=5).validate(data), data)
+        validator = okschema.compile(schema, backend='iterative', max_depth=3)
+        with self.assertRaises(ValidationError) as cm:
+            validator.validate(data)
+        self.assertEqual(cm.exception.js, [[[{'code': ValidationCode.TOO_DEEP, 'details': 3}]]])
+        self.assertFalse(validator.is_valid(data))
+
+
+class TestIterValidate(unittest.TestCase):
+
+    item_schema = {'id': 'int', 'price': {'@t': 'decimal', '@gt': 0}}
+
+    def items(self, stream, **kwargs):
+        return [(i, value, error and error.js) for i, value, error in
+                okschema.iter_validate(self.item_schema, io.BytesIO(stream), **kwargs)]
+
+    def test_array(self):
+        stream = b' [{"id": 1, "price": "1.5"}, {"id": "x", "price": "-1"} ,\n{"id": 3, "price": "2", "x": 1}] '
+        expected = [
+            (0, {'id': 1, 'price': decimal.Decimal('1.5')}, None),
+            (1, None, {'id': {'code': ValidationCode.BAD_TYPE}, 'price': {'code': ValidationCode.NOT_GT, 'details': 0}}),
+            (2, {'id': 3, 'price': decimal.Decimal(2)}, None),
+        ]
+        for chunk_size in [1, 2, 5, 1000]:
+            self.assertEqual(self.items(stream, chunk_size=chunk_size), expected)
+        self.assertEqual(self.items(stream, fail_fast=True), [expected[0], (1, None, {'id': {'code': ValidationCode.BAD_TYPE}})])
+        self.assertEqual(self.items(b'[]'), [])
+
+    def test_ndjson(self):
+        stream = b'{"id": 1, "price": "1"}\n\n{"id": 2}\r\n{"id": 3, "price": "3"}'
+        expected = [
+            (0, {'id': 1, 'price': decimal.Decimal(1)}, None),
+            (1, None, {'price': {'code': ValidationCode.MISSING}}),
+            (2, {'id': 3, 'price': decimal.Decimal(3)}, None),
+        ]
+        for chunk_size in [1, 3, 1000]:
+            self.assertEqual(self.items(stream, chunk_size=chunk_size), expected)
+        self.assertEqual([value for i, value, error in okschema.iter_validate(['int'], io.BytesIO(b'[1]\n[2]'),
+                                                                              format='ndjson')], [[1], [2]])
+
+    def test_malformed(self):
+        for stream in [b'[{"id": 1, "price": "1"} {}]', b'[{"id": 1, "price": "1"}', b'[1] 2', b'{"id": 1']:
+            with self.assertRaises(json.JSONDecodeError):
+                self.items(stream)
+
+    def test_malformed_not_buffered(self):
+        # Values cut by the end of a chunk are still read whole.
+        schema = {'a': 'bool', 'b': {'@t': 'int', '@null': True}, 'c': 'bool', 'd': 'int', 'e': 'str'}
+        stream = b'[{"a": true, "b": null, "c": false, "d": -1500, "e": "a\\u00e9\\n"}]'
+        for chunk_size in range(1, 8):
+            self.assertEqual(list(okschema.iter_validate(schema, io.BytesIO(stream), chunk_size=chunk_size)),
+                             [(0, {'a': True, 'b': None, 'c': False, 'd': -1500, 'e': 'aé\n'}, None)])
+        data = b','.join([b'{"id": 1, "price": "1"}'] * 10 ** 5)
+        stream = io.BytesIO(b'[{"id": 1, "price": "1"}, {"id" 2}, ' + data + b']')
+        items = okschema.iter_validate(self.item_schema, stream, chunk_size=1024)
+        next(items)
+        with self.assertRaises(json.JSONDecodeError):
+            next(items)
+        self.assertLessEqual(stream.tell(), 1024)
+
+    def test_reads_incrementally(self):
+        stream = io.BytesIO(b'[' + b','.join([b'{"id": 1, "price": "1"}'] * 10000) + b']')
+        items = okschema.iter_validate(self.item_schema, stream, chunk_size=1024)
+        next(items)
+        self.assertLess(stream.tell(), 2048)
+        self.assertEqual(sum(1 for item in items), 9999)
+
+
+class TestAsync(unittest.TestCase):
+
+    def test_same_as_validate(self):
+        for i, test in enumerate(ok_tests + bad_tests + bad_list_tests):
+            schema, data = test[0], test[1]
+            self.assertEqual(outcome(lambda d: asyncio.run(okschema.avalidate(schema, d)), data),
+                             outcome(lambda d: validate(schema, d), data), "test %d: %s" % (i, test))
+
+    def test_concurrent_fields(self):
+        running = []
+        peak = []
+
+        async def exists(x):
+            running.append(x)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(x)
+            if x > 10:
+                raise NotValidError(ValidationCode.NOT_FOUND)
+            return x
+
+        schema = {'f%d' % i: {'@t': 'int', '@val': exists} for i in range(20)}
+        schema['items'] = [{'@t': 'int', '@val': exists}]
+        data = dict({'f%d' % i: i for i in range(20)}, items=[1, 20])
+        with self.assertRaises(ValidationError) as cm:
+            asyncio.run(okschema.avalidate(schema, data))
+        expected = {'f%d' % i: {'code': ValidationCode.NOT_FOUND} for i in range(11, 20)}
+        expected['items'] = [None, {'code': ValidationCode.NOT_FOUND}]
+        self.assertEqual(cm.exception.js, expected)
+        self.assertEqual(max(peak), 22)
+        peak.clear()
+        with self.assertRaises(ValidationError):
+            asyncio.run(okschema.avalidate(schema, data, limit=4))
+        self.assertEqual(max(peak), 4)
+
+    def test_continue_errors(self):
+        async def async_bad_cont(x):
+            raise NotValidButContinueError(ValidationCode.DUPLICATE_VALUE)
+
+        async def add_one(x):
+            return x + 1
+
+        schema = {'a': {'@t': 'int', '@val': [add_one, async_bad_cont, bad_val2_cont, add_one, val_err]},
+                  'b': {'@t': 'int', '@val': [add_one, add_one], '@lt': 5}, '@val': dict_lteq_12}
+        with self.assertRaises(ValidationError) as cm:
+            asyncio.run(okschema.avalidate(schema, {'a': 1, 'b': 2}))
+        self.assertEqual(cm.exception.js, {'a': {'code': ValidationCode.MANY_ERRORS, 'details': [
+            {'code': ValidationCode.DUPLICATE_VALUE},
+            {'code': ValidationCode.BAD_VALUE, 'details': 5},
+            {'code': ValidationCode.BAD_VALUE},
+        ]}})
+        schema['a']['@val'] = add_one
+        self.assertEqual(asyncio.run(okschema.avalidate(schema, {'a': 1, 'b': 2})), {'a': 2, 'b': 4, 'sum': 6})
+
+
+def price_not_13(x):
+    if x == 13:
+        raise NotValidError(ValidationCode.BAD_VALUE)
+    return x
+
+
+class TestParallel(unittest.TestCase):
+
+    schema = {'rows': [{'id': 'int', 'price': {'@t': 'decimal', '@gteq': 0, '@val': price_not_13}}], 'name': 'str'}
+
+    def data(self, bad=()):
+        rows = [{'id': i, 'price': str(i % 10)} for i in range(25000)]
+        for i in bad:
+            rows[i] = {'id': 'x', 'price': '13'}
+        return {'rows': rows, 'name': 'import'}
+
+    def test_same_as_serial(self):
+        with concurrent.futures.ThreadPoolExecutor(2) as threads:
+            for bad in [(), (5, 2500, 24999)]:
+                for fail_fast in [False, True]:
+                    data = self.data(bad)
+                    expected = outcome(lambda d: validate(self.schema, d, fail_fast=fail_fast), data)
+                    self.assertEqual(outcome(lambda d: validate(self.schema, d, fail_fast=fail_fast, workers=2), data),
+                                     expected)
+                    self.assertEqual(outcome(lambda d: validate(self.schema, d, fail_fast=fail_fast,
+                                                                executor=threads), data), expected)
+
+    def test_sparse_and_in_place(self):
+        validator = okschema.compile(self.schema)
+        with concurrent.futures.ThreadPoolExecutor(2) as threads:
+            with self.assertRaises(ValidationError) as cm:
+                validator.validate(self.data([3, 20000]), sparse=True, executor=threads)
+            self.assertEqual(set(cm.exception.js['rows']), {3, 20000})
+            data = self.data()
+            self.assertIs(validator.validate(data, in_place=True, executor=threads), data)
+            self.assertEqual(data['rows'][12345], {'id': 12345, 'price': decimal.Decimal(5)})
+
+
+class TestVectorized(unittest.TestCase):
+
+    schema = [{'@t': 'int', '@gteq': 0, '@lt': 1000, '@in': range(0, 1000, 2)}]
+
+    def validators(self, schema):
+        return [
+            lambda d: validate(schema, d),
+            okschema.compile(schema).validate,
+            okschema.compile(schema, backend='codegen').validate,
+            okschema.compile(schema, backend='iterative').validate,
+        ]
+
+    def item_by_item(self, schema, data):
+        min_length, vectorized.MIN_LENGTH = vectorized.MIN_LENGTH, len(data) + 1
+        try:
+            return outcome(lambda d: validate(schema, d), data)
+        finally:
+            vectorized.MIN_LENGTH = min_length
+
+    def test_large_lists(self):
+        data = [i % 1000 for i in range(0, 20000, 2)]
+        bad = list(data)
+        bad[3], bad[500], bad[9999] = -2, 1001, 3
+        mixed = list(data)
+        mixed[7] = 'x'
+        for validate_fun in self.validators(self.schema):
+            self.assertEqual(validate_fun(data), data)
+            for d in [bad, mixed]:
+                self.assertEqual(outcome(validate_fun, d), self.item_by_item(self.schema, d))
+        with self.assertRaises(ValidationError) as cm:
+            validate(self.schema, bad)
+        self.assertEqual({i: e for i, e in enumerate(cm.exception.js) if e is not None}, {
+            3: {'code': ValidationCode.NOT_GTEQ, 'details': 0},
+            500: {'code': ValidationCode.NOT_LT, 'details': 1000},
+            9999: {'code': ValidationCode.NOT_IN}})
+        self.assertEqual(outcome(lambda d: validate(self.schema, d, fail_fast=True), bad),
+                         outcome(lambda d: okschema.compile(self.schema).validate(d, fail_fast=True), bad))
+        self.assertFalse(okschema.compile(self.schema).is_valid(bad))
+        self.assertTrue(okschema.compile(self.schema).is_valid(data))
+
+    def test_buffers(self):
+        schema = [{'@t': 'float', '@gt': 0}]
+        for data in [array.array('d', [1.5, 2.0, 3.25]), memoryview(array.array('d', [1.5, 2.0, 3.25]))]:
+            for validate_fun in self.validators(schema):
+                self.assertEqual(validate_fun(data), [1.5, 2.0, 3.25])
+        bad = array.array('d', [1.5, -2.0, 3.25])
+        for validate_fun in self.validators(schema):
+            self.assertEqual(outcome(validate_fun, bad), ('error', [None, {'code': ValidationCode.NOT_GT, 'details': 0}, None]))
+            self.assertEqual(outcome(validate_fun, array.array('i', [1])), ('error', {'code': ValidationCode.BAD_TYPE}))
+            self.assertEqual(outcome(validate_fun, array.array('d', [1.5])), ('ok', [1.5]))
+        for validate_fun in self.validators(['str']):
+            self.assertEqual(outcome(validate_fun, array.array('d', [1.5])), ('error', {'code': ValidationCode.BAD_TYPE}))
+
+    @unittest.skipIf(vectorized.numpy is None, "needs numpy")
+    def test_ndarray(self):
+        numpy = vectorized.numpy
+        data = numpy.arange(0, 1000, 2)
+        schema = [self.schema[0], {'@ndarray': True}]
+        for validate_fun in self.validators(schema):
+            result = validate_fun(data)
+            self.assertIsInstance(result, numpy.ndarray)
+            self.assertTrue(numpy.shares_memory(result, data))
+            self.assertEqual(validate_fun(list(range(0, 20, 2))).tolist(), list(range(0, 20, 2)))
+        for validate_fun in self.validators(self.schema):
+            self.assertEqual(validate_fun(data), data.tolist())
+            data[3] = 1001
+            self.assertEqual(outcome(validate_fun, data)[1][3], {'code': ValidationCode.NOT_LT, 'details': 1000})
+            data[3] = 6
+
+    @unittest.skipIf(vectorized.numpy is not None, "numpy is installed")
+    def test_ndarray_needs_numpy(self):
+        self.assertEqual(okschema.check_schema([{'@t': 'int'}, {'@ndarray': True}]),
+                         [{'path': [1, '@ndarray'], 'code': SchemaCode.BAD_OPTION, 'details': 'needs numpy'}])
+
+
+class TestValidateBatch(unittest.TestCase):
+
+    def test_same_as_list_validation(self):
+        for i, test in enumerate(ok_tests + bad_tests + bad_list_tests):
+            schema, data = test[0], test[1]
+            records = [data, copy.deepcopy(data), None, 12]
+            self.assertEqual(outcome(lambda d: okschema.validate_batch(schema, d), records),
+                             outcome(lambda d: validate([schema], d), records), "test %d: %s" % (i, test))
+
+    def test_columns(self):
+        schema = {
+            'id': {'@t': 'int', '@gteq': 0},
+            'name': {'@t': 'str', '@lteq': 5, '@regexp': '[a-z]'},
+            'price': {'@t': 'decimal', '@val': [bad_val1_cont, bad_val2_cont], '@optional': True},
+            'lang': {'@t': 'str', '@in': ['en', 'pl'], '@null': True, '@optional': True, '@default': 'en'},
+            'tags': ['str'],
+            'a': {'@t': 'int', '@optional': True}, 'b': {'@t': 'int', '@optional': True},
+            '@val': dict_lteq_12,
+        }
+        records = [
+            {'id': 1, 'name': 'abc', 'tags': [], 'a': 1, 'b': 2},
+            {'id': -1, 'name': 'ABC', 'price': 'x', 'lang': 'de', 'tags': ['x', 1], 'a': 1, 'b': 2},
+            {'id': 'x', 'name': 'abcdefg', 'price': '1', 'lang': None, 'tags': None, 'a': 1, 'b': 2},
+            {'name': '', 'tags': ['a'], 'a': 10, 'b': 10},
+            {'id': 2, 'name': 'x', 'tags': ['a'], 'a': 10, 'b': 10},
+            [],
+        ]
+        self.assertEqual(outcome(lambda d: okschema.validate_batch(schema, d), records),
+                         outcome(lambda d: validate([schema], d), records))
+        self.assertEqual(okschema.validate_batch(schema, [records[0]]), validate([schema], [records[0]]))
+
+
+class TestFormats(unittest.TestCase):
+
+    valid = {
+        'uuid': ['dbc8911c-92e8-4cdb-85b8-47a7a6a82db1', 'DBC8911C-92E8-4CDB-85B8-47A7A6A82DB1'],
+        'lang': ['en', 'PL', 'ast'],
+        'email': ['abc@example.com', 'a.b+c@mail.example.co.uk'],
+        'ipv4': ['127.0.0.1', '255.255.255.255', '0.0.0.0'],
+        'ipv6': ['::', '::1', '2001:db8::8a2e:370:7334', '::ffff:192.0.2.1', '1:2:3:4:5:6:7:8'],
+        'date': ['2024-02-29', '1999-12-31'],
+        'datetime': ['2024-02-29T12:30', '2024-02-29T12:30:59.123456', '2024-02-29T12:30:59+02:00'],
+    }
+    invalid = {
+        'uuid': ['dbc8911c-92e8-4cdb-85b8-47a7a6a82db1x', 'dbc8911c-92e8-4cdb-85b8+47a7a6a82db1', 'gbc8911c-92e8-4cdb-85b8-47a7a6a82db1', ''],
+        'lang': ['', 'engl', 'e1', 'ąę'],
+        'email': ['abc', 'abc@', '@example.com', 'a b@example.com', 'abc@example', 'abc@-example.com', 'a@b@c.com'],
+        'ipv4': ['1.2.3', '1.2.3.256', '01.2.3.4', '1.2.3.4.5', '1.2.3.a', '١.2.3.4'],
+        'ipv6': ['1.2.3.4', '::g', '1:2:3:4:5:6:7:8:9', 'fe80::1%eth0', '1::2::3', ':1.2.3.4', '12345::'],
+        'date': ['2024-02-30', '20240101', '2024-1-01', '2024-01-01T00:00'],
+        'datetime': ['2024-02-29', '2024-02-29 12:30', '2024-02-29T25:30', '2024-02-29T1230'],
+    }
+
+    def test_formats(self):
+        for name, is_valid in okschema.formats.FORMATS.items():
+            for value in self.valid[name]:
+                self.assertTrue(is_valid(value), (name, value))
+            for value in self.invalid[name]:
+                self.assertFalse(is_valid(value), (name, value))
+
+    def test_ipv6_like_ipaddress(self):
+        values = ['::1.2.3.4', '1::1.2.3.4', '1:2::1.2.3.4', '1:2:3::1.2.3.4', '1:2:3:4::1.2.3.4', '1:2:3:4:5::1.2.3.4',
+                  '1:2:3:4:5:6::1.2.3.4', '::2:3:4:5:6:1.2.3.4', '1:2:3:4:5:6:1.2.3.4', '1:2:3:4:5:6:7:1.2.3.4',
+                  '1::6:1.2.3.4', '::', '1::', '::8', '1:2:3:4:5:6:7::', '::2:3:4:5:6:7:8', '1:2:3:4:5:6:7:8::',
+                  ':::1.2.3.4', '1:::1.2.3.4', '1::2::1.2.3.4', '::1.2.3', '::1.2.3.256', 'ffff::ffff:10.0.0.1']
+        schema = {'@t': 'str', '@format': 'ipv6'}
+        for value in values:
+            try:
+                ipaddress.IPv6Address(value)
+                expected = ('ok', value)
+            except ValueError:
+                expected = ('error', {'code': ValidationCode.BAD_FORMAT, 'details': 'ipv6'})
+            for validate_fun in [lambda d: validate(schema, d), okschema.compile(schema).validate,
+                                 okschema.compile(schema, backend='codegen').validate]:
+                self.assertEqual(outcome(validate_fun, value), expected, value)
+
+    def test_format_option(self):
+        schema = {'id': {'@t': 'str', '@format': 'uuid'}, 'ip': {'@t': 'str', '@format': 'ipv4', '@optional': True}}
+        data = {'id': 'dbc8911c-92e8-4cdb-85b8-47a7a6a82db1junk', 'ip': '10.0.0.1'}
+        expected = ('error', {'id': {'code': ValidationCode.BAD_FORMAT, 'details': 'uuid'}})
+        for validate_fun in [lambda d: validate(schema, d), okschema.compile(schema).validate,
+                             okschema.compile(schema, backend='codegen').validate]:
+            self.assertEqual(outcome(validate_fun, data), expected)
+            self.assertEqual(outcome(validate_fun, dict(data, id=data['id'][:36])), ('ok', dict(data, id=data['id'][:36])))
+        self.assertEqual(outcome(lambda d: okschema.validate_batch(schema, d), [data]), ('error', [expected[1]]))
+
+    def test_fullmatch(self):
+        schema = {'id': {'@t': 'str', '@regexp': fmt_uuid, '@fullmatch': True}}
+        for validate_fun in [lambda d: validate(schema, d), okschema.compile(schema).validate,
+                             okschema.compile(schema, backend='codegen').validate]:
+            self.assertEqual(outcome(validate_fun, {'id': 'dbc8911c-92e8-4cdb-85b8-47a7a6a82db1x'}),
+                             ('error', {'id': {'code': ValidationCode.REGEXP}}))
+        self.assertEqual(validate({'id': {'@t': 'str', '@regexp': fmt_uuid}}, {'id': 'dbc8911c-92e8-4cdb-85b8-47a7a6a82db1x'}),
+                         {'id': 'dbc8911c-92e8-4cdb-85b8-47a7a6a82db1x'})
+
+    def test_checked(self):
+        self.assertEqual(okschema.check_schema({'a': {'@t': 'int', '@format': 'uuid'}, 'b': {'@t': 'str', '@format': 'x'},
+                                                'c': {'@t': 'str', '@fullmatch': True}}), [
+            {'path': ['a', '@format'], 'code': SchemaCode.BAD_OPTION, 'details': 'format needs a string type'},
+            {'path': ['b', '@format'], 'code': SchemaCode.BAD_OPTION, 'details': 'unknown format'},
+            {'path': ['c', '@fullmatch'], 'code': SchemaCode.BAD_OPTION, 'details': 'fullmatch needs a regexp'},
+        ])
+
+
+class TestDates(unittest.TestCase):
+
+    schema = {'day': 'date', 'at': {'@t': 'datetime', '@optional': True}, 'due': {'@t': 'date', '@pendulum': True},
+              'sent': 'datetime,@pendulum'}
+    data = {'day': '2024-02-29', 'at': '2024-02-29T12:30:59.5Z', 'due': '2024-03-01', 'sent': '2024-03-01T08:00'}
+
+    def validators(self):
+        return [lambda d: validate(self.schema, d), okschema.compile(self.schema).validate,
+                okschema.compile(self.schema, backend='codegen').validate,
+                okschema.compile(self.schema, backend='iterative').validate,
+                lambda d: asyncio.run(okschema.avalidate(self.schema, d))]
+
+    def test_types(self):
+        utc = datetime.timezone.utc
+        for validate_fun in self.validators():
+            result = validate_fun(self.data)
+            self.assertEqual(result, {'day': datetime.date(2024, 2, 29),
+                                      'at': datetime.datetime(2024, 2, 29, 12, 30, 59, 500000, tzinfo=utc),
+                                      'due': dt.date(2024, 3, 1), 'sent': dt.datetime(2024, 3, 1, 8)})
+            self.assertIs(type(result['day']), datetime.date)
+            self.assertIs(type(result['at']), datetime.datetime)
+            self.assertIsInstance(result['due'], dt.Date)
+            self.assertIsInstance(result['sent'], dt.DateTime)
+        self.assertEqual(okschema.validate_batch(self.schema, [self.data]), [validate(self.schema, self.data)])
+
+    def test_bad(self):
+        data = {'day': '2024-02-30', 'at': 20240229, 'due': '2024-03-01T00:00', 'sent': '2024-03-01'}
+        bad_type = {'code': ValidationCode.BAD_TYPE}
+        for validate_fun in self.validators():
+            self.assertEqual(outcome(validate_fun, data),
+                             ('error', {'day': bad_type, 'at': bad_type, 'due': bad_type, 'sent': bad_type}))
+
+    def test_val_date(self):
+        self.assertEqual(val_date('2018-03-12'), dt.datetime(2018, 3, 12))
+        self.assertEqual(val_datetime('2018-03-28T10:29:32+02:00'), dt.datetime(2018, 3, 28, 8, 29, 32))
+        with self.assertRaises(NotValidError):
+            val_datetime('2018-03-28 10:29:32')
+
+    def test_checked(self):
+        self.assertEqual(okschema.check_schema({'a': {'@t': 'str', '@pendulum': True}, 'b': 'int,@pendulum'}), [
+            {'path': ['a', '@pendulum'], 'code': SchemaCode.BAD_OPTION, 'details': 'pendulum needs a date type'},
+            {'path': ['b'], 'code': SchemaCode.BAD_OPTION, 'details': 'pendulum needs a date type'},
+        ])
+
+
+class TestCached(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def normalize(self, value):
+        self.calls.append(value)
+        if value.startswith('-'):
+            raise NotValidError(ValidationCode.OUT_OF_BOUNDS, value)
+        return value.upper()
+
+    def test_cached(self):
+        val = okschema.cached(self.normalize, maxsize=2)
+        schema = [{'@t': 'str', '@val': val}]
+        data = ['a', 'b', 'a', '-x', 'b', '-x']
+        expected = ('error', [None, None, None, {'code': ValidationCode.OUT_OF_BOUNDS, 'details': '-x'}, None,
+                              {'code': ValidationCode.OUT_OF_BOUNDS, 'details': '-x'}])
+        self.assertEqual(outcome(lambda d: validate(schema, d), data), expected)
+        self.assertEqual(self.calls, ['a', 'b', '-x', 'b'])  # 'b' was evicted by '-x'
+        self.assertEqual(val.stats(), {'hits': 2, 'misses': 4, 'evictions': 2, 'expirations': 0,
+                                       'size': 2, 'maxsize': 2})
+        val.clear()
+        self.assertEqual(val.stats()['size'], 0)
+
+        del self.calls[:]
+        schema = [{'@t': 'str', '@val': okschema.cached(self.normalize)}]
+        for validate_fun in [lambda d: validate(schema, d), okschema.compile(schema).validate,
+                             okschema.compile(schema, backend='codegen').validate]:
+            self.assertEqual(outcome(validate_fun, data), expected)
+        self.assertEqual(self.calls, ['a', 'b', '-x'])
+
+    def test_continue_errors(self):
+        def val_err_cont(value):
+            self.calls.append(value)
+            raise NotValidButContinueError(ValidationCode.OUT_OF_BOUNDS)
+        schema = {'a': {'@t': 'str', '@val': [okschema.cached(val_err_cont), val_err]}}
+        expected = ('error', {'a': {'code': ValidationCode.MANY_ERRORS, 'details': [
+            {'code': ValidationCode.OUT_OF_BOUNDS}, {'code': ValidationCode.BAD_VALUE}]}})
+        for i in range(2):
+            self.assertEqual(outcome(lambda d: validate(schema, d), {'a': 'x'}), expected)
+        self.assertEqual(self.calls, ['x'])
+
+    def test_ttl(self):
+        val = okschema.cached(self.normalize, ttl=0.05)
+        self.assertEqual([val('a'), val('a')], ['A', 'A'])
+        time.sleep(0.06)
+        self.assertEqual(val('a'), 'A')
+        self.assertEqual(self.calls, ['a', 'a'])
+        self.assertEqual(val.stats()['expirations'], 1)
+
+    def test_keys(self):
+        val = okschema.cached(lambda value: self.calls.append(value) or value)
+        for value in [decimal.Decimal('1.0'), decimal.Decimal('1.00'), 1, 1.0, {'a': [1]}, {'a': [1]}, {'a': [2]},
+                      {1, 2}]:
+            val(value)
+        self.assertEqual(self.calls, [decimal.Decimal('1.0'), decimal.Decimal('1.00'), 1, 1.0, {'a': [1]},
+                                      {'a': [2]}, {1, 2}])
+
+    def test_async(self):
+        async def lookup(value):
+            self.calls.append(value)
+            return value * 2
+        val = okschema.cached(lookup)
+        self.assertEqual(asyncio.run(okschema.avalidate([{'@t': 'int', '@val': val}], [1, 2, 1, 1])), [2, 4, 2, 2])
+        self.assertEqual(sorted(self.calls), [1, 2])
+
+    def test_threads(self):
+        val = okschema.cached(self.normalize, maxsize=10)
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(val, [str(i % 20) for i in range(2000)]))
+        self.assertEqual(results, [str(i % 20) for i in range(2000)])
+        stats = val.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 2000)
+        self.assertEqual(stats['size'], 10)
+
+    def test_pickle(self):
+        val = okschema.cached(str.upper, maxsize=5)
+        val('a')
+        copied = pickle.loads(pickle.dumps(val))
+        self.assertEqual((copied.maxsize, copied.stats()['size'], copied('b')), (5, 0, 'B'))
+
+
+class TestPure(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        address = {'street': 'str', 'zip': {'@t': 'str', '@val': self.zip_code}, '@pure': True}
+        self.schema = [{'id': 'int', 'address': address, 'tags': [{'@t': 'str'}, {'@pure': True, '@optional': True}]}]
+
+    def zip_code(self, value):
+        self.calls.append(value)
+        if not value.isdigit():
+            raise NotValidError(ValidationCode.BAD_VALUE, value)
+        return int(value)
+
+    def test_pure(self):
+        data = [{'id': i, 'address': {'street': 'Main', 'zip': ['12345', 'x1'][i % 2], 'extra': i}, 'tags': ['a']}
+                for i in range(6)]
+        error = {'address': {'zip': {'code': ValidationCode.BAD_VALUE, 'details': 'x1'}}}
+        expected = ('error', [None, error] * 3)
+        validator = okschema.compile(self.schema)
+        self.assertEqual(outcome(validator.validate, data), expected)
+        self.assertEqual(self.calls, ['12345', 'x1'])  # extra fields are left out of keys
+        self.assertEqual(outcome(lambda d: validate(self.schema, d), data), expected)
+        self.assertEqual(len(self.calls), 8)
+        for backend in ['codegen', 'iterative']:
+            self.assertEqual(outcome(okschema.compile(self.schema, backend=backend).validate, data), expected)
+        with self.assertRaises(ValidationError) as cm:
+            validator.validate(data, sparse=True)
+        self.assertEqual(cm.exception.to_dense(), expected[1])
+        self.assertEqual(outcome(lambda d: validator.validate(d, fail_fast=True), data), ('error', [None, error]))
+
+        data = [dict(item, address={'street': 'Main', 'zip': '12345'}) for item in data]
+        result = validator.validate(data)
+        self.assertEqual(result[0], {'id': 0, 'address': {'street': 'Main', 'zip': 12345}, 'tags': ['a']})
+        self.assertIs(result[0]['address'], result[5]['address'])
+        self.assertIs(result[0]['tags'], result[5]['tags'])
+        self.assertEqual(okschema.validate_batch(self.schema[0], data), result)
+
+    def test_keys(self):
+        schema = [{'a': {'@t': 'decimal', '@val': lambda value: self.calls.append(value) or value}, '@pure': True}]
+        self.assertEqual(okschema.compile(schema).validate([{'a': '1.0'}, {'a': '1.00'}, {'a': '1.0'}]),
+                         [{'a': decimal.Decimal('1.0')}, {'a': decimal.Decimal('1.00')}, {'a': decimal.Decimal('1.0')}])
+        self.assertEqual([str(value) for value in self.calls], ['1.0', '1.00'])
+
+    def test_checked(self):
+        self.assertEqual(okschema.check_schema({'a': {'b': {'@t': 'int', '@optional': True, '@default': list},
+                                                      '@pure': True, '@optional': True, '@default': dict}}), [
+            {'path': ['a', '@pure'], 'code': SchemaCode.BAD_OPTION, 'details': 'pure schema with a callable default'},
+        ])
+
+
+def add_total(order):
+    order['total'] = sum(line['price'] for line in order['lines'])
+    return order
+
+
+class TestRevalidate(unittest.TestCase):
+
+    schema = {
+        'name': 'str',
+        'note': {'@t': 'str', '@optional': True},
+        'lines': [{'sku': 'str', 'price': {'@t': 'decimal', '@gt': 0}, 'tags': [{'@t': 'str'}, {'@optional': True}]}],
+        '@val': add_total,
+    }
+    data = {'name': 'a', 'lines': [{'sku': 'x', 'price': '1.5'}, {'sku': 'y', 'price': '2', 'tags': ['new']}]}
+
+    def test_revalidate(self):
+        patches = [
+            ([{'op': 'replace', 'path': '/lines/1/price', 'value': '3'}],
+             {'name': 'a', 'lines': [{'sku': 'x', 'price': '1.5'}, {'sku': 'y', 'price': '3', 'tags': ['new']}]}),
+            ([{'op': 'add', 'path': '/lines/-', 'value': {'sku': 'z', 'price': '1'}},
+              {'op': 'add', 'path': '/lines/2/tags', 'value': []}, {'op': 'add', 'path': '/lines/2/tags/0', 'value': 'a'},
+              {'op': 'add', 'path': '/note', 'value': 'hi'}],
+             {'name': 'a', 'note': 'hi', 'lines': [{'sku': 'x', 'price': '1.5'}, {'sku': 'y', 'price': '2', 'tags': ['new']},
+                                                   {'sku': 'z', 'price': '1', 'tags': ['a']}]}),
+            ([{'op': 'remove', 'path': '/lines/0'}, {'op': 'add', 'path': '/lines/0/tags/0', 'value': 'old'}],
+             {'name': 'a', 'lines': [{'sku': 'y', 'price': '2', 'tags': ['old', 'new']}]}),
+            ({'/lines/0/price': '-1', '/name': NotHere, '/lines/1/tags/0': 5},
+             {'lines': [{'sku': 'x', 'price': '-1'}, {'sku': 'y', 'price': '2', 'tags': [5]}]}),
+            ({'': {'name': 'b', 'lines': []}}, {'name': 'b', 'lines': []}),
+        ]
+        for backend in ['tree', 'codegen', 'iterative']:
+            validator = okschema.compile(self.schema, backend=backend)
+            previous = validator.validate(copy.deepcopy(self.data))
+            saved = copy.deepcopy(previous)
+            for changes, patched in patches:
+                self.assertEqual(outcome(lambda p: validator.revalidate(previous, p), changes),
+                                 outcome(lambda d: validate(self.schema, d), patched), (backend, changes))
+            with self.assertRaises(ValidationError) as cm:
+                validator.revalidate(previous, {'/lines/0/price': '0'}, sparse=True, fail_fast=True)
+            self.assertEqual(cm.exception.to_dense(), {'lines': [{'price': {'code': ValidationCode.NOT_GT, 'details': 0}}]})
+            self.assertEqual(previous, saved)
+
+    def test_untouched(self):
+        validator = okschema.compile(self.schema)
+        previous = validator.validate(self.data)
+        result = validator.revalidate(previous, {'/lines/1/sku': 'z'})
+        self.assertIs(result['lines'][0], previous['lines'][0])
+        self.assertIs(result['lines'][1]['tags'], previous['lines'][1]['tags'])
+        self.assertEqual(result['lines'][1]['sku'], 'z')
+
+    def test_bad_patches(self):
+        validator = okschema.compile(self.schema)
+        previous = validator.validate(self.data)
+        for changes in [{'lines/0': {}}, {'/x/y': 1}, {'/lines/5/sku': 'a'}, {'/lines/01/sku': 'a'},
+                      [{'op': 'replace', 'path': '/note', 'value': 'a'}], [{'op': 'move', 'from': '/name', 'path': '/x'}],
+                      [{'op': 'add', 'path': '/name'}], [{'op': 'remove', 'path': ''}], 'x']:
+            with self.assertRaises(ValueError, msg=changes):
+                validator.revalidate(previous, changes)
+
+    def test_pointers(self):
+        self.assertEqual(patch.parse_pointer('/a~1b/~0c/0/'), ['a/b', '~c', '0', ''])
+        self.assertEqual(patch.parse_pointer(''), [])
+
+
+class TestLazy(unittest.TestCase):
+
+    schema = {
+        'id': 'int',
+        'note': {'@t': 'str', '@optional': True},
+        'status': {'@t': 'str', '@optional': True, '@default': 'new'},
+        'lines': [{'sku': 'str', 'price': {'@t': 'decimal', '@gt': 0}}],
+        'customer': {'name': 'str', '@val': lambda customer: dict(customer, checked=True)},
+    }
+    data = {'id': 1, 'lines': [{'sku': 'a', 'price': '1.5'}, {'sku': 'b', 'price': '-1'}, {'sku': 'c'}],
+            'customer': {'name': 'x'}, 'extra': 1}
+
+    def test_access(self):
+        order = okschema.validate_lazy(self.schema, self.data)
+        self.assertIsInstance(order, okschema.LazyDict)
+        self.assertEqual((order['id'], order['status'], list(order), len(order)), (1, 'new', ['id', 'status', 'lines', 'customer'], 4))
+        self.assertEqual(('note' in order, 'extra' in order, 'id' in order), (False, False, True))
+        self.assertRaises(KeyError, lambda: order['note'])
+        self.assertRaises(KeyError, lambda: order['extra'])
+        lines = order['lines']
+        self.assertIsInstance(lines, okschema.LazyList)
+        self.assertIs(order['lines'], lines)
+        self.assertEqual((len(lines), lines[0]['price'], lines[-3]['sku']), (3, decimal.Decimal('1.5'), 'a'))
+        self.assertEqual(order['customer'], {'name': 'x', 'checked': True})
+        with self.assertRaises(ValidationError) as cm:
+            lines[1]['price']
+        self.assertEqual(cm.exception.js, {'lines': [None, {'price': {'code': ValidationCode.NOT_GT, 'details': 0}}, None]})
+        self.assertEqual(cm.exception.path, ['lines', 1, 'price'])
+        with self.assertRaises(ValidationError) as cm:
+            lines[2]['price']
+        self.assertEqual(cm.exception.path, ['lines', 2, 'price'])
+        self.assertRaises(IndexError, lambda: lines[3])
+
+    def test_materialize(self):
+        order = okschema.validate_lazy(self.schema, self.data)
+        order['lines'][0]['sku']
+        self.assertEqual(outcome(lambda d: order.materialize(), None), outcome(lambda d: validate(self.schema, d), self.data))
+        data = dict(self.data, lines=self.data['lines'][:1])
+        self.assertEqual(okschema.validate_lazy(self.schema, data).materialize(), validate(self.schema, data))
+        self.assertEqual(okschema.validate_lazy(self.schema, data), validate(self.schema, data))
+
+    def test_not_lazy(self):
+        self.assertEqual(okschema.validate_lazy('int', 5), 5)
+        self.assertEqual(okschema.validate_lazy([{'@t': 'int', '@gt': 0}], [1, 2]), [1, 2])
+        with self.assertRaises(ValidationError) as cm:
+            okschema.validate_lazy({'a': 'int'}, [])
+        self.assertEqual((cm.exception.js, cm.exception.path), ({'code': ValidationCode.BAD_TYPE}, []))
+
+
+class TestListLength(unittest.TestCase):
+
+    def validate_funs(self, schema):
+        return [lambda d: validate(schema, d), lambda d: asyncio.run(okschema.avalidate(schema, d)),
+                lambda d: {'tags': list(okschema.validate_lazy(schema, d)['tags'])},
+                lambda d: okschema.validate_lazy(schema, d).materialize()] + \
+            [okschema.compile(schema, backend=backend).validate for backend in ['tree', 'codegen', 'iterative']]
+
+    def test_length(self):
+        calls = []
+        schema = {'tags': [{'@t': 'str', '@val': lambda x: calls.append(x) or x}, {'@gteq': 1, '@lt': 3}]}
+        for validate_fun in self.validate_funs(schema):
+            self.assertEqual(outcome(validate_fun, {'tags': []}),
+                             ('error', {'tags': {'code': ValidationCode.NOT_GTEQ, 'details': 1}}))
+            self.assertEqual(outcome(validate_fun, {'tags': ['a'] * 1000}),
+                             ('error', {'tags': {'code': ValidationCode.NOT_LT, 'details': 3}}))
+            self.assertEqual(outcome(validate_fun, {'tags': ['a', 1000]}),
+                             ('error', {'tags': [None, {'code': ValidationCode.BAD_TYPE}]}))
+            self.assertEqual(outcome(validate_fun, {'tags': ['a', 'b']}), ('ok', {'tags': ['a', 'b']}))
+            self.assertEqual(calls, ['a', 'a', 'b'])
+            calls.clear()
+        validator = okschema.compile(schema)
+        self.assertEqual((validator.is_valid({'tags': ['a']}), validator.is_valid({'tags': ['a'] * 3})), (True, False))
+        self.assertEqual(calls, ['a'])
+
+    def test_buffer(self):
+        schema = [{'@t': 'int', '@gt': 0}, {'@lteq': 3}]
+        for validate_fun in [lambda d: validate(schema, d), okschema.compile(schema).validate]:
+            self.assertEqual(outcome(validate_fun, array.array('i', [1, 2, 3, 4])),
+                             ('error', {'code': ValidationCode.NOT_LTEQ, 'details': 3}))
+            self.assertEqual(outcome(validate_fun, [1] * 100),
+                             ('error', {'code': ValidationCode.NOT_LTEQ, 'details': 3}))
+
+    def test_checked(self):
+        self.assertEqual(okschema.check_schema([{'@t': 'int'}, {'@gt': '1', '@neq': 3}]), [
+            {'path': [1, '@gt'], 'code': SchemaCode.BAD_OPTION, 'details': 'list length limit must be an int'},
+            {'path': [1, '@neq'], 'code': SchemaCode.ILLEGAL_COMPARISON},
+        ])
+
+
+class TestLimits(unittest.TestCase):
+
+    def test_exceeded(self):
+        data = {'a': [1, 2, {'b': 'xyz'}], 'c': 'd'}
+        self.assertIsNone(okschema.Limits(max_nodes=7, max_depth=3, max_string_length=7).exceeded(data))
+        self.assertEqual(okschema.Limits(max_nodes=5).exceeded(data), ({'max_nodes': 5}, ['a', 2, 'b']))
+        self.assertEqual(okschema.Limits(max_depth=2).exceeded(data), ({'max_depth': 2}, ['a', 2]))
+        self.assertEqual(okschema.Limits(max_string_length=5).exceeded(data), ({'max_string_length': 5}, ['c']))
+        self.assertEqual(okschema.Limits(max_nodes=3).exceeded([array.array('i', [1, 2, 3])]), ({'max_nodes': 3}, [0]))
+        self.assertEqual(okschema.Limits(max_depth=0).exceeded({}), ({'max_depth': 0}, []))
+
+    def test_validate(self):
+        schema = [{'id': 'int'}]
+        limits = okschema.Limits(max_nodes=1000)
+        data = [{'id': i} for i in range(10 ** 5)]
+        expected = ('error', {'code': ValidationCode.TOO_LARGE, 'details': {'max_nodes': 1000}})
+        for validate_fun in [lambda d: validate(schema, d, limits=limits)] + \
+                [lambda d, v=okschema.compile(schema, backend=backend): v.validate(d, limits=limits)
+                 for backend in ['tree', 'codegen', 'iterative']]:
+            self.assertEqual(outcome(validate_fun, data), expected)
+            self.assertEqual(outcome(validate_fun, data[:10]), ('ok', data[:10]))
+        with self.assertRaises(ValidationError) as cm:
+            okschema.compile(schema).validate(data, sparse=True, limits=limits)
+        self.assertEqual((cm.exception.js, cm.exception.path), (expected[1], [499, 'id']))
+
+
+class TestOneOf(unittest.TestCase):
+
+    event = {'@discriminator': 'type', '@oneof': {
+        'click': {'type': 'str', 'x': 'int', 'y': 'int'},
+        'scroll': {'type': 'str', 'delta': 'decimal'},
+    }}
+    schema = {'events': [event], 'id': {'@oneof': ['int', {'@t': 'str', '@gt': 2}]}}
+
+    def validate_funs(self, schema):
+        return [lambda d: validate(schema, d), lambda d: asyncio.run(okschema.avalidate(schema, d)),
+                lambda d: okschema.validate_lazy(schema, d).materialize()] + \
+            [okschema.compile(schema, backend=backend).validate for backend in ['tree', 'codegen', 'iterative']]
+
+    def test_valid(self):
+        data = {'events': [{'type': 'click', 'x': 1, 'y': 2, 'z': 3}, {'type': 'scroll', 'delta': '1.5'}], 'id': 'abc'}
+        expected = {'events': [{'type': 'click', 'x': 1, 'y': 2}, {'type': 'scroll', 'delta': decimal.Decimal('1.5')}],
+                    'id': 'abc'}
+        for validate_fun in self.validate_funs(self.schema):
+            self.assertEqual(outcome(validate_fun, data), ('ok', expected))
+            self.assertEqual(outcome(validate_fun, dict(data, id=5)), ('ok', dict(expected, id=5)))
+        self.assertTrue(okschema.compile(self.schema).is_valid(data))
+
+    def test_errors(self):
+        # Only the branch picked by the discriminator is reported, union fallbacks report every branch.
+        data = {'events': [{'type': 'click', 'x': 1}, {'type': 'drag'}, {'x': 1}, {'type': ['click']}, 5], 'id': 'a'}
+        expected = ('error', {
+            'events': [{'y': {'code': ValidationCode.MISSING}}, {'type': {'code': ValidationCode.NOT_IN}},
+                       {'type': {'code': ValidationCode.MISSING}}, {'type': {'code': ValidationCode.NOT_IN}},
+                       {'code': ValidationCode.BAD_TYPE}],
+            'id': {'code': ValidationCode.MANY_ERRORS, 'details': [{'code': ValidationCode.BAD_TYPE},
+                                                                    {'code': ValidationCode.NOT_GT, 'details': 2}]},
+        })
+        for validate_fun in self.validate_funs(self.schema):
+            self.assertEqual(outcome(validate_fun, data), expected)
+        validator = okschema.compile(self.schema)
+        with self.assertRaises(ValidationError) as cm:
+            validator.validate(data, sparse=True)
+        self.assertEqual(cm.exception.to_dense(), expected[1])
+        self.assertFalse(validator.is_valid(data))
+
+    def test_sparse_branch_errors(self):
+        # Branch errors of unions are kept dense, so to_dense() matches the default format.
+        schema = {'@oneof': [{'tags': ['int']}, 'int']}
+        data = {'tags': [1, 'a', 2]}
+        for backend in ['tree', 'codegen', 'iterative']:
+            validator = okschema.compile(schema, backend=backend)
+            with self.assertRaises(ValidationError) as cm:
+                validator.validate(data, sparse=True)
+            self.assertEqual(cm.exception.to_dense(), outcome(validator.validate, data)[1])
+            self.assertEqual(cm.exception.to_dense()['details'][0],
+                             {'tags': [None, {'code': ValidationCode.BAD_TYPE}, None]})
+
+    def test_in_place(self):
+        schema = {'@oneof': [{'a': 'decimal', 'b': 'int'}, {'a': 'decimal'}]}
+        data = {'a': '1', 'c': 1}
+        self.assertEqual(okschema.compile(schema).validate(data, in_place=True), {'a': decimal.Decimal(1)})
+        self.assertEqual(data, {'a': decimal.Decimal(1)})
+
+    def test_revalidate(self):
+        validator = okschema.compile(self.schema)
+        previous = validator.validate({'events': [{'type': 'scroll', 'delta': '1.5'}], 'id': 5})
+        self.assertEqual(validator.revalidate(previous, {'/events/0/delta': '2'})['events'],
+                         [{'type': 'scroll', 'delta': decimal.Decimal(2)}])
+        self.assertRaises(ValueError, validator.revalidate, previous, {'/events/0/type': 'click'})
+
+    def test_checked(self):
+        self.assertEqual(okschema.check_schema({
+            'a': {'@discriminator': 'type', '@oneof': {'x': {'x': 'int'}, 'y': 'int'}},
+            'b': {'@oneof': {}},
+            'c': {'@discriminator': '@t', '@oneof': [], '@gt': 1},
+        }), [
+            {'path': ['a', '@oneof', 'x'], 'code': SchemaCode.BAD_OPTION,
+             'details': 'discriminated branches must be dicts with the discriminator field'},
+            {'path': ['a', '@oneof', 'y'], 'code': SchemaCode.BAD_OPTION,
+             'details': 'discriminated branches must be dicts with the discriminator field'},
+            {'path': ['b', '@oneof'], 'code': SchemaCode.BAD_OPTION, 'details': 'must be a non-empty list of schemas'},
+            {'path': ['c', '@gt'], 'code': SchemaCode.ILLEGAL_COMPARISON},
+            {'path': ['c', '@discriminator'], 'code': SchemaCode.BAD_OPTION, 'details': 'must be a field name'},
+            {'path': ['c', '@oneof'], 'code': SchemaCode.BAD_OPTION, 'details': 'must be a non-empty dict of schemas'},
+        ])
+
+
+class TestMap(unittest.TestCase):
+
+    schema = {'stock': {'@t': 'map', '@keys': {'@t': 'str', '@format': 'uuid'}, '@values': {'@t': 'int', '@gteq': 0}},
+              'names': {'@t': 'map', '@values': 'str', '@optional': True}}
+
+    def validate_funs(self, schema):
+        return [lambda d: validate(schema, d), lambda d: okschema.validate_lazy(schema, d).materialize()] + \
+            [okschema.compile(schema, backend=backend).validate for backend in ['tree', 'codegen', 'iterative']]
+
+    def test_large(self):
+        stock = {str(uuid.UUID(int=i)): i for i in range(10 ** 5)}
+        bad_key, bad_value = str(uuid.UUID(int=5))[:-1] + 'x', str(uuid.UUID(int=7))
+        bad_stock = dict(stock, **{bad_key: 1, bad_value: -1})
+        expected = ('error', {'stock': {
+            bad_key: {'code': ValidationCode.BAD_KEY, 'details': {'code': ValidationCode.BAD_FORMAT, 'details': 'uuid'}},
+            bad_value: {'code': ValidationCode.NOT_GTEQ, 'details': 0},
+        }})
+        for validate_fun in self.validate_funs(self.schema):
+            self.assertEqual(outcome(validate_fun, {'stock': stock}), ('ok', {'stock': stock}))
+            self.assertEqual(outcome(validate_fun, {'stock': bad_stock}), expected)
+        validator = okschema.compile(self.schema)
+        self.assertEqual((validator.is_valid({'stock': stock}), validator.is_valid({'stock': bad_stock})), (True, False))
+        with self.assertRaises(ValidationError) as cm:
+            validator.validate({'stock': bad_stock}, sparse=True)
+        self.assertEqual(cm.exception.to_dense(), expected[1])
+
+    def test_trusted_keys(self):
+        data = {'stock': {}, 'names': {'pl': 'Polski', '': 'none', 'en': 5}}
+        expected = ('error', {'names': {'en': {'code': ValidationCode.BAD_TYPE}}})
+        for validate_fun in self.validate_funs(self.schema) + [lambda d: asyncio.run(okschema.avalidate(self.schema, d))]:
+            self.assertEqual(outcome(validate_fun, data), expected)
+            self.assertEqual(outcome(validate_fun, {'stock': [], 'names': None}),
+                             ('error', {'stock': {'code': ValidationCode.BAD_TYPE}, 'names': {'code': ValidationCode.NULL}}))
+
+    def test_error_order(self):
+        schema = {'@t': 'map', '@keys': {'@t': 'str', '@format': 'lang'}, '@values': 'int'}
+        data = {'en': 'x', 'bad key': 1, 'pl': 'y'}
+        expected = outcome(lambda d: validate(schema, d), data)
+        for validate_fun in self.validate_funs(schema) + [lambda d: asyncio.run(okschema.avalidate(schema, d))]:
+            result = outcome(validate_fun, data)
+            self.assertEqual(result, expected)
+            self.assertEqual(list(result[1]), ['en', 'bad key', 'pl'])  # serialized in the order of the keys
+
+    def test_in_place(self):
+        schema = {'@t': 'map', '@keys': {'@t': 'str', '@val': str.lower}, '@values': 'decimal'}
+        data = {'A': '1', 'b': '2'}
+        self.assertEqual(okschema.compile(schema).validate(data, in_place=True), {'a': 1, 'b': 2})
+        self.assertEqual(data, {'b': 2, 'a': 1})
+        self.assertEqual(okschema.compile(schema, backend='iterative').validate({'A': '1'}, in_place=True), {'a': 1})
+
+    def test_revalidate(self):
+        validator = okschema.compile(self.schema)
+        key = str(uuid.UUID(int=1))
+        previous = validator.validate({'stock': {key: 1}})
+        self.assertEqual(validator.revalidate(previous, [{'op': 'replace', 'path': '/stock/' + key, 'value': 2}]),
+                         {'stock': {key: 2}})
+        self.assertEqual(outcome(lambda d: validator.revalidate(previous, d), {'/stock/x': 1}), ('error', {'stock': {
+            'x': {'code': ValidationCode.BAD_KEY, 'details': {'code': ValidationCode.BAD_FORMAT, 'details': 'uuid'}}}}))
+
+    def test_checked(self):
+        self.assertEqual(okschema.check_schema({'a': {'@t': 'map'}, 'b': {'@t': 'map', '@keys': 'int', '@values': 'int'}}), [
+            {'path': ['a'], 'code': SchemaCode.BAD_OPTION, 'details': 'map without @values'},
+            {'path': ['b', '@keys'], 'code': SchemaCode.BAD_OPTION, 'details': 'keys must be strings'},
+        ])
+
+
+class TestRef(unittest.TestCase):
+
+    schema = {
+        '@defs': {
+            'comment': {'text': 'str', 'replies': [{'@ref': 'comment'}, {'@optional': True}]},
+            'category': {'name': 'str', 'parent': {'@ref': 'category', '@null': True}},
+        },
+        'thread': {'@ref': 'comment'},
+        'category': {'@ref': 'category', '@optional': True},
+    }
+
+    def validate_funs(self, schema):
+        return [lambda d: validate(schema, d), lambda d: okschema.validate_lazy(schema, d).materialize(),
+                lambda d: asyncio.run(okschema.avalidate(schema, d))] + \
+            [okschema.compile(schema, backend=backend).validate for backend in ['tree', 'codegen', 'iterative']]
+
+    def test_tree(self):
+        data = {'thread': {'text': 'a', 'replies': [{'text': 'b', 'replies': [{'text': 'c'}]}, {'text': 1}]},
+                'category': {'name': 'x', 'parent': {'name': 'y', 'parent': None}}}
+        expected = ('error', {'thread': {'replies': [None, {'text': {'code': ValidationCode.BAD_TYPE}}]}})
+        for validate_fun in self.validate_funs(self.schema):
+            self.assertEqual(outcome(validate_fun, data), expected)
+            data['thread']['replies'][1]['text'] = '1'
+            self.assertEqual(outcome(validate_fun, data), ('ok', data))
+            self.assertEqual(outcome(validate_fun, {'thread': None}),
+                             ('error', {'thread': {'code': ValidationCode.NULL}}))
+            data['thread']['replies'][1]['text'] = 1
+        validator = okschema.compile(self.schema)
+        self.assertFalse(validator.is_valid(data))
+        self.assertTrue(validator.is_valid({'thread': {'text': 'a'}}))
+
+    def test_root_and_cycles(self):
+        schema = {'@defs': {'a': {'b': {'@ref': 'b', '@optional': True}}, 'b': {'a': {'@ref': 'a'}}}, '@ref': 'a'}
+        for validate_fun in self.validate_funs(schema):
+            self.assertEqual(outcome(validate_fun, {'b': {'a': {'b': {'a': {}}}}}), ('ok', {'b': {'a': {'b': {'a': {}}}}}))
+            self.assertEqual(outcome(validate_fun, {'b': {'a': 5}}),
+                             ('error', {'b': {'a': {'code': ValidationCode.BAD_TYPE}}}))
+
+    def test_deep(self):
+        data = {'text': 'leaf'}
+        for i in range(1000):
+            data = {'text': str(i), 'replies': [data]}
+        with self.assertRaises(ValidationError) as cm:
+            okschema.compile(self.schema).validate({'thread': data})
+        error = cm.exception.js['thread']
+        for i in range(okschema.compiler.DEFAULT_MAX_REF_DEPTH):
+            error = error['replies'][0]
+        self.assertEqual(error, {'code': ValidationCode.TOO_DEEP, 'details': okschema.compiler.DEFAULT_MAX_REF_DEPTH})
+        shallow = data
+        for i in range(850):
+            shallow = shallow['replies'][0]
+        self.assertEqual(okschema.compile(self.schema, max_ref_depth=200).validate({'thread': shallow}),
+                         {'thread': shallow})
+        validator = okschema.compile(self.schema, backend='iterative', max_depth=None)
+        self.assertTrue(validator.is_valid({'thread': data}))  # results this deep can't be compared by recursion
+        wrapped = {'thread': data}
+        self.assertIs(validator.validate(wrapped, in_place=True), wrapped)
+
+    def test_revalidate(self):
+        validator = okschema.compile(self.schema)
+        previous = validator.validate({'thread': {'text': 'a', 'replies': [{'text': 'b'}]}})
+        self.assertEqual(validator.revalidate(previous, {'/thread/replies/0/replies': [{'text': 'c'}]}),
+                         {'thread': {'text': 'a', 'replies': [{'text': 'b', 'replies': [{'text': 'c'}]}]}})
+
+    def test_pickled(self):
+        spec = pickle.loads(pickle.dumps(okschema.compile(self.schema).spec))
+        definition = spec['fields'][0][1]['definition']
+        self.assertIs(definition.spec['fields'][1][1]['item']['definition'], definition)
+        self.assertEqual(okschema.compiler.compile_node(spec).is_valid({'thread': {'text': 'a'}}), True)
+
+    def test_checked(self):
+        self.assertEqual(okschema.check_schema({
+            '@defs': {'a': {'@ref': 'b'}, 'b': {'@oneof': [{'@ref': 'a'}, 'str']}, 'c': {'@ref': 'c', '@t': 'str'}},
+            'x': {'@ref': 'd'},
+        }), [
+            {'path': ['@defs', 'c', '@ref'], 'code': SchemaCode.BAD_OPTION, 'details': 'not allowed for str'},
+            {'path': ['@defs', 'a'], 'code': SchemaCode.BAD_REF, 'details': 'reference cycle'},
+            {'path': ['@defs', 'b'], 'code': SchemaCode.BAD_REF, 'details': 'reference cycle'},
+            {'path': ['x', '@ref'], 'code': SchemaCode.BAD_REF, 'details': 'd'},
+        ])
+
+
+class TestValidateJson(unittest.TestCase):
+
+    schema = {'id': 'int', 'price': {'@t': 'decimal', '@gt': 0}, 'tags': [{'@t': 'str', '@val': str.upper}],
+              'when': {'@t': 'date', '@optional': True}}
+
+    def test_inputs(self):
+        doc = {'id': 1, 'price': '9.99', 'tags': ['a', 'b'], 'extra': {'x': [1, 2]}}
+        text = json.dumps(doc)
+        expected = validate(self.schema, json.loads(text))
+        self.assertEqual(expected, {'id': 1, 'price': decimal.Decimal('9.99'), 'tags': ['A', 'B']})
+        for raw in [text, text.encode(), bytearray(text.encode()), memoryview(text.encode()), text.encode('utf-16')]:
+            self.assertEqual(okschema.validate_json(self.schema, raw), expected)
+            self.assertEqual(okschema.validate_json(self.schema, raw, fail_fast=True), expected)
+        with self.assertRaises(json.JSONDecodeError):
+            okschema.validate_json(self.schema, b'{"id": 1')
+
+    def test_errors(self):
+        text = '{"id": "1", "price": "-1", "tags": ["a", 5], "when": "2020-13-01"}'
+        for schema in [self.schema, [self.schema], {'@defs': {'item': self.schema}, '@ref': 'item'}]:
+            raw = text if isinstance(schema, dict) else '[%s]' % text
+            self.assertEqual(outcome(lambda d: okschema.validate_json(schema, d), raw),
+                             outcome(lambda d: validate(schema, json.loads(d)), raw))
+            self.assertEqual(outcome(lambda d: okschema.validate_json(schema, d, fail_fast=True), raw),
+                             outcome(lambda d: validate(schema, json.loads(d), fail_fast=True), raw))
+        self.assertEqual(outcome(lambda d: okschema.validate_json(['int'], d, limits=okschema.Limits(max_nodes=2)),
+                                 '[1, 2]'),
+                         ('error', {'code': ValidationCode.TOO_LARGE, 'details': {'max_nodes': 2}}))
+
+
 unittest.main()